@@ -1,6 +1,6 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_file, send_from_directory
 from sqlalchemy.orm import sessionmaker
-from db_init import get_engine
+from db_init import get_engine, get_session, db_session, get_pool_status
 from models import (
     Product, Transaction, User, Batch, Customer, Order, OrderItem, OrderStatus, 
     Supplier, Warehouse, Project, ProjectRequirement, Employee, EmployeeAssignment, 
@@ -12,13 +12,13 @@ from models import (
     SupplierQuoteItem, WarehouseRequestStatus, SupplierQuoteStatus, CompanyHoliday,
     ProjectTask, ProjectTaskDependency, ProjectTaskMaterial, Feature, ComplianceTag, ApplicationTag,
     SupplierRequestQuote, SupplierNegotiation, SupplierNegotiationItem, TransactionType,
-    CustomerNegotiation, CustomerNegotiationItem
+    CustomerNegotiation, CustomerNegotiationItem, supplier_request_suppliers, SupplierWarehouseDistance
 )
 from flask_cors import CORS, cross_origin
-from sqlalchemy import func, text
-from datetime import datetime
+from sqlalchemy import func, text, exists, and_, or_, insert, bindparam
+from datetime import datetime, date, timedelta
 import uuid
-from project_timeline import calculate_project_end_date
+from project_timeline import schedule_project, predict_scenarios
 
 # Add these imports for scraping and geocoding
 from selenium import webdriver
@@ -27,46 +27,50 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.chrome.options import Options
 import time
 import os
-import requests
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from math import radians, sin, cos, sqrt, atan2
-from forecasting import stock_forecast_analysis
-from aggregator import aggregate_requisitions, match_products_to_requirements, generate_price_breakdown, calculate_transportation_cost
+from stock_forecasts import stock_forecasts, DEFAULT_FORECAST_DAYS
+from product_daily_stats import product_history, PERIODS as HISTORY_PERIODS
+from aggregator import aggregate_requisitions, match_products_to_requirements, DEFAULT_MATCH_TOP_K, generate_price_breakdown, generate_order_price_breakdown, calculate_transportation_cost
 from supplier_performance import get_supplier_performance_ui
 from auth import verify_login
 import re
 import numpy as np
 import difflib
-from collections import Counter
+from collections import Counter, defaultdict
 from werkzeug.utils import secure_filename
 import traceback
 import random, string
 from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text, Boolean, Table
 from sqlalchemy.orm import relationship
+import io
 import json
-import math
 import logging
-from pdf_generator import InvoicePDFGenerator
+from invoice_pdfs import invoice_pdfs, CachedPDFGone
 from tax_calculator import tax_calculator
-
-# Helper: Geocode address to lat/lng using Mapbox
-MAPBOX_TOKEN = os.environ.get('MAPBOX_TOKEN') or 'YOUR_MAPBOX_TOKEN'
+from pagination import PaginationError, parse_page_args, fetch_page, apply_filters, apply_date_range, page_response
+from export_stream import get_export_format, stream_export, stream_zip
+from inventory_summary import stock_status_case, get_inventory_summary
+from supplier_metrics import supplier_performance_rows
+from geocoding import get_geocoder, GeocodingError
+from truck_cost import truck_cost_model
+from skill_index import skill_rate_table
+from finished_product_rollups import finished_product_skill_names
+from bom import explode_bom, bom_total_cost, where_used
+from stock_ledger import move_stock, withdraw_lines, StockError, ProductNotFound
+from gazetteer import gazetteer
+from supplier_geo import supplier_index, main_warehouse_distance, main_warehouse_distances, main_warehouse_location, DEFAULT_RADIUS_KM, DEFAULT_NEARBY_K
+
+# Helper: Geocode address to lat/lng (cached, see geocoding.py)
 def geocode_address(address):
-    url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{address}.json?access_token={MAPBOX_TOKEN}"
-    resp = requests.get(url)
     try:
-        data = resp.json()
-        print('Mapbox geocode response:', data)
-        if 'features' in data and data['features']:
-            lng, lat = data['features'][0]['center']
-            return lat, lng
-        else:
-            print('No features found in geocode response')
-            raise Exception('No geocoding result for address')
-    except Exception as e:
-        print('Error parsing geocode response:', str(e))
+        coords = get_geocoder().geocode(address)
+    except GeocodingError as e:
         raise Exception('Geocoding failed: ' + str(e))
+    if coords is None:
+        raise Exception('Geocoding failed: No geocoding result for address')
+    return coords
 
 # Helper: Calculate distance between two points using Haversine formula
 def calculate_distance(lat1, lng1, lat2, lng2):
@@ -101,6 +105,31 @@ def after_request(response):
     response.headers['Access-Control-Allow-Credentials'] = 'true'
     return response
 
+@app.teardown_appcontext
+def shutdown_session(exception=None):
+    """Commit or roll back the request-scoped session and return its connection to the pool"""
+    if not db_session.registry.has():
+        return
+    session = db_session()
+    try:
+        if exception is None:
+            session.commit()
+        else:
+            session.rollback()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        db_session.remove()
+
+@app.errorhandler(PaginationError)
+def handle_pagination_error(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.route('/admin/db-pool', methods=['GET'])
+def get_db_pool_status():
+    return jsonify(get_pool_status())
+
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'product_photos')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -110,44 +139,45 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 def serve_product_photo(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
-def get_bom_recursive(session, product, visited=None):
-    if visited is None:
-        visited = set()
-    if product.id in visited:
-        return []  # Prevent cycles
-    visited.add(product.id)
-    bom = []
-    for comp in product.sub_components:
-        child = comp.child
-        entry = {
-            'sku': child.sku,
-            'name': child.name,
-            'quantity': comp.quantity,
-            'sub_components': get_bom_recursive(session, child, visited)
-        }
-        bom.append(entry)
-    return bom
-
 @app.route('/products/<sku>/bom', methods=['GET'])
 def get_product_bom(sku):
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    product = session.query(Product).filter_by(sku=sku).first()
+    """
+    Multi-level BOM of a product, exploded with one recursive query (see bom.py).
+    Query params: include_cost (bool) adds unit_cost/extended_cost per entry and total_cost.
+    """
+    include_cost = request.args.get('include_cost', 'false').lower() == 'true'
+    session = get_session()
+    product = session.query(Product.id, Product.sku, Product.name).filter_by(sku=sku).first()
     if not product:
-        session.close()
         return jsonify({'error': 'Product not found'}), 404
-    bom = get_bom_recursive(session, product)
-    session.close()
-    return jsonify({'sku': product.sku, 'name': product.name, 'bom': bom})
+    bom = explode_bom(session, product.id, include_cost=include_cost)
+    result = {'sku': product.sku, 'name': product.name, 'bom': bom}
+    if include_cost:
+        result['total_cost'] = bom_total_cost(bom)
+    return jsonify(result)
+
+@app.route('/products/<sku>/where-used', methods=['GET'])
+def get_product_where_used(sku):
+    """Every assembly the product goes into, at any level, with the quantity needed per assembly"""
+    session = get_session()
+    product = session.query(Product.id, Product.sku, Product.name).filter_by(sku=sku).first()
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    return jsonify({'sku': product.sku, 'name': product.name, 'used_in': where_used(session, product.id)})
+
+PRODUCT_SORT_COLUMNS = {'id': Product.id, 'name': Product.name, 'sku': Product.sku, 'quantity': Product.quantity, 'cost': Product.cost}
 
 @app.route('/products', methods=['GET'])
 @cross_origin()
 def get_products():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    products = session.query(Product).all()
+    spec = parse_page_args(request.args, PRODUCT_SORT_COLUMNS)
+    session = get_session()
+    query = apply_filters(session.query(Product), request.args, {
+        'category': Product.category,
+        'supplier_id': Product.supplier_id,
+        'status': lambda v: stock_status_case().in_(v.split(',')),
+    })
+    products, next_cursor = fetch_page(query, spec, Product.id)
     result = []
     for p in products:
         # Ensure reorder_level and quantity are floats, default 0 if None
@@ -174,8 +204,7 @@ def get_products():
             'email_sent_count': p.email_sent_count or 0,
             'status': status
         })
-    session.close()
-    return jsonify(result)
+    return jsonify(page_response(result, spec, next_cursor))
 
 @app.route('/products', methods=['POST'])
 def add_product():
@@ -299,66 +328,77 @@ def delete_product(product_id):
     session.close()
     return jsonify({'success': True})
 
+def transaction_listing_query(session):
+    """
+    One outer-joined SELECT for transaction listings, so product, batch,
+    user, supplier and customer columns come back with each row instead of
+    being lazy-loaded per transaction.
+    """
+    return (
+        session.query(
+            Transaction.id,
+            Transaction.type,
+            Transaction.product_id,
+            Transaction.quantity,
+            Transaction.location,
+            Transaction.date,
+            Transaction.note,
+            Product.name.label('product_name'),
+            Product.sku.label('product_sku'),
+            Product.unit.label('product_unit'),
+            Product.cost.label('product_cost'),
+            Batch.batch_id.label('batch_number'),
+            User.username.label('user_name'),
+            Supplier.name.label('supplier_name'),
+            Supplier.email.label('supplier_email'),
+            Customer.name.label('customer_name'),
+        )
+        .outerjoin(Product, Transaction.product_id == Product.id)
+        .outerjoin(Batch, Transaction.batch_id == Batch.id)
+        .outerjoin(User, Transaction.user_id == User.id)
+        .outerjoin(Supplier, Transaction.supplier_id == Supplier.id)
+        .outerjoin(Customer, Transaction.customer_id == Customer.id)
+    )
+
+def transaction_row_to_dict(row, include_parties=True):
+    """Build the transaction JSON shape from a transaction_listing_query row"""
+    result = {
+        'id': row.id,
+        'type': row.type.value if row.type else None,
+        'product_id': row.product_id,
+        'product_name': row.product_name,
+        'sku': row.product_sku,
+        'quantity': row.quantity,
+        'unit': row.product_unit,
+        'batch_number': row.batch_number,
+        'cost_per_unit': row.product_cost,
+        'total_cost': (row.quantity * row.product_cost) if row.product_cost else None,
+        'location': row.location,
+        'date': row.date.isoformat() if row.date else None,
+        'user': row.user_name,
+    }
+    if include_parties:
+        result['supplier'] = row.supplier_name
+        result['supplier_email'] = row.supplier_email
+        result['customer'] = row.customer_name
+    result['notes'] = row.note
+    return result
+
+TRANSACTION_SORT_COLUMNS = {'id': Transaction.id, 'date': Transaction.date}
+
 @app.route('/transactions', methods=['GET'])
 def get_transactions():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    transactions = session.query(Transaction).all()
-    result = []
-    for t in transactions:
-        # Load related data before closing session
-        product_name = None
-        product_sku = None
-        product_unit = None
-        product_cost = None
-        batch_number = None
-        user_name = None
-        supplier_name = None
-        supplier_email = None
-        customer_name = None
-        
-        if t.product:
-            product_name = t.product.name
-            product_sku = t.product.sku
-            product_unit = t.product.unit
-            product_cost = t.product.cost
-        
-        if t.batch:
-            batch_number = t.batch.batch_id
-        
-        if t.user:
-            user_name = t.user.username
-        
-        if t.supplier:
-            supplier_name = t.supplier.name
-            supplier_email = t.supplier.email
-        if t.customer_id:
-            customer = session.query(Customer).filter_by(id=t.customer_id).first()
-            if customer:
-                customer_name = customer.name
-        
-        result.append({
-            'id': t.id,
-            'type': t.type.value if t.type else None,
-            'product_id': t.product_id,
-            'product_name': product_name,
-            'sku': product_sku,
-            'quantity': t.quantity,
-            'unit': product_unit,
-            'batch_number': batch_number,
-            'cost_per_unit': product_cost,
-            'total_cost': (t.quantity * product_cost) if product_cost else None,
-            'location': t.location,
-            'date': t.date.isoformat() if t.date else None,
-            'user': user_name,
-            'supplier': supplier_name,
-            'supplier_email': supplier_email,
-            'customer': customer_name,
-            'notes': t.note
-        })
-    session.close()
-    return jsonify(result)
+    spec = parse_page_args(request.args, TRANSACTION_SORT_COLUMNS)
+    session = get_session()
+    query = apply_filters(transaction_listing_query(session), request.args, {
+        'type': Transaction.type,
+        'product_id': Transaction.product_id,
+        'supplier_id': Transaction.supplier_id,
+        'customer_id': Transaction.customer_id,
+    })
+    query = apply_date_range(query, request.args, Transaction.date)
+    rows, next_cursor = fetch_page(query.order_by(Transaction.id), spec, Transaction.id)
+    return jsonify(page_response([transaction_row_to_dict(row) for row in rows], spec, next_cursor))
 
 @app.route('/transactions', methods=['POST'])
 def add_transaction():
@@ -368,27 +408,16 @@ def add_transaction():
     session = Session()
     
     try:
-        # Get the product
-        product = session.query(Product).filter_by(id=data['product_id']).first()
-        if not product:
-            session.close()
-            return jsonify({'error': 'Product not found'}), 404
-        
-        # Validate stock out
-        if data['type'] == 'stock_out':
-            if product.quantity < data['quantity']:
-                session.close()
-                return jsonify({'error': f'Insufficient stock. Available: {product.quantity}, Requested: {data["quantity"]}'}), 400
-        
         # Set supplier_id or customer_id
         supplier_id = data.get('supplier_id') if data['type'] == 'stock_in' else None
         customer_id = data.get('customer_id') if data['type'] == 'stock_out' else None
         
-        # Create transaction
-        transaction = Transaction(
-            type=data['type'],
-            product_id=data['product_id'],
-            quantity=data['quantity'],
+        # One conditional UPDATE: a stock_out only applies while enough stock is left
+        move_stock(
+            session,
+            data['product_id'],
+            data['type'],
+            data['quantity'],
             location=data['location'],
             date=datetime.now(),
             user_id=1,  # Default user ID, would come from auth
@@ -396,21 +425,19 @@ def add_transaction():
             supplier_id=supplier_id,
             customer_id=customer_id
         )
-        session.add(transaction)
-        
-        # Update product quantity
-        if data['type'] == 'stock_in':
-            product.quantity += data['quantity']
-            # Reset email sent count if product is now above reorder level
-            if product.quantity > (product.reorder_level or 0):
-                product.email_sent_count = 0
-        elif data['type'] == 'stock_out':
-            product.quantity -= data['quantity']
         
         session.commit()
         session.close()
         return jsonify({'success': True, 'message': 'Transaction processed successfully'}), 201
         
+    except ProductNotFound:
+        session.rollback()
+        session.close()
+        return jsonify({'error': 'Product not found'}), 404
+    except StockError as e:
+        session.rollback()
+        session.close()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         session.rollback()
         session.close()
@@ -418,182 +445,135 @@ def add_transaction():
 
 @app.route('/reports/kpis', methods=['GET'])
 def get_kpis():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    total_products = session.query(func.count(Product.id)).scalar()
-    total_value = session.query(func.sum(Product.quantity * Product.cost)).scalar() or 0
-    low_stock_items = session.query(Product).filter(Product.quantity <= Product.reorder_level).count()
-    out_of_stock_items = session.query(Product).filter(Product.quantity == 0).count()
-    session.close()
+    session = get_session()
+    totals = get_inventory_summary(session)['totals']
     return jsonify({
-        'totalProducts': total_products,
-        'totalValue': total_value,
-        'lowStockItems': low_stock_items,
-        'outOfStockItems': out_of_stock_items
+        'totalProducts': totals['product_count'],
+        'totalValue': totals['total_value'],
+        # Out-of-stock items are at or below their reorder level too
+        'lowStockItems': totals['low_stock_count'] + totals['out_of_stock_count'],
+        'outOfStockItems': totals['out_of_stock_count']
     })
 
+INVENTORY_REPORT_COLUMNS = ['id', 'name', 'sku', 'category', 'quantity', 'unit', 'cost', 'reorder_level', 'supplier_id', 'supplier_name', 'status']
+
+def inventory_report_query(session):
+    """Products with supplier name and stock status computed in the same SELECT"""
+    return (
+        session.query(
+            Product.id, Product.name, Product.sku, Product.category, Product.quantity,
+            Product.unit, Product.cost, Product.reorder_level, Product.supplier_id,
+            Supplier.name.label('supplier_name'),
+            stock_status_case().label('status'),
+        )
+        .outerjoin(Supplier, Product.supplier_id == Supplier.id)
+        .order_by(Product.id)
+    )
+
+def inventory_row_to_dict(row):
+    return {col: getattr(row, col) for col in INVENTORY_REPORT_COLUMNS}
+
 @app.route('/reports/inventory', methods=['GET'])
 def get_inventory_report():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    query = session.query(Product)
-    # Only filter by date if Product.created_at exists
-    # If not, ignore date filtering for inventory
-    products = query.all()
-    result = []
-    for p in products:
-        if p.quantity == 0:
-            status = 'out_of_stock'
-        elif p.quantity <= (p.reorder_level or 0):
-            status = 'low_stock'
-        else:
-            status = 'in_stock'
-        result.append({
-            'id': p.id,
-            'name': p.name,
-            'sku': p.sku,
-            'category': p.category,
-            'quantity': p.quantity,
-            'unit': p.unit,
-            'cost': p.cost,
-            'reorder_level': p.reorder_level,
-            'supplier_id': p.supplier_id,
-            'supplier_name': p.supplier.name if p.supplier_id and p.supplier else None,
-            'status': status
-        })
-    session.close()
-    return jsonify(result)
+    try:
+        export_format = get_export_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    session = get_session()
+    # Products have no created_at, so start_date/end_date do not filter inventory
+    query = inventory_report_query(session)
+    if export_format:
+        return stream_export(query, inventory_row_to_dict, export_format, INVENTORY_REPORT_COLUMNS, 'inventory_report')
+    return jsonify([inventory_row_to_dict(row) for row in query.all()])
+
+TRANSACTION_REPORT_COLUMNS = ['id', 'type', 'product_id', 'product_name', 'sku', 'quantity', 'unit', 'batch_number',
+                              'cost_per_unit', 'total_cost', 'location', 'date', 'user', 'notes']
 
 @app.route('/reports/transactions', methods=['GET'])
 def get_transactions_report():
+    try:
+        export_format = get_export_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    query = session.query(Transaction)
+    session = get_session()
+    query = transaction_listing_query(session)
     if start_date:
         start_dt = datetime.fromisoformat(start_date)
         query = query.filter(Transaction.date >= start_dt)
     if end_date:
         end_dt = datetime.fromisoformat(end_date)
         query = query.filter(Transaction.date <= end_dt)
-    transactions = query.all()
-    result = []
-    for t in transactions:
-        # Load related data before closing session
-        product_name = None
-        product_sku = None
-        product_unit = None
-        product_cost = None
-        batch_number = None
-        user_name = None
-        
-        if t.product:
-            product_name = t.product.name
-            product_sku = t.product.sku
-            product_unit = t.product.unit
-            product_cost = t.product.cost
-            
-        if t.batch:
-            batch_number = t.batch.batch_id
-            
-        if t.user:
-            user_name = t.user.username
-            
-        result.append({
-            'id': t.id,
-            'type': t.type.value if t.type else None,
-            'product_id': t.product_id,
-            'product_name': product_name,
-            'sku': product_sku,
-            'quantity': t.quantity,
-            'unit': product_unit,
-            'batch_number': batch_number,
-            'cost_per_unit': product_cost,
-            'total_cost': (t.quantity * product_cost) if product_cost else None,
-            'location': t.location,
-            'date': t.date.isoformat() if t.date else None,
-            'user': user_name,
-            'notes': t.note
-        })
-    session.close()
-    return jsonify(result)
-
-@app.route('/reports/analytics', methods=['GET'])
-def get_analytics_report():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    # Filter transactions by date for analytics
-    tx_query = session.query(Transaction)
-    if start_date:
-        start_dt = datetime.fromisoformat(start_date)
+    query = query.order_by(Transaction.id)
+    if export_format:
+        return stream_export(query, lambda row: transaction_row_to_dict(row, include_parties=False),
+                             export_format, TRANSACTION_REPORT_COLUMNS, 'transactions_report')
+    rows = query.all()
+    return jsonify([transaction_row_to_dict(row, include_parties=False) for row in rows])
+
+def compute_analytics_report(session, start_dt=None, end_dt=None):
+    """
+    Analytics dashboard figures. Stock value per category and per supplier and
+    the stock status counts come from the incrementally maintained
+    inventory_summary table; stock in/out value is SUM(quantity * cost) over the
+    date-filtered transactions, grouped by type.
+    """
+    summary = get_inventory_summary(session)
+    category_data = {key: values['total_value'] for key, values in summary['by_category'].items()}
+    supplier_data = {key: values['total_value'] for key, values in summary['by_supplier'].items()}
+    totals = summary['totals']
+    stock_status = {
+        'in_stock': totals['in_stock_count'],
+        'low_stock': totals['low_stock_count'],
+        'out_of_stock': totals['out_of_stock_count']
+    }
+    # Transaction summary for the requested period
+    tx_query = (
+        session.query(Transaction.type, func.count(Transaction.id), func.sum(Transaction.quantity * Product.cost))
+        .outerjoin(Product, Transaction.product_id == Product.id)
+    )
+    if start_dt:
         tx_query = tx_query.filter(Transaction.date >= start_dt)
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
+    if end_dt:
         tx_query = tx_query.filter(Transaction.date <= end_dt)
-    transactions = tx_query.all()
-    # Category-wise stock value
-    category_data = {}
-    for row in session.query(Product.category, func.sum(Product.quantity * Product.cost)).group_by(Product.category):
-        category, value = row
-        key = str(category) if category is not None else 'Unknown'
-        category_data[key] = value or 0
-    # Supplier-wise stock value
-    supplier_data = {}
-    for row in session.query(Product.supplier_id, func.sum(Product.quantity * Product.cost)).group_by(Product.supplier_id):
-        supplier_id, value = row
-        supplier = session.query(Supplier).filter_by(id=supplier_id).first() if supplier_id else None
-        supplier_name = supplier.name if supplier else None
-        key = str(supplier_name) if supplier_name is not None else 'Unknown'
-        supplier_data[key] = value or 0
-    # Stock status distribution
-    in_stock = session.query(Product).filter(Product.quantity > Product.reorder_level).count()
-    low_stock = session.query(Product).filter(Product.quantity > 0, Product.quantity <= Product.reorder_level).count()
-    out_of_stock = session.query(Product).filter(Product.quantity == 0).count()
-    # Transaction summary
-    total_transactions = session.query(Transaction).count()
-    # Calculate stock in/out values by loading product data before session closure
-    stock_in_transactions = session.query(Transaction).filter(Transaction.type == 'stock_in').all()
-    stock_out_transactions = session.query(Transaction).filter(Transaction.type == 'stock_out').all()
+    total_transactions = 0
     stock_in_value = 0
     stock_out_value = 0
-    for t in stock_in_transactions:
-        if t.product and t.product.cost:
-            stock_in_value += (t.quantity * t.product.cost)
-    for t in stock_out_transactions:
-        if t.product and t.product.cost:
-            stock_out_value += (t.quantity * t.product.cost)
-    session.close()
-    return jsonify({
+    for tx_type, count, value in tx_query.group_by(Transaction.type):
+        total_transactions += count
+        if tx_type == TransactionType.stock_in:
+            stock_in_value = value or 0
+        elif tx_type == TransactionType.stock_out:
+            stock_out_value = value or 0
+    return {
         'categoryData': category_data,
         'supplierData': supplier_data,
-        'stockStatus': {
-            'in_stock': in_stock,
-            'low_stock': low_stock,
-            'out_of_stock': out_of_stock
-        },
+        'stockStatus': stock_status,
         'transactionSummary': {
             'totalTransactions': total_transactions,
             'stockInValue': stock_in_value,
             'stockOutValue': stock_out_value
         }
-    })
+    }
+
+@app.route('/reports/analytics', methods=['GET'])
+def get_analytics_report():
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    start_dt = datetime.fromisoformat(start_date) if start_date else None
+    end_dt = datetime.fromisoformat(end_date) if end_date else None
+    session = get_session()
+    return jsonify(compute_analytics_report(session, start_dt, end_dt))
 
 # Customer endpoints
 @app.route('/customers', methods=['GET'])
 def get_customers():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    customers = session.query(Customer).all()
+    spec = parse_page_args(request.args, {'id': Customer.id, 'name': Customer.name, 'created_at': Customer.created_at})
+    session = get_session()
+    query = apply_filters(session.query(Customer), request.args, {'company': Customer.company})
+    query = apply_date_range(query, request.args, Customer.created_at)
+    customers, next_cursor = fetch_page(query, spec, Customer.id)
     result = []
     for c in customers:
         result.append({
@@ -608,8 +588,7 @@ def get_customers():
             'created_at': c.created_at.isoformat() if c.created_at else None,
             'updated_at': c.updated_at.isoformat() if c.updated_at else None
         })
-    session.close()
-    return jsonify(result)
+    return jsonify(page_response(result, spec, next_cursor))
 
 @app.route('/customers', methods=['POST'])
 @cross_origin()
@@ -665,10 +644,14 @@ def update_customer(customer_id):
 # Supplier endpoints
 @app.route('/suppliers', methods=['GET'])
 def get_suppliers():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    suppliers = session.query(Supplier).all()
+    spec = parse_page_args(request.args, {'id': Supplier.id, 'name': Supplier.name, 'created_at': Supplier.created_at})
+    session = get_session()
+    query = apply_filters(session.query(Supplier), request.args, {
+        'supplier_id': Supplier.id,
+        'registration_complete': Supplier.registration_complete,
+    })
+    query = apply_date_range(query, request.args, Supplier.created_at)
+    suppliers, next_cursor = fetch_page(query, spec, Supplier.id)
     result = []
     for s in suppliers:
         result.append({
@@ -687,8 +670,7 @@ def get_suppliers():
             'banned_email': getattr(s, 'banned_email', False),
             'registration_complete': getattr(s, 'registration_complete', False)
         })
-    session.close()
-    return jsonify(result)
+    return jsonify(page_response(result, spec, next_cursor))
 
 @cross_origin()
 @app.route('/suppliers', methods=['POST'])
@@ -789,96 +771,8 @@ def delete_supplier(supplier_id):
 
 @app.route('/suppliers/performance', methods=['GET'])
 def get_suppliers_performance():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    products = session.query(Product).all()
-    result = []
-    for p in products:
-        # Find all suppliers who have supplied this product (via stock_in transactions)
-        txs = (
-            session.query(Transaction)
-            .filter(Transaction.product_id == p.id, Transaction.type == 'stock_in')
-            .order_by(Transaction.supplier_id, Transaction.date.asc())
-            .all()
-        )
-        supplier_map = {}
-        for t in txs:
-            if not t.supplier:
-                continue
-            sid = t.supplier.id
-            if sid not in supplier_map:
-                supplier_map[sid] = {
-                    'id': t.supplier.id,
-                    'name': t.supplier.name,
-                    'email': t.supplier.email,
-                    'phone': t.supplier.phone,
-                    'address': t.supplier.address,
-                    'company': t.supplier.company,
-                    'txs': []
-                }
-            supplier_map[sid]['txs'].append(t)
-        suppliers_perf = []
-        for s in supplier_map.values():
-            txs = s['txs']
-            prices = [t.product.cost if t.product and t.product.cost else t.note and float(t.note) or 0 for t in txs]
-            avg_price = round(sum(prices) / len(prices), 2) if prices else 0.0
-            lead_times = []
-            on_time = 0
-            total = 0
-            rejected = 0
-            ordered = 0
-            for t in txs:
-                lead_time = None
-                if t.note and 'lead_time=' in t.note:
-                    try:
-                        lead_time = float(t.note.split('lead_time=')[1].split()[0])
-                    except Exception:
-                        pass
-                if lead_time is not None:
-                    lead_times.append(lead_time)
-                    if lead_time <= 5:
-                        on_time += 1
-                    total += 1
-                if t.note and 'rejected=' in t.note:
-                    try:
-                        rejected += int(t.note.split('rejected=')[1].split()[0])
-                    except Exception:
-                        pass
-                ordered += t.quantity or 0
-            avg_lead_time = round(sum(lead_times) / len(lead_times), 2) if lead_times else 0.0
-            on_time_rate = round(100 * on_time / total, 1) if total else 0.0
-            rejection_rate = round(100 * rejected / ordered, 2) if ordered else 0.0
-            score = (
-                0.4 * (on_time_rate / 100) +
-                0.2 * (1 - (avg_price / max(prices) if prices and max(prices) else 0)) +
-                0.2 * (1 - rejection_rate / 100) +
-                0.2 * (1 - avg_lead_time / (max(lead_times) if lead_times else 1))
-            ) * 10
-            score = round(score, 2)
-            suppliers_perf.append({
-                'id': s['id'],
-                'name': s['name'],
-                'avg_price': avg_price,
-                'on_time_rate': on_time_rate,
-                'rejection_rate': rejection_rate,
-                'avg_lead_time': avg_lead_time,
-                'score': score,
-                'email': s['email'],
-                'phone': s['phone'],
-                'address': s['address'],
-                'company': s['company'],
-            })
-        suppliers_perf.sort(key=lambda x: (-x['score'], x['avg_price'], x['avg_lead_time']))
-        result.append({
-            'product_id': p.id,
-            'product_name': p.name,
-            'product_sku': p.sku,
-            'suppliers': suppliers_perf,
-            'no_data': len(suppliers_perf) == 0
-        })
-    session.close()
-    return jsonify(result)
+    session = get_session()
+    return jsonify(supplier_performance_rows(session))
 
 @app.route('/suppliers/<int:supplier_id>/flag_spam', methods=['POST'])
 def flag_supplier_spam(supplier_id):
@@ -926,12 +820,18 @@ def ban_supplier_email(supplier_id):
     return jsonify({'success': True, 'message': 'Supplier and user deleted and email banned'})
 
 # Order endpoints
+ORDER_SORT_COLUMNS = {'id': Order.id, 'order_date': Order.order_date, 'total_amount': Order.total_amount}
+
 @app.route('/orders', methods=['GET'])
 def get_orders():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    orders = session.query(Order).all()
+    spec = parse_page_args(request.args, ORDER_SORT_COLUMNS)
+    session = get_session()
+    query = apply_filters(session.query(Order), request.args, {
+        'status': Order.status,
+        'customer_id': Order.customer_id,
+    })
+    query = apply_date_range(query, request.args, Order.order_date)
+    orders, next_cursor = fetch_page(query, spec, Order.id)
     result = []
     for o in orders:
         # Load related data before closing session
@@ -964,8 +864,7 @@ def get_orders():
             'created_at': o.created_at.isoformat() if o.created_at else None,
             'updated_at': o.updated_at.isoformat() if o.updated_at else None
         })
-    session.close()
-    return jsonify(result)
+    return jsonify(page_response(result, spec, next_cursor))
 
 @app.route('/orders', methods=['POST'])
 def create_order():
@@ -1003,51 +902,32 @@ def create_order():
         session.add(order)
         session.flush()  # Get the order ID
         
-        # Add order items and immediately deduct stock + create transaction
+        # Lock all the order's products at once (in id order), deduct stock and add the stock out transactions
+        items = data.get('items', [])
+        products = withdraw_lines(session, [{
+            'product_id': item_data['product_id'],
+            'quantity': item_data['quantity'],
+            'note': f"Order {order_number} - {item_data.get('notes', '')}",
+        } for item_data in items], user_id=1, customer_id=data['customer_id'])
+        
         total_amount = 0.0
-        for item_data in data.get('items', []):
-            product = session.query(Product).filter_by(id=item_data['product_id']).with_for_update().first()
-            if not product:
-                session.rollback()
-                session.close()
-                return jsonify({'error': f"Product with ID {item_data['product_id']} not found"}), 400
-            
+        order_items = []
+        for item_data in items:
+            product = products[item_data['product_id']]
             unit_price = item_data.get('unit_price', product.cost or 0.0)
             quantity = item_data['quantity']
             total_price = unit_price * quantity
             total_amount += total_price
-            
-            # Check stock availability
-            if product.quantity < quantity:
-                session.rollback()
-                session.close()
-                return jsonify({'error': f'Insufficient stock for {product.name}. Available: {product.quantity}, Requested: {quantity}'}), 400
-            
-            # Deduct stock
-            product.quantity -= quantity
-            
-            # Create stock out transaction
-            transaction = Transaction(
-                type='stock_out',
-                product_id=product.id,
-                quantity=quantity,
-                location='Main Warehouse',  # Default location
-                date=datetime.now(),
-                user_id=1,  # Default user ID
-                note=f"Order {order_number} - {item_data.get('notes', '')}",
-                customer_id=data['customer_id']
-            )
-            session.add(transaction)
-            
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=product.id,
-                quantity=quantity,
-                unit_price=unit_price,
-                total_price=total_price,
-                notes=item_data.get('notes')
-            )
-            session.add(order_item)
+            order_items.append({
+                'order_id': order.id,
+                'product_id': product.id,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_price': total_price,
+                'notes': item_data.get('notes')
+            })
+        if order_items:
+            session.execute(insert(OrderItem), order_items)
         
         # Update order total
         order.total_amount = total_amount
@@ -1057,6 +937,10 @@ def create_order():
         session.close()
         return jsonify({'success': True, 'order_id': order_id, 'order_number': order_number}), 201
         
+    except StockError as e:
+        session.rollback()
+        session.close()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         session.rollback()
         session.close()
@@ -1173,36 +1057,21 @@ def process_order(order_id):
         order_number = order.order_number
         
         # Get order items
-        order_items = session.query(OrderItem).filter_by(order_id=order_id).all()
+        order_items = (session.query(OrderItem.product_id, OrderItem.quantity, OrderItem.notes)
+                       .join(Product, Product.id == OrderItem.product_id)
+                       .filter(OrderItem.order_id == order_id).all())
         
-        # Process each item (create stock out transactions)
-        for item in order_items:
-            product = item.product
-            if not product:
-                continue
-            
-            # Get product name before any potential session closure
-            product_name = product.name
-            
-            # Check if enough stock is available
-            if product.quantity < item.quantity:
-                session.close()
-                return jsonify({'error': f'Insufficient stock for {product_name}. Available: {product.quantity}, Required: {item.quantity}'}), 400
-            
-            # Create stock out transaction
-            transaction = Transaction(
-                type='stock_out',
-                product_id=item.product_id,
-                quantity=item.quantity,
-                location='Main Warehouse',  # Default location
-                date=datetime.now(),
-                user_id=1,  # Default user ID
-                note=f"Order {order_number} - {item.notes or ''}"
-            )
-            session.add(transaction)
-            
-            # Update product quantity
-            product.quantity -= item.quantity
+        # Lock the products in id order, check every item, then deduct stock and create stock out transactions
+        try:
+            withdraw_lines(session, [{
+                'product_id': item.product_id,
+                'quantity': item.quantity,
+                'note': f"Order {order_number} - {item.notes or ''}",
+            } for item in order_items], user_id=1)
+        except StockError as e:
+            session.rollback()
+            session.close()
+            return jsonify({'error': str(e)}), 400
         
         # Update order status
         order.status = OrderStatus.processing
@@ -1235,80 +1104,13 @@ def get_order_price_breakdown(order_id):
             session.close()
             return jsonify({'error': 'No items found for this order'}), 404
         
-        # Generate comprehensive price breakdown for all items
+        # Generate comprehensive price breakdown for all items in one batch
         try:
-            total_product_base_price = 0
-            total_labor_cost = 0
-            total_customization_fee = 0
-            total_installation_charge = 0
-            total_tax_amount = 0
-            total_delivery_fee = 0
-            total_procurement_cost = 0
-            all_materials_breakdown = []
-            all_skills = set()
-            total_estimated_hours = 0
-            total_quantity = 0  # Track total quantity across all items
-            
-            # Calculate delivery fee once for the entire order
-            delivery_fee = calculate_transportation_cost(order.delivery_address or "")
-            
-            for item in order_items:
-                item_breakdown = generate_price_breakdown(
-                    product_id=item.product_id,
-                    quantity=item.quantity,
-                    include_installation=False,
-                    delivery_address=order.delivery_address or ""
-                )
-                
-                # Aggregate costs
-                total_product_base_price += item_breakdown.get('product_base_price', 0)
-                total_labor_cost += item_breakdown.get('labor_cost', 0)
-                total_customization_fee += item_breakdown.get('customization_fee', 0)
-                total_installation_charge += item_breakdown.get('installation_charge', 0)
-                total_procurement_cost += item_breakdown.get('procurement_cost', 0)
-                
-                # Aggregate total quantity
-                total_quantity += item.quantity
-                
-                # Aggregate materials breakdown
-                if item_breakdown.get('materials_breakdown'):
-                    all_materials_breakdown.extend(item_breakdown['materials_breakdown'])
-                
-                # Aggregate skills
-                if item_breakdown.get('skills'):
-                    all_skills.update(item_breakdown['skills'])
-                
-                # Aggregate estimated hours
-                total_estimated_hours += item_breakdown.get('estimated_hours', 0)
-            
-            # Calculate total tax and final price
-            subtotal_before_tax = total_product_base_price + total_labor_cost + total_customization_fee + total_installation_charge
-            total_tax_amount = subtotal_before_tax * 0.18
-            total_price = subtotal_before_tax + total_tax_amount + delivery_fee
-            
-            # Calculate profit margin
-            total_overheads = 0  # Placeholder for future logic
-            net_profit = total_price - (total_procurement_cost + total_labor_cost + total_overheads)
-            profit_margin_percent = (net_profit / total_price * 100) if total_price else 0
-            
-            # Create comprehensive price breakdown
-            price_breakdown = {
-                'product_base_price': total_product_base_price,
-                'labor_cost': total_labor_cost,
-                'customization_fee': total_customization_fee,
-                'installation_charge': total_installation_charge,
-                'tax_amount': total_tax_amount,
-                'delivery_fee': delivery_fee,
-                'total_price': total_price,
-                'profit_margin_percent': round(profit_margin_percent, 2),
-                'net_profit_amount': net_profit,
-                'materials_breakdown': all_materials_breakdown,
-                'skills': list(all_skills),
-                'estimated_hours': total_estimated_hours,
-                'procurement_cost': total_procurement_cost,
-                'items_count': len(order_items),
-                'total_quantity': total_quantity
-            }
+            price_breakdown = generate_order_price_breakdown(
+                session,
+                [(item.product_id, item.quantity) for item in order_items],
+                delivery_address=order.delivery_address or ""
+            )
             
             # Add order-specific information
             price_breakdown['order_number'] = order.order_number
@@ -1864,42 +1666,40 @@ def calculate_distance():
     distance_km = R * c
     return jsonify({'distance_km': round(distance_km, 2)})
 
+def _forecast_days():
+    days = int(request.args.get('days', DEFAULT_FORECAST_DAYS))
+    if days < 1:
+        raise ValueError('days must be at least 1')
+    return days
+
+@app.route('/products/forecast', methods=['GET'])
+def bulk_stock_forecast():
+    """
+    Forecasts for every product in one call (see stock_forecasts.py).
+    Query params: days (default 14), product_id and category (comma-separated, optional)
+    """
+    try:
+        days = _forecast_days()
+        product_ids = {int(v) for v in request.args['product_id'].split(',')} if request.args.get('product_id') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    categories = set(request.args['category'].split(',')) if request.args.get('category') else None
+    table = stock_forecasts.get(days)
+    return jsonify({'days': days, 'dates': table.dates, 'forecasts': table.rows(product_ids, categories)})
+
 @app.route('/products/<int:product_id>/forecast', methods=['GET'])
 def product_stock_forecast(product_id):
     """
     Returns forecasted depletion days, smoothed daily average, and anomaly indexes for a product.
     Query param: days (default 14)
     """
-    days = int(request.args.get('days', 14))
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    product = session.query(Product).filter_by(id=product_id).first()
-    if not product:
-        session.close()
+    try:
+        days = _forecast_days()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = stock_forecasts.get(days).forecast(product_id)
+    if result is None:
         return jsonify({'error': 'Product not found'}), 404
-    # Get last N days of stock_out transactions for this product
-    from datetime import datetime, timedelta
-    since = datetime.now() - timedelta(days=days)
-    txs = (
-        session.query(Transaction)
-        .filter(Transaction.product_id == product_id, Transaction.type == 'stock_out', Transaction.date >= since)
-        .order_by(Transaction.date.asc())
-        .all()
-    )
-    # Group by day
-    daily_outflow = {}
-    for tx in txs:
-        day = tx.date.date()
-        daily_outflow.setdefault(day, 0)
-        daily_outflow[day] += tx.quantity
-    # Fill missing days with 0
-    all_days = [(since + timedelta(days=i)).date() for i in range(days)]
-    daily_outflow_list = [daily_outflow.get(day, 0) for day in all_days]
-    result = stock_forecast_analysis(product.quantity, daily_outflow_list)
-    # Add dates for anomaly indexes
-    result['anomaly_dates'] = [str(all_days[i]) for i in result['anomaly_indexes']]
-    session.close()
     return jsonify(result)
 
 @app.route('/products/<int:product_id>/purchases', methods=['GET'])
@@ -2376,32 +2176,17 @@ def get_finished_products():
     session = Session()
     
     try:
-        finished_products = session.query(FinishedProduct).all()
+        # Material/skill rollups are stored on the row (finished_product_rollups.py);
+        # skill names for the whole page come from one extra query
+        finished_products = session.query(FinishedProduct).order_by(FinishedProduct.id).all()
+        skill_names = finished_product_skill_names(session, [fp.id for fp in finished_products])
         result = []
         
         for fp in finished_products:
-            # Get skills count using direct query
-            skills_count = session.query(FinishedProductSkill).filter_by(finished_product_id=fp.id).count()
-            
-            # Get actual skills data
-            skills = []
-            skills_query = session.query(FinishedProductSkill).filter_by(finished_product_id=fp.id).all()
-            for fps in skills_query:
-                skill = session.query(Skill).filter_by(id=fps.skill_id).first()
-                if skill:
-                    skills.append(skill.name)
-            
-            # Get materials count and total materials cost
-            from sqlalchemy import text
-            materials_info = session.execute(text('''
-                SELECT COUNT(*) as count, SUM(fpm.quantity * p.cost) as total_cost
-                FROM finished_product_materials fpm
-                JOIN products p ON fpm.material_id = p.id
-                WHERE fpm.finished_product_id = :fp_id
-            '''), {'fp_id': fp.id}).fetchone()
-            
-            materials_count = materials_info[0] if materials_info[0] else 0
-            materials_cost = materials_info[1] if materials_info[1] else 0
+            skills = skill_names.get(fp.id, [])
+            skills_count = fp.skills_count or 0
+            materials_count = fp.materials_count or 0
+            materials_cost = fp.materials_cost or 0
             labor_cost = fp.total_cost - materials_cost if fp.total_cost else 0
             
             result.append({
@@ -2733,25 +2518,37 @@ def get_users():
     session.close()
     return jsonify(result)
 
+AUDIT_LOG_COLUMNS = ['id', 'product_id', 'user_id', 'field_changed', 'old_value', 'new_value', 'timestamp']
+
+def audit_log_to_dict(log):
+    return {
+        'id': log.id,
+        'product_id': log.product_id,
+        'user_id': log.user_id,
+        'field_changed': log.field_changed,
+        'old_value': log.old_value,
+        'new_value': log.new_value,
+        'timestamp': log.timestamp.isoformat() if log.timestamp else None
+    }
+
 @app.route('/audit-logs', methods=['GET'])
 def get_audit_logs():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    logs = session.query(AuditLog).all()
-    result = []
-    for log in logs:
-        result.append({
-            'id': log.id,
-            'product_id': log.product_id,
-            'user_id': log.user_id,
-            'field_changed': log.field_changed,
-            'old_value': log.old_value,
-            'new_value': log.new_value,
-            'timestamp': log.timestamp.isoformat() if log.timestamp else None
-        })
-    session.close()
-    return jsonify(result)
+    try:
+        export_format = get_export_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    spec = parse_page_args(request.args, {'id': AuditLog.id, 'timestamp': AuditLog.timestamp})
+    session = get_session()
+    query = apply_filters(session.query(AuditLog), request.args, {
+        'product_id': AuditLog.product_id,
+        'user_id': AuditLog.user_id,
+        'field_changed': AuditLog.field_changed,
+    })
+    query = apply_date_range(query, request.args, AuditLog.timestamp)
+    if export_format:
+        return stream_export(query.order_by(AuditLog.id), audit_log_to_dict, export_format, AUDIT_LOG_COLUMNS, 'audit_logs')
+    logs, next_cursor = fetch_page(query, spec, AuditLog.id)
+    return jsonify(page_response([audit_log_to_dict(log) for log in logs], spec, next_cursor))
 
 @app.route('/products/upload-photo', methods=['POST'])
 def upload_product_photo():
@@ -2997,16 +2794,35 @@ def remove_supplier_product(supplier_product_id):
 # SUPPLIER REQUESTS AND INVOICES API ENDPOINTS
 # ============================================================================
 
+def supplier_request_supplier_filter(raw):
+    try:
+        supplier_ids = [int(v) for v in raw.split(',') if v.strip()]
+    except ValueError:
+        raise PaginationError('supplier_id must be a comma-separated list of ids')
+    return or_(
+        SupplierRequest.supplier_id.in_(supplier_ids),
+        exists().where(and_(
+            supplier_request_suppliers.c.request_id == SupplierRequest.id,
+            supplier_request_suppliers.c.supplier_id.in_(supplier_ids)
+        ))
+    )
+
 # Get all supplier requests (for admin/project managers)
 @app.route('/supplier-requests', methods=['GET'])
 @cross_origin()
 def get_supplier_requests():
     import logging
+    spec = parse_page_args(request.args, {'id': SupplierRequest.id, 'created_at': SupplierRequest.created_at}, default_sort='-created_at')
+    session = get_session()
+    query = apply_filters(session.query(SupplierRequest), request.args, {
+        'status': SupplierRequest.status,
+        'priority': SupplierRequest.priority,
+        'project_id': SupplierRequest.project_id,
+        'supplier_id': supplier_request_supplier_filter,
+    })
+    query = apply_date_range(query, request.args, SupplierRequest.created_at)
     try:
-        engine = get_engine()
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        requests = session.query(SupplierRequest).order_by(SupplierRequest.created_at.desc()).all()
+        requests, next_cursor = fetch_page(query.order_by(SupplierRequest.created_at.desc()), spec, SupplierRequest.id)
         result = []
         for req in requests:
             try:
@@ -3069,8 +2885,7 @@ def get_supplier_requests():
                 'created_at': req.created_at.isoformat() if req.created_at else None,
                 'updated_at': req.updated_at.isoformat() if req.updated_at else None
             })
-        session.close()
-        return jsonify(result)
+        return jsonify(page_response(result, spec, next_cursor))
     except Exception as e:
         import traceback
         logging.error(f"Error in get_supplier_requests: {e}\n{traceback.format_exc()}")
@@ -3446,12 +3261,11 @@ def supplier_accept_request_direct(request_id):
         import json
         delivery_address = supplier_request.delivery_address or ''
         subtotal = supplier_request.total_amount or 0
-        product_category = 'machinery'
         shipping_info = calculate_supplier_shipping_cost(
             supplier_id,
             delivery_address,
             subtotal,
-            product_category
+            lines=supplier_request_tax_lines(session, request_id)
         )
         shipping_cost = shipping_info['shipping_cost']
         tax_amount = shipping_info['tax_breakdown']['total_tax']
@@ -4065,6 +3879,17 @@ def update_supplier_invoice_status(invoice_id):
 @app.route('/suppliers/nearby/<int:warehouse_id>', methods=['GET'])
 @cross_origin()
 def get_nearby_suppliers(warehouse_id):
+    """
+    The k (default 3) closest geocoded suppliers within radius_km (default 50)
+    of the warehouse, closest first, from the in-memory supplier index.
+    """
+    try:
+        radius_km = float(request.args.get('radius_km', DEFAULT_RADIUS_KM))
+        k = int(request.args.get('k', DEFAULT_NEARBY_K))
+    except ValueError:
+        return jsonify({'error': 'radius_km must be a number and k an integer'}), 400
+    if not radius_km > 0 or k < 1:
+        return jsonify({'error': 'radius_km must be positive and k at least 1'}), 400
     try:
         engine = get_engine()
         Session = sessionmaker(bind=engine)
@@ -4076,35 +3901,24 @@ def get_nearby_suppliers(warehouse_id):
             session.close()
             return jsonify({'error': 'Warehouse not found or missing coordinates'}), 404
         
-        # Get all suppliers with coordinates
-        suppliers = session.query(Supplier).filter(
-            Supplier.lat.isnot(None),
-            Supplier.lng.isnot(None)
-        ).all()
-        
-        # Calculate distances and filter nearby suppliers (within 50km)
-        nearby_suppliers = []
-        for supplier in suppliers:
-            distance = calculate_distance(
-                warehouse.lat, warehouse.lng,
-                supplier.lat, supplier.lng
-            )
-            if distance <= 50:  # 50km radius
-                nearby_suppliers.append({
-                    'id': supplier.id,
-                    'name': supplier.name,
-                    'company': supplier.company,
-                    'email': supplier.email,
-                    'phone': supplier.phone,
-                    'address': supplier.address,
-                    'distance_km': round(distance, 2),
-                    'lat': supplier.lat,
-                    'lng': supplier.lng
-                })
-        
-        # Sort by distance and return top 3
-        nearby_suppliers.sort(key=lambda x: x['distance_km'])
-        result = nearby_suppliers[:3]
+        nearest = supplier_index.get().nearby(warehouse.lat, warehouse.lng, radius_km, k)
+        suppliers = {s.id: s for s in session.query(Supplier).filter(Supplier.id.in_([sid for sid, _ in nearest]))}
+        result = []
+        for supplier_id, distance in nearest:
+            supplier = suppliers.get(supplier_id)
+            if supplier is None:
+                continue  # deleted since the index was built
+            result.append({
+                'id': supplier.id,
+                'name': supplier.name,
+                'company': supplier.company,
+                'email': supplier.email,
+                'phone': supplier.phone,
+                'address': supplier.address,
+                'distance_km': round(distance, 2),
+                'lat': supplier.lat,
+                'lng': supplier.lng
+            })
         
         session.close()
         return jsonify(result)
@@ -4563,55 +4377,59 @@ def get_warehouse_requests_for_supplier(supplier_id):
         Session = sessionmaker(bind=engine)
         session = Session()
         
-        # Get requests that are sent to suppliers
-        requests = session.query(WarehouseRequest).filter(
+        # Requests sent to suppliers from warehouses within 50km of this supplier, with the precomputed distance
+        rows = session.query(WarehouseRequest, Warehouse, SupplierWarehouseDistance.distance_km).join(
+            Warehouse, Warehouse.id == WarehouseRequest.warehouse_id
+        ).join(
+            SupplierWarehouseDistance, and_(
+                SupplierWarehouseDistance.warehouse_id == WarehouseRequest.warehouse_id,
+                SupplierWarehouseDistance.supplier_id == supplier_id
+            )
+        ).filter(
             WarehouseRequest.status.in_([
                 WarehouseRequestStatus.sent_to_suppliers,
                 WarehouseRequestStatus.suppliers_reviewing,
                 WarehouseRequestStatus.supplier_quoted
-            ])
-        ).all()
+            ]),
+            SupplierWarehouseDistance.distance_km <= DEFAULT_RADIUS_KM
+        ).order_by(WarehouseRequest.id).all()
+        
+        # Projects and this supplier's quotes for all the requests in two queries
+        project_ids = {req.project_id for req, _, _ in rows if req.project_id}
+        projects = {p.id: p for p in session.query(Project).filter(Project.id.in_(project_ids))} if project_ids else {}
+        request_ids = [req.id for req, _, _ in rows]
+        quotes = {}
+        if request_ids:
+            for quote in session.query(SupplierQuote).filter(
+                SupplierQuote.request_id.in_(request_ids),
+                SupplierQuote.supplier_id == supplier_id
+            ).order_by(SupplierQuote.id):
+                quotes.setdefault(quote.request_id, quote)
         
         result = []
-        for req in requests:
-            # Check if this supplier is nearby (within 50km)
-            warehouse = session.query(Warehouse).filter(Warehouse.id == req.warehouse_id).first()
-            supplier = session.query(Supplier).filter(Supplier.id == supplier_id).first()
+        for req, warehouse, distance in rows:
+            project = projects.get(req.project_id)
+            existing_quote = quotes.get(req.id)
             
-            if warehouse and supplier and warehouse.lat and warehouse.lng and supplier.lat and supplier.lng:
-                distance = calculate_distance(
-                    warehouse.lat, warehouse.lng,
-                    supplier.lat, supplier.lng
-                )
-                
-                if distance <= 50:  # Only show requests within 50km
-                    project = session.query(Project).filter(Project.id == req.project_id).first()
-                    
-                    # Check if supplier already submitted a quote
-                    existing_quote = session.query(SupplierQuote).filter(
-                        SupplierQuote.request_id == req.id,
-                        SupplierQuote.supplier_id == supplier_id
-                    ).first()
-                    
-                    result.append({
-                        'id': req.id,
-                        'request_number': req.request_number,
-                        'title': req.title,
-                        'description': req.description,
-                        'project_id': req.project_id,
-                        'project_name': project.name if project else None,
-                        'warehouse_id': req.warehouse_id,
-                        'warehouse_name': warehouse.name if warehouse else None,
-                        'distance_km': round(distance, 2),
-                        'priority': req.priority,
-                        'status': req.status.value if req.status else None,
-                        'required_delivery_date': req.required_delivery_date.isoformat() if req.required_delivery_date else None,
-                        'total_predicted_amount': req.total_predicted_amount,
-                        'notes': req.notes,
-                        'has_quoted': existing_quote is not None,
-                        'quote_id': existing_quote.id if existing_quote else None,
-                        'created_at': req.created_at.isoformat() if req.created_at else None
-                    })
+            result.append({
+                'id': req.id,
+                'request_number': req.request_number,
+                'title': req.title,
+                'description': req.description,
+                'project_id': req.project_id,
+                'project_name': project.name if project else None,
+                'warehouse_id': req.warehouse_id,
+                'warehouse_name': warehouse.name if warehouse else None,
+                'distance_km': round(distance, 2),
+                'priority': req.priority,
+                'status': getattr(req.status, 'value', req.status),  # the column is a plain string
+                'required_delivery_date': req.required_delivery_date.isoformat() if req.required_delivery_date else None,
+                'total_predicted_amount': req.total_predicted_amount,
+                'notes': req.notes,
+                'has_quoted': existing_quote is not None,
+                'quote_id': existing_quote.id if existing_quote else None,
+                'created_at': req.created_at.isoformat() if req.created_at else None
+            })
         
         session.close()
         return jsonify(result)
@@ -4801,48 +4619,33 @@ def calculate_labor_cost():
         if not skills:
             return jsonify({'labor_cost': 0, 'message': 'No skills provided'})
         
-        engine = get_engine()
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        
         total_labor_cost = 0
         skill_breakdown = []
         
+        # One in-memory lookup for every skill (see skill_index.py)
+        rates = skill_rate_table.rates_for(skills)
         for skill_name in skills:
-            # Find employees with this skill
-            employees_with_skill = session.query(Employee).filter(
-                Employee.skills.like(f"%{skill_name}%"),
-                Employee.is_available == True
-            ).all()
+            avg_hourly_rate, employees_count = rates[skill_name]
+            skill_cost = avg_hourly_rate * estimated_hours
+            total_labor_cost += skill_cost
             
-            if employees_with_skill:
-                # Calculate average hourly rate for this skill
-                avg_hourly_rate = sum(emp.hourly_rate for emp in employees_with_skill) / len(employees_with_skill)
-                skill_cost = avg_hourly_rate * estimated_hours
-                total_labor_cost += skill_cost
-                
+            if employees_count:
                 skill_breakdown.append({
                     'skill': skill_name,
                     'avg_hourly_rate': avg_hourly_rate,
-                    'employees_count': len(employees_with_skill),
+                    'employees_count': employees_count,
                     'skill_cost': skill_cost
                 })
             else:
-                # Use a default rate if no employees have this skill
-                default_rate = 20.0  # Default hourly rate
-                skill_cost = default_rate * estimated_hours
-                total_labor_cost += skill_cost
-                
+                # Default rate when no available employee has this skill
                 skill_breakdown.append({
                     'skill': skill_name,
-                    'avg_hourly_rate': default_rate,
+                    'avg_hourly_rate': avg_hourly_rate,
                     'employees_count': 0,
                     'skill_cost': skill_cost,
                     'note': 'No employees with this skill, using default rate'
                 })
         
-        session.close()
-        
         return jsonify({
             'labor_cost': total_labor_cost,
             'skill_breakdown': skill_breakdown,
@@ -4851,18 +4654,19 @@ def calculate_labor_cost():
         })
         
     except Exception as e:
-        session.close()
         return jsonify({'error': str(e)}), 500
 
 ALLOWED_ORIGINS = ["http://localhost:5173"]
 
 @app.route('/materials', methods=['GET'])
 def get_materials():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    spec = parse_page_args(request.args, {'id': Product.id, 'name': Product.name, 'sku': Product.sku})
+    session = get_session()
     try:
-        products = session.query(Product).filter(Product.supplier_id == None).all()
+        query = apply_filters(session.query(Product).filter(Product.supplier_id == None), request.args, {
+            'category': Product.category,
+        })
+        products, next_cursor = fetch_page(query, spec, Product.id)
         result = []
         for product in products:
             # Ensure reorder_level and quantity are floats, default 0 if None
@@ -4913,10 +4717,8 @@ def get_materials():
                 'stock_status': stock_status,
                 'supplier_info': supplier_info
             })
-        session.close()
-        return jsonify(result)
+        return jsonify(page_response(result, spec, next_cursor))
     except Exception as e:
-        session.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/materials/<int:material_id>', methods=['PUT'])
@@ -5048,35 +4850,110 @@ def upload_material_photo():
     url = f'/static/product_photos/{filename}'
     return jsonify({'url': url})
 
-# Load truck cost model at startup
-try:
-    with open("chosen_truck_cost_model.json", "r", encoding="utf-8") as f:
-        TRUCK_COST_CFG = json.load(f)
-except Exception:
-    TRUCK_COST_CFG = None
-
 def predict_truck_cost(distance_km: float) -> float:
-    if not TRUCK_COST_CFG:
-        return 0.0
-    name = TRUCK_COST_CFG["model_name"]
-    params = TRUCK_COST_CFG["params"]
-    d = float(distance_km)
-    if name == "linear":
-        return params["F"] + params["v"] * d
-    elif name == "exp_decay":
-        return d * (params["c_min"] + (params["c0"] - params["c_min"]) * math.exp(-params["k"] * d))
-    elif name == "piecewise":
-        b1 = params["b1"]; b2 = params["b2"]
-        seg1 = min(d, b1)
-        seg2 = 0.0 if d <= b1 else min(d - b1, b2 - b1)
-        seg3 = 0.0 if d <= b2 else d - b2
-        return (params["F"] + params["m1"] * seg1 + params["m2"] * seg2 + params["m3"] * seg3)
-    else:
-        return 0.0
+    cost = truck_cost_model.predict(distance_km)
+    return cost if cost is not None else 0.0
+
+def supplier_request_tax_lines(session, request_id):
+    """[{'amount', 'category'}] of a supplier request's items, for per-category GST"""
+    rows = session.query(SupplierRequestItem.quantity, SupplierRequestItem.unit_price, Product.category) \
+        .outerjoin(Product, Product.id == SupplierRequestItem.product_id) \
+        .filter(SupplierRequestItem.request_id == request_id) \
+        .order_by(SupplierRequestItem.id).all()
+    return [{'amount': (quantity or 0) * (unit_price or 0), 'category': category} for quantity, unit_price, category in rows]
+
+def supplier_tax_total(subtotal, shipping_cost, supplier_address, product_category=None, lines=None):
+    if lines:
+        return tax_calculator.calculate_lines_with_taxes(lines, shipping_cost, supplier_address)
+    return tax_calculator.calculate_total_with_taxes(
+        subtotal=subtotal,
+        shipping_cost=shipping_cost,
+        supplier_address=supplier_address,
+        product_category=product_category
+    )
+
+def shipping_error(error, supplier_location='Unknown'):
+    """Shipping info of a supplier that cannot be located"""
+    return {
+        'error': error,
+        'distance_km': None,
+        'shipping_cost': None,
+        'supplier_location': supplier_location,
+        'tax_breakdown': None,
+        'grand_total': None,
+        'tax_display': None
+    }
+
+def locate_suppliers(suppliers):
+    """
+    {supplier_id: (lat, lng) or shipping_error(...)} for Supplier rows: their
+    stored coordinates, else their addresses geocoded in one batch.
+    """
+    located = {}
+    ungeocoded = []
+    for supplier in suppliers:
+        if supplier.lat and supplier.lng:
+            located[supplier.id] = (supplier.lat, supplier.lng)
+        elif supplier.address:
+            ungeocoded.append(supplier)
+        else:
+            located[supplier.id] = shipping_error('Supplier address missing')
+    if ungeocoded:
+        try:
+            found = get_geocoder().geocode_many([s.address for s in ungeocoded])
+        except Exception as e:
+            print(f"DEBUG: Exception during geocoding: {e}")
+            found = {}
+        for supplier in ungeocoded:
+            if supplier.address not in found:
+                # geocode_many leaves out lookups that failed
+                located[supplier.id] = shipping_error('Error geocoding supplier address', supplier.address)
+            elif found[supplier.address] is None:
+                located[supplier.id] = shipping_error('Could not geocode supplier address', supplier.address)
+            else:
+                located[supplier.id] = found[supplier.address]
+    return located
 
-def calculate_supplier_shipping_cost(supplier_id: int, delivery_address: str = None, subtotal: float = 0, product_category: str = None) -> dict:
+def supplier_shipping_infos(session, orders, suppliers, located):
+    """
+    Shipping cost and taxes of orders [(supplier_id, subtotal, product_category, lines)]
+    (see calculate_supplier_shipping_cost), with suppliers {id: Supplier} and
+    located from locate_suppliers(): main warehouse distances in one query,
+    truck costs and itemized taxes vectorized.
+    """
+    coords = {sid: where for sid, where in located.items() if isinstance(where, tuple)}
+    distances = main_warehouse_distances(session, [(sid, lat, lng) for sid, (lat, lng) in coords.items()])
+    priced = [i for i, order in enumerate(orders) if order[0] in coords]
+    distance_km = np.array([distances[orders[i][0]] for i in priced], dtype=float)
+    costs = truck_cost_model.predict_many(distance_km)
+    costs = np.zeros_like(distance_km) if costs is None else costs
+    shipping = dict(zip(priced, zip(distance_km.tolist(), costs.tolist())))
+    locations = {i: suppliers[orders[i][0]].address or 'Unknown' for i in priced}
+    itemized = [i for i in priced if orders[i][3]]
+    taxes = dict(zip(itemized, tax_calculator.calculate_lines_with_taxes_many(
+        [(orders[i][3], shipping[i][1], locations[i]) for i in itemized])))
+    infos = []
+    for i, (supplier_id, subtotal, product_category, lines) in enumerate(orders):
+        if i not in shipping:
+            infos.append(located[supplier_id])
+            continue
+        distance, cost = shipping[i]
+        tax = taxes[i] if i in taxes else supplier_tax_total(subtotal, cost, locations[i], product_category)
+        infos.append({
+            'distance_km': round(distance, 2),
+            'shipping_cost': round(cost, 2),
+            'supplier_location': locations[i],
+            'tax_breakdown': tax['tax_breakdown'],
+            'grand_total': tax['grand_total'],
+            'tax_display': tax['breakdown_display']
+        })
+    return infos
+
+def calculate_supplier_shipping_cost(supplier_id: int, delivery_address: str = None, subtotal: float = 0, product_category: str = None, lines: list = None) -> dict:
     """
     Calculate shipping cost and taxes for a specific supplier based on their location
+    lines: optional [{'amount', 'category'}] (see supplier_request_tax_lines) to tax each item
+    at its own category's rate instead of the whole subtotal at product_category's
     Returns: {'distance_km': float, 'shipping_cost': float, 'supplier_location': str, 'tax_breakdown': dict, 'grand_total': float}
     """
     try:
@@ -5088,108 +4965,23 @@ def calculate_supplier_shipping_cost(supplier_id: int, delivery_address: str = N
         supplier = session.query(Supplier).filter(Supplier.id == supplier_id).first()
         if not supplier:
             session.close()
-            return {
-                'error': 'Supplier not found',
-                'distance_km': None,
-                'shipping_cost': None,
-                'supplier_location': 'Unknown',
-                'tax_breakdown': None,
-                'grand_total': None,
-                'tax_display': None
-            }
-        # Warehouse location (Pune, India) - main warehouse
-        warehouse_lat, warehouse_lng = 18.5204, 73.8567
-        # Try to get supplier coordinates
-        if supplier.lat and supplier.lng:
-            supplier_lat, supplier_lng = supplier.lat, supplier.lng
-        else:
-            # Geocode supplier address if coordinates not available
-            try:
-                if supplier.address:
-                    geocode_url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{supplier.address}.json?access_token={MAPBOX_TOKEN}&country=IN"
-                    print('DEBUG: Mapbox geocode URL:', geocode_url)
-                    geocode_response = requests.get(geocode_url)
-                    geocode_data = geocode_response.json()
-                    print('DEBUG: Mapbox geocode response:', geocode_data)
-                    if geocode_data.get('features') and len(geocode_data['features']) > 0:
-                        supplier_lng, supplier_lat = geocode_data['features'][0]['center']
-                        print('DEBUG: Saving lat/lng to supplier:', supplier_lat, supplier_lng)
-                        # Update supplier coordinates in database
-                        supplier.lat = supplier_lat
-                        supplier.lng = supplier_lng
-                        session.commit()
-                    else:
-                        print('DEBUG: No features found in geocode response')
-                        session.close()
-                        return {
-                            'error': 'Could not geocode supplier address',
-                            'distance_km': None,
-                            'shipping_cost': None,
-                            'supplier_location': supplier.address or 'Unknown',
-                            'tax_breakdown': None,
-                            'grand_total': None,
-                            'tax_display': None
-                        }
-                else:
-                    print('DEBUG: Supplier address missing')
-                    session.close()
-                    return {
-                        'error': 'Supplier address missing',
-                        'distance_km': None,
-                        'shipping_cost': None,
-                        'supplier_location': 'Unknown',
-                        'tax_breakdown': None,
-                        'grand_total': None,
-                        'tax_display': None
-                    }
-            except Exception as e:
-                print(f"DEBUG: Exception during Mapbox geocoding: {e}")
-                session.close()
-                return {
-                    'error': f'Error geocoding supplier address: {e}',
-                    'distance_km': None,
-                    'shipping_cost': None,
-                    'supplier_location': supplier.address or 'Unknown',
-                    'tax_breakdown': None,
-                    'grand_total': None,
-                    'tax_display': None
-                }
-        # Calculate distance using Haversine formula
-        R = 6371  # Earth's radius in kilometers
-        lat1, lng1, lat2, lng2 = map(radians, [warehouse_lat, warehouse_lng, supplier_lat, supplier_lng])
-        dlat = lat2 - lat1
-        dlng = lng2 - lng1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlng/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        distance_km = R * c
-        shipping_cost = predict_truck_cost(distance_km)
-        tax_calculation = tax_calculator.calculate_total_with_taxes(
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            supplier_address=supplier.address or 'Unknown',
-            product_category=product_category
-        )
-        session.close()
-        return {
-            'distance_km': round(distance_km, 2),
-            'shipping_cost': round(shipping_cost, 2),
-            'supplier_location': supplier.address or 'Unknown',
-            'tax_breakdown': tax_calculation['tax_breakdown'],
-            'grand_total': tax_calculation['grand_total'],
-            'tax_display': tax_calculation['breakdown_display']
-        }
+            return shipping_error('Supplier not found')
+        located = locate_suppliers([supplier])
+        if not (supplier.lat and supplier.lng) and isinstance(located[supplier.id], tuple):
+            # Update supplier coordinates in database
+            supplier.lat, supplier.lng = located[supplier.id]
+            session.commit()
+        info = supplier_shipping_infos(session, [(supplier.id, subtotal, product_category, lines)],
+                                       {supplier.id: supplier}, located)[0]
+        session.close()
+        return info
     except Exception as e:
         print(f"Error calculating supplier shipping cost: {e}")
         import traceback
         traceback.print_exc()
         distance_km = 500
         shipping_cost = predict_truck_cost(distance_km)
-        tax_calculation = tax_calculator.calculate_total_with_taxes(
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            supplier_address='Unknown',
-            product_category=product_category
-        )
+        tax_calculation = supplier_tax_total(subtotal, shipping_cost, 'Unknown', product_category, lines)
         return {
             'distance_km': distance_km,
             'shipping_cost': shipping_cost,
@@ -5199,13 +4991,120 @@ def calculate_supplier_shipping_cost(supplier_id: int, delivery_address: str = N
             'tax_display': tax_calculation['breakdown_display']
         }
 
-@app.route('/predict_truck_cost', methods=['GET'])
+MAX_TAX_BATCH_LINES = int(os.getenv('MAX_TAX_BATCH_LINES', '500000'))
+
+def parse_date_range(start_date, end_date):
+    """
+    (start, end) datetimes of a start_date / end_date pair of ISO strings, for
+    `>= start` and `< end`. A date-only end_date covers that whole day, so
+    end_date=2025-09-30 ends at midnight on Oct 1; a full timestamp stays
+    inclusive. Raises ValueError on a malformed date.
+    """
+    start_dt = datetime.fromisoformat(start_date) if start_date else None
+    end_dt = None
+    if end_date:
+        end_dt = datetime.fromisoformat(end_date)
+        try:
+            date.fromisoformat(end_date)
+            end_dt += timedelta(days=1)
+        except ValueError:
+            end_dt += timedelta(microseconds=1)
+    return start_dt, end_dt
+
+def stored_invoice_tax_inputs(session, start_dt=None, end_dt=None):
+    """calculate_batch() input for the supplier invoices issued in [start_dt, end_dt), lines from their items"""
+    query = session.query(SupplierInvoice.id, SupplierInvoice.invoice_number, SupplierInvoice.subtotal,
+                          SupplierInvoice.shipping_amount, SupplierInvoice.tax_amount, Supplier.address) \
+        .outerjoin(Supplier, Supplier.id == SupplierInvoice.supplier_id)
+    item_query = session.query(SupplierInvoiceItem.invoice_id, SupplierInvoiceItem.total_price, Product.category) \
+        .join(SupplierInvoice, SupplierInvoice.id == SupplierInvoiceItem.invoice_id) \
+        .outerjoin(Product, Product.id == SupplierInvoiceItem.product_id)
+    if start_dt:
+        query = query.filter(SupplierInvoice.issue_date >= start_dt)
+        item_query = item_query.filter(SupplierInvoice.issue_date >= start_dt)
+    if end_dt:
+        query = query.filter(SupplierInvoice.issue_date < end_dt)
+        item_query = item_query.filter(SupplierInvoice.issue_date < end_dt)
+    lines = defaultdict(list)
+    for invoice_id, total_price, category in item_query.order_by(SupplierInvoiceItem.id):
+        lines[invoice_id].append({'amount': total_price or 0, 'category': category})
+    return [{
+        'id': invoice_id,
+        'invoice_number': invoice_number,
+        'supplier_address': address or 'Unknown',
+        'shipping_cost': shipping_amount or 0,
+        'stored_tax_amount': tax_amount,
+        # An invoice without items is taxed on its subtotal at the default rate
+        'lines': lines.get(invoice_id) or [{'amount': subtotal or 0, 'category': None}]
+    } for invoice_id, invoice_number, subtotal, shipping_amount, tax_amount, address in query.order_by(SupplierInvoice.id)]
+
+@app.route('/tax/batch', methods=['POST'])
+@cross_origin()
+def calculate_tax_batch():
+    """
+    GST for many invoices in one call. Body either
+      {"invoices": [{"id", "supplier_address" or "supplier_state", "shipping_cost",
+                     "lines": [{"amount" (or "quantity" and "unit_price"), "category"}]}]}
+    or {"start_date": "2025-09-01", "end_date": "2025-09-30"} to recompute the stored
+    supplier invoices issued in that range from their items' product categories.
+    Response: per-invoice and per-line CGST/SGST/IGST, and totals over the batch.
+    """
+    data = request.get_json(silent=True) or {}
+    invoices = data.get('invoices')
+    stored = invoices is None
+    if stored:
+        try:
+            start_dt, end_dt = parse_date_range(data.get('start_date'), data.get('end_date'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'start_date and end_date must be ISO dates'}), 400
+        if not start_dt and not end_dt:
+            return jsonify({'error': 'Send invoices, or a start_date / end_date range of stored invoices'}), 400
+        invoices = stored_invoice_tax_inputs(get_session(), start_dt, end_dt)
+    if not isinstance(invoices, list):
+        return jsonify({'error': 'invoices must be a list'}), 400
+    line_count = sum(len(invoice.get('lines') or []) for invoice in invoices if isinstance(invoice, dict))
+    if line_count > MAX_TAX_BATCH_LINES:
+        return jsonify({'error': f'At most {MAX_TAX_BATCH_LINES} lines per batch'}), 400
+    try:
+        result = tax_calculator.calculate_batch(invoices)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if stored:
+        for invoice, computed in zip(invoices, result['invoices']):
+            computed['invoice_number'] = invoice['invoice_number']
+            computed['stored_tax_amount'] = invoice['stored_tax_amount']
+    return jsonify(result)
+
+@app.route('/predict_truck_cost', methods=['GET', 'POST'])
 def predict_truck_cost_api():
-    distance_km = float(request.args.get('distance_km', 0))
-    print(f'Predicting truck cost for distance: {distance_km}')
-    cost = predict_truck_cost(distance_km)
-    print(f'Predicted cost: {cost}')
-    return jsonify({'distance_km': distance_km, 'predicted_cost_inr': cost})
+    """
+    GET ?distance_km=X prices one distance. For many destinations at once send
+    POST {"distances_km": [...]} or GET ?distances_km=120,480,1500.
+    """
+    if request.method == 'POST':
+        distances = (request.get_json(silent=True) or {}).get('distances_km')
+    elif 'distances_km' in request.args:
+        distances = [d for d in request.args['distances_km'].split(',') if d.strip()]
+    else:
+        distance_km = float(request.args.get('distance_km', 0))
+        print(f'Predicting truck cost for distance: {distance_km}')
+        cost = predict_truck_cost(distance_km)
+        print(f'Predicted cost: {cost}')
+        return jsonify({'distance_km': distance_km, 'predicted_cost_inr': cost})
+
+    if not isinstance(distances, list):
+        return jsonify({'error': 'distances_km must be a list of numbers'}), 400
+    try:
+        distances = np.asarray(distances, dtype=float)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'distances_km must be a list of numbers'}), 400
+    # float() also reads 'inf' and 'nan', which jsonify would write as invalid JSON
+    if distances.ndim != 1 or not np.isfinite(distances).all() or (distances < 0).any():
+        return jsonify({'error': 'distances_km must be a list of finite, non-negative numbers'}), 400
+    costs = truck_cost_model.predict_many(distances)
+    if costs is None:
+        costs = np.zeros_like(distances)
+    return jsonify({'distances_km': distances.tolist(), 'predicted_costs_inr': costs.tolist()})
 
 @app.route('/supplier-shipping-cost/<int:supplier_id>', methods=['GET'])
 @cross_origin()
@@ -5248,41 +5147,11 @@ def calculate_delivery_distance():
     # Warehouse location (Pune, India)
     warehouse_lat, warehouse_lng = 18.5204, 73.8567
     
-    # Predefined coordinates for major Indian cities
-    city_coordinates = {
-        'mumbai': (19.0760, 72.8777),
-        'delhi': (28.7041, 77.1025),
-        'bangalore': (12.9716, 77.5946),
-        'hyderabad': (17.3850, 78.4867),
-        'chennai': (13.0827, 80.2707),
-        'kolkata': (22.5726, 88.3639),
-        'pune': (18.5204, 73.8567),
-        'ahmedabad': (23.0225, 72.5714),
-        'surat': (21.1702, 72.8311),
-        'jaipur': (26.9124, 75.7873),
-        'lucknow': (26.8467, 80.9462),
-        'kanpur': (26.4499, 80.3319),
-        'nagpur': (21.1458, 79.0882),
-        'indore': (22.7196, 75.8577),
-        'thane': (19.2183, 72.9781),
-        'bhopal': (23.2599, 77.4126),
-        'visakhapatnam': (17.6868, 83.2185),
-        'patna': (25.5941, 85.1376),
-        'vadodara': (22.3072, 73.1812),
-        'ghaziabad': (28.6692, 77.4538)
-    }
-    
     try:
-        # Check if the address contains any known city names
-        address_lower = delivery_address.lower()
-        matched_city = None
-        matched_coords = None
-        
-        for city, coords in city_coordinates.items():
-            if city in address_lower:
-                matched_city = city
-                matched_coords = coords
-                break
+        # Known city in the address (gazetteer, word-boundary match)
+        match = gazetteer.resolve(delivery_address)
+        matched_city = match.city
+        matched_coords = match.coords
         
         if matched_coords:
             delivery_lat, delivery_lng = matched_coords
@@ -5324,59 +5193,40 @@ def calculate_delivery_distance():
         print(f"Error calculating delivery distance: {e}")
         return jsonify({'error': 'Distance calculation failed'}), 500
 
+def _history_args():
+    """period (day/week/month, default month) and optional start_date/end_date ISO dates"""
+    period = request.args.get('period', 'month')
+    if period not in HISTORY_PERIODS:
+        raise ValueError(f"period must be one of {', '.join(HISTORY_PERIODS)}")
+    start = date.fromisoformat(request.args['start_date'][:10]) if request.args.get('start_date') else None
+    end = date.fromisoformat(request.args['end_date'][:10]) if request.args.get('end_date') else None
+    return period, start, end
+
 @app.route('/materials/<int:material_id>/price_history', methods=['GET'])
 @cross_origin()
 def material_price_history(material_id):
-    import random
-    from datetime import datetime, timedelta
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    from sqlalchemy import text
-    rows = session.execute(
-        text("""
-        SELECT DATE_FORMAT(t.date, '%Y-%m') AS month, AVG(p.cost) AS avg_price
-        FROM transactions t
-        JOIN products p ON t.product_id = p.id
-        WHERE t.type = 'stock_in' AND t.product_id = :mid
-        GROUP BY month
-        ORDER BY month
-        """), {'mid': material_id}
-    ).fetchall()
-    session.close()
-    if rows and len(rows) > 0:
-        return jsonify([{'month': row[0], 'price': float(row[1])} for row in rows])
-    # If no data, generate 12 months of random prices
-    today = datetime.today()
-    base_price = random.uniform(50, 200)  # Sensible base price
-    data = []
-    for i in range(12, 0, -1):
-        month = (today.replace(day=1) - timedelta(days=30*i)).strftime('%Y-%m')
-        # Simulate some price fluctuation
-        price = base_price + random.uniform(-0.15, 0.15) * base_price + random.uniform(-5, 5)
-        price = max(10, round(price, 2))
-        data.append({'month': month, 'price': price})
-    data.sort(key=lambda x: x['month'])
-    return jsonify(data)
+    """
+    Average unit price paid per month (or ?period=week/day) from the daily
+    rollup, weighted by units received. Periods without deliveries are skipped.
+    """
+    try:
+        period, start, end = _history_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    history = product_history(get_session(), material_id, period, start, end)
+    return jsonify([{period: row['period'], 'price': round(row['avg_unit_price'], 2)}
+                    for row in history if row['avg_unit_price'] is not None])
 
 @app.route('/materials/<int:material_id>/demand_history', methods=['GET'])
 @cross_origin()
 def material_demand_history(material_id):
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    from sqlalchemy import text
-    rows = session.execute(
-        text("""
-        SELECT DATE_FORMAT(date, '%Y-%m') AS month, SUM(quantity) AS total_demand
-        FROM transactions
-        WHERE type = 'stock_out' AND product_id = :mid
-        GROUP BY month
-        ORDER BY month
-        """), {'mid': material_id}
-    ).fetchall()
-    session.close()
-    return jsonify([{'month': row[0], 'demand': float(row[1])} for row in rows])
+    """Units issued (stock_out) per month (or ?period=week/day) from the daily rollup"""
+    try:
+        period, start, end = _history_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    history = product_history(get_session(), material_id, period, start, end)
+    return jsonify([{period: row['period'], 'demand': row['units_out']} for row in history if row['units_out']])
 
 @app.route('/holidays', methods=['GET'])
 def get_holidays():
@@ -5388,12 +5238,24 @@ def get_holidays():
     session.close()
     return jsonify(result)
 
+def _prediction_json(prediction):
+    return dict(prediction, predicted_end_date=prediction['predicted_end_date'].isoformat())
+
 @app.route('/projects/predict-end-date', methods=['POST'])
 def predict_project_end_date():
+    """
+    Critical path prediction for a project (see project_timeline.py).
+    Optional "scenarios": list of field overrides, each predicted in the same call.
+    """
     project_data = request.json
     try:
-        predicted_date = calculate_project_end_date(project_data)
-        return jsonify({'predicted_end_date': predicted_date.isoformat()})
+        scenarios = project_data.pop('scenarios', None)
+        result = _prediction_json(schedule_project(project_data))
+        if scenarios is not None:
+            if not isinstance(scenarios, list) or not all(isinstance(sc, dict) for sc in scenarios):
+                return jsonify({'error': 'scenarios must be a list of objects'}), 400
+            result['scenarios'] = [_prediction_json(p) for p in predict_scenarios(project_data, scenarios)]
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -5409,12 +5271,19 @@ def match_products():
       "phase_type": "3-phase",
       "mount_type": "Outdoor",
       "compliance": "IS-8623",
-      "preferred_features": "Remote monitoring"
+      "preferred_features": "Remote monitoring",
+      "top_k": 50
     }
-    Response: List of matched products with scores and explanations
+    Response: The top_k best matched products with scores and explanations
     """
     data = request.get_json()
-    result = match_products_to_requirements(data)
+    try:
+        top_k = int(data.get('top_k', DEFAULT_MATCH_TOP_K))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_k must be an integer'}), 400
+    if top_k < 1:
+        return jsonify({'error': 'top_k must be at least 1'}), 400
+    result = match_products_to_requirements(data, top_k=top_k)
     return jsonify({'matches': result})
 
 # --- Price Breakdown API ---
@@ -6034,6 +5903,221 @@ def get_fulfillment_status(request_id):
         return jsonify({'error': str(e)}), 500
 
 # PDF Invoice Download Endpoints
+def invoice_item_rows(session, request_ids):
+    """{request_id: [item rows with product_name, product_sku, category]} in one query"""
+    # Plain column rows: loading thousands of items as ORM objects costs more than the query
+    rows = session.query(SupplierRequestItem.id, SupplierRequestItem.request_id, SupplierRequestItem.product_id,
+                         SupplierRequestItem.quantity, SupplierRequestItem.unit_price,
+                         SupplierRequestItem.specifications, SupplierRequestItem.notes,
+                         Product.name.label('product_name'), Product.sku.label('product_sku'), Product.category) \
+        .outerjoin(Product, Product.id == SupplierRequestItem.product_id) \
+        .filter(SupplierRequestItem.request_id.in_(request_ids)) \
+        .order_by(SupplierRequestItem.request_id, SupplierRequestItem.id).all()
+    by_request = defaultdict(list)
+    for row in rows:
+        by_request[row.request_id].append(row)
+    return by_request
+
+def invoice_shipping_basis(session):
+    """What invoice shipping costs depend on besides the supplier: the truck cost model and the main warehouse"""
+    return {
+        'truck_cost_model': truck_cost_model.signature,
+        'main_warehouse': list(main_warehouse_location(session))
+    }
+
+def invoice_pdf_job(request_data, item_rows, supplier_data, fulfillment, shipping_basis):
+    """
+    What goes into one invoice PDF: the request, supplier and fulfillment dicts,
+    the invoice number, the tax lines and the cache key inputs.
+    shipping_basis is invoice_shipping_basis(session).
+    """
+    request_dict = {
+        'id': request_data.id,
+        'request_number': request_data.request_number,
+        'title': request_data.title,
+        'description': request_data.description,
+        'priority': request_data.priority,
+        'status': request_data.status.value if hasattr(request_data.status, 'value') else request_data.status,
+        'expected_delivery_date': request_data.expected_delivery_date.isoformat() if request_data.expected_delivery_date else None,
+        'delivery_address': request_data.delivery_address,
+        'total_amount': request_data.total_amount,
+        'notes': request_data.notes,
+        'created_at': request_data.created_at.isoformat() if request_data.created_at else None,
+        'items': []
+    }
+    tax_lines = []
+    for item in item_rows:
+        request_dict['items'].append({
+            'id': item.id,
+            'product_id': item.product_id,
+            'product_name': item.product_name or 'Unknown Product',
+            'product_sku': item.product_sku or 'N/A',
+            'quantity': item.quantity,
+            'unit_price': item.unit_price,
+            'total_price': item.quantity * item.unit_price,
+            'specifications': item.specifications,
+            'notes': item.notes
+        })
+        tax_lines.append({'amount': (item.quantity or 0) * (item.unit_price or 0), 'category': item.category})
+    
+    supplier_dict = {
+        'id': supplier_data.id,
+        'name': supplier_data.name,
+        'email': supplier_data.email,
+        'status': 'accepted'  # Default status for invoice generation
+    }
+    
+    fulfillment_dict = {
+        'fulfillment_status': fulfillment.fulfillment_status,
+        'packing_timestamp': fulfillment.packing_timestamp.isoformat() if fulfillment.packing_timestamp else None,
+        'dispatched_timestamp': fulfillment.dispatched_timestamp.isoformat() if fulfillment.dispatched_timestamp else None,
+        'delivered_timestamp': fulfillment.delivered_timestamp.isoformat() if fulfillment.delivered_timestamp else None,
+        'created_at': request_data.created_at.isoformat() if request_data.created_at else None
+    }
+    
+    invoice_number = f"INV-{request_data.id:04d}-{supplier_data.id:04d}-{datetime.now().strftime('%Y%m%d')}"
+    # Everything the PDF depends on. Shipping is a function of the supplier's location, the tax
+    # lines, the truck cost model and the main warehouse's location; GST rates are code
+    # (bump invoice_pdfs.RENDER_VERSION when they change)
+    key_inputs = {
+        'request': request_dict,
+        'supplier': supplier_dict,
+        'supplier_location': [supplier_data.address, supplier_data.lat, supplier_data.lng],
+        'shipping_basis': shipping_basis,
+        'fulfillment': fulfillment_dict,
+        'invoice_number': invoice_number,
+        'tax_lines': tax_lines
+    }
+    return {
+        'request': request_dict,
+        'supplier': supplier_dict,
+        'fulfillment': fulfillment_dict,
+        'invoice_number': invoice_number,
+        'tax_lines': tax_lines,
+        'key_inputs': key_inputs
+    }
+
+def send_invoice_pdf(session, request_data, supplier_id, fulfillment):
+    """
+    The invoice PDF of a supplier request for one supplier, from the PDF cache
+    or rendered by the pool (see invoice_pdfs.py). Closes the session.
+    """
+    supplier_data = session.get(Supplier, supplier_id)
+    job = invoice_pdf_job(request_data, invoice_item_rows(session, [request_data.id])[request_data.id],
+                          supplier_data, fulfillment, invoice_shipping_basis(session))
+    download_name = f"invoice_{request_data.request_number}_{supplier_data.name}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    session.close()
+    
+    def build_args():
+        # Calculate shipping cost and taxes for this supplier, each item at its product category's rate
+        shipping_info = calculate_supplier_shipping_cost(
+            supplier_data.id,
+            job['request'].get('delivery_address'),
+            job['request'].get('total_amount') or 0,
+            lines=job['tax_lines']
+        )
+        return job['request'], job['supplier'], job['fulfillment'], job['invoice_number'], shipping_info
+    
+    pdf, digest = invoice_pdfs.get_or_render(request_data.id, supplier_data.id, job['key_inputs'], build_args)
+    return send_file(
+        io.BytesIO(pdf),
+        as_attachment=True,
+        download_name=download_name,
+        mimetype='application/pdf',
+        conditional=True,
+        etag=digest
+    )
+
+def invoice_shipping_infos(jobs, suppliers, session):
+    """
+    calculate_supplier_shipping_cost(...) for many invoice jobs at once, through
+    the same supplier_shipping_infos, with missing supplier coordinates geocoded
+    in one batch (not saved, as the export only reads).
+    """
+    orders = [(job['supplier']['id'], job['request'].get('total_amount') or 0, None, job['tax_lines']) for job in jobs]
+    return supplier_shipping_infos(session, orders, suppliers, locate_suppliers(suppliers.values()))
+
+MAX_BULK_INVOICES = int(os.getenv('MAX_BULK_INVOICES', '5000'))
+
+@app.route('/supplier-requests/invoices/export', methods=['GET', 'POST'])
+@cross_origin()
+def export_invoice_pdfs():
+    """
+    ZIP of the invoice PDFs of many supplier requests, one per accepted supplier,
+    streamed while the pool renders them. GET ?request_ids=1,2,3 or
+    ?start_date=2025-09-01&end_date=2025-09-30 (request created_at, the end day
+    included); POST takes the same keys in a JSON body.
+    """
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    try:
+        request_ids = params.get('request_ids')
+        if isinstance(request_ids, str):
+            request_ids = [part for part in request_ids.split(',') if part.strip()]
+        request_ids = [int(i) for i in request_ids] if request_ids is not None else None
+        start_dt, end_dt = parse_date_range(params.get('start_date'), params.get('end_date'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'request_ids must be integers and start_date / end_date ISO dates'}), 400
+    if request_ids is None and not start_dt and not end_dt:
+        return jsonify({'error': 'Send request_ids, or a start_date / end_date range'}), 400
+    
+    # A fixed number of queries whatever the number of invoices
+    session = get_session()
+    query = session.query(SupplierRequest)
+    if request_ids is not None:
+        query = query.filter(SupplierRequest.id.in_(request_ids))
+    if start_dt:
+        query = query.filter(SupplierRequest.created_at >= start_dt)
+    if end_dt:
+        query = query.filter(SupplierRequest.created_at < end_dt)
+    requests_by_id = {r.id: r for r in query.order_by(SupplierRequest.id)}
+    accepted = session.execute(
+        text("SELECT request_id, supplier_id, fulfillment_status, packing_timestamp, dispatched_timestamp, delivered_timestamp "
+             "FROM supplier_request_suppliers WHERE supplier_status = 'accepted' AND request_id IN :request_ids "
+             "ORDER BY request_id, supplier_id").bindparams(bindparam('request_ids', expanding=True)),
+        {'request_ids': list(requests_by_id)}
+    ).fetchall() if requests_by_id else []
+    if not accepted:
+        return jsonify({'error': 'No accepted supplier requests match'}), 404
+    if len(accepted) > MAX_BULK_INVOICES:
+        return jsonify({'error': f'{len(accepted)} invoices match; at most {MAX_BULK_INVOICES} per export'}), 400
+    suppliers = {s.id: s for s in session.query(Supplier).filter(Supplier.id.in_({row.supplier_id for row in accepted}))}
+    items = invoice_item_rows(session, list({row.request_id for row in accepted}))
+    shipping_basis = invoice_shipping_basis(session)
+
+    jobs = []
+    for row in accepted:
+        supplier = suppliers.get(row.supplier_id)
+        if supplier is None:
+            continue
+        job = invoice_pdf_job(requests_by_id[row.request_id], items.get(row.request_id, []), supplier, row,
+                              shipping_basis)
+        _, job['digest'], job['cached'] = invoice_pdfs.cached(row.request_id, supplier.id, job['key_inputs'])
+        job['name'] = f"invoice_{job['request']['request_number']}_{supplier.id}_{secure_filename(supplier.name or '')}.pdf"
+        jobs.append(job)
+    # Shipping and taxes only for the PDFs that are not cached yet
+    misses = [job for job in jobs if not job['cached']]
+    for job, shipping_info in zip(misses, invoice_shipping_infos(misses, suppliers, session) if misses else []):
+        job['args'] = (job['request'], job['supplier'], job['fulfillment'], job['invoice_number'], shipping_info)
+    session.close()
+    # Keep only what rendering needs; cached invoices drop their request and item dicts here
+    jobs = [(job['name'], (job['request']['id'], job['supplier']['id'], job['digest'], job.get('args'))) for job in jobs]
+    del misses
+    
+    def members():
+        failed = []
+        rendered = invoice_pdfs.iter_rendered(render_job for _, render_job in jobs)
+        for (name, _), (_, result) in zip(jobs, rendered):
+            if isinstance(result, CachedPDFGone):
+                failed.append(f"{name}: changed during the export, download it again")
+            elif isinstance(result, Exception):
+                failed.append(f"{name}: {result}")
+            else:
+                yield name, result
+        if failed:
+            yield 'errors.txt', ('\n'.join(failed) + '\n').encode('utf-8')
+    
+    return stream_zip(members(), 'invoices')
+
 @app.route('/supplier-requests/<int:request_id>/download-invoice/<int:supplier_id>', methods=['GET'])
 @cross_origin()
 def download_invoice_pdf(request_id, supplier_id):
@@ -6062,85 +6146,7 @@ def download_invoice_pdf(request_id, supplier_id):
         if not fulfillment_data:
             return jsonify({'error': 'Fulfillment data not found'}), 404
         
-        # Convert request data to dict
-        request_dict = {
-            'id': request_data.id,
-            'request_number': request_data.request_number,
-            'title': request_data.title,
-            'description': request_data.description,
-            'priority': request_data.priority,
-            'status': request_data.status.value if hasattr(request_data.status, 'value') else request_data.status,
-            'expected_delivery_date': request_data.expected_delivery_date.isoformat() if request_data.expected_delivery_date else None,
-            'delivery_address': request_data.delivery_address,
-            'total_amount': request_data.total_amount,
-            'notes': request_data.notes,
-            'created_at': request_data.created_at.isoformat() if request_data.created_at else None,
-            'items': []
-        }
-        
-        # Get request items
-        items = session.query(SupplierRequestItem).filter(SupplierRequestItem.request_id == request_id).all()
-        for item in items:
-            product = session.query(Product).filter(Product.id == item.product_id).first()
-            request_dict['items'].append({
-                'id': item.id,
-                'product_id': item.product_id,
-                'product_name': product.name if product else 'Unknown Product',
-                'product_sku': product.sku if product else 'N/A',
-                'quantity': item.quantity,
-                'unit_price': item.unit_price,
-                'total_price': item.quantity * item.unit_price,
-                'specifications': item.specifications,
-                'notes': item.notes
-            })
-        
-        # Convert supplier data to dict
-        supplier_dict = {
-            'id': supplier_data.id,
-            'name': supplier_data.name,
-            'email': supplier_data.email,
-            'status': 'accepted'  # Default status for invoice generation
-        }
-        
-        # Convert fulfillment data to dict
-        fulfillment_dict = {
-            'fulfillment_status': fulfillment_data.fulfillment_status,
-            'packing_timestamp': fulfillment_data.packing_timestamp.isoformat() if fulfillment_data.packing_timestamp else None,
-            'dispatched_timestamp': fulfillment_data.dispatched_timestamp.isoformat() if fulfillment_data.dispatched_timestamp else None,
-            'delivered_timestamp': fulfillment_data.delivered_timestamp.isoformat() if fulfillment_data.delivered_timestamp else None,
-            'created_at': request_data.created_at.isoformat() if request_data.created_at else None
-        }
-        
-        session.close()
-        
-        # Calculate shipping cost and taxes for this supplier
-        subtotal = request_dict.get('total_amount', 0)
-        # Determine product category from items (use first item's category or default)
-        product_category = None
-        if request_dict.get('items'):
-            # You can enhance this by adding product category to your product model
-            product_category = "machinery"  # Default category
-        
-        shipping_info = calculate_supplier_shipping_cost(
-            supplier_id, 
-            request_dict.get('delivery_address'),
-            subtotal,
-            product_category
-        )
-        
-        # Generate PDF
-        pdf_generator = InvoicePDFGenerator()
-        invoice_number = f"INV-{request_id:04d}-{supplier_id:04d}-{datetime.now().strftime('%Y%m%d')}"
-        pdf_buffer = pdf_generator.create_invoice_pdf(request_dict, supplier_dict, fulfillment_dict, invoice_number, shipping_info)
-        
-        # Return PDF as response
-        from flask import send_file
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name=f"invoice_{request_data.request_number}_{supplier_data.name}_{datetime.now().strftime('%Y%m%d')}.pdf",
-            mimetype='application/pdf'
-        )
+        return send_invoice_pdf(session, request_data, supplier_id, fulfillment_data)
         
     except Exception as e:
         import traceback
@@ -6172,85 +6178,7 @@ def download_invoice_pdf_admin(request_id):
         if not accepted_supplier:
             return jsonify({'error': 'No accepted supplier found for this request'}), 404
         
-        # Convert request data to dict
-        request_dict = {
-            'id': request_data.id,
-            'request_number': request_data.request_number,
-            'title': request_data.title,
-            'description': request_data.description,
-            'priority': request_data.priority,
-            'status': request_data.status.value if hasattr(request_data.status, 'value') else request_data.status,
-            'expected_delivery_date': request_data.expected_delivery_date.isoformat() if request_data.expected_delivery_date else None,
-            'delivery_address': request_data.delivery_address,
-            'total_amount': request_data.total_amount,
-            'notes': request_data.notes,
-            'created_at': request_data.created_at.isoformat() if request_data.created_at else None,
-            'items': []
-        }
-        
-        # Get request items
-        items = session.query(SupplierRequestItem).filter(SupplierRequestItem.request_id == request_id).all()
-        for item in items:
-            product = session.query(Product).filter(Product.id == item.product_id).first()
-            request_dict['items'].append({
-                'id': item.id,
-                'product_id': item.product_id,
-                'product_name': product.name if product else 'Unknown Product',
-                'product_sku': product.sku if product else 'N/A',
-                'quantity': item.quantity,
-                'unit_price': item.unit_price,
-                'total_price': item.quantity * item.unit_price,
-                'specifications': item.specifications,
-                'notes': item.notes
-            })
-        
-        # Convert supplier data to dict
-        supplier_dict = {
-            'id': accepted_supplier.id,
-            'name': accepted_supplier.name,
-            'email': accepted_supplier.email,
-            'status': 'accepted'
-        }
-        
-        # Convert fulfillment data to dict
-        fulfillment_dict = {
-            'fulfillment_status': accepted_supplier.fulfillment_status,
-            'packing_timestamp': accepted_supplier.packing_timestamp.isoformat() if accepted_supplier.packing_timestamp else None,
-            'dispatched_timestamp': accepted_supplier.dispatched_timestamp.isoformat() if accepted_supplier.dispatched_timestamp else None,
-            'delivered_timestamp': accepted_supplier.delivered_timestamp.isoformat() if accepted_supplier.delivered_timestamp else None,
-            'created_at': request_data.created_at.isoformat() if request_data.created_at else None
-        }
-        
-        session.close()
-        
-        # Calculate shipping cost and taxes for the accepted supplier
-        subtotal = request_dict.get('total_amount', 0)
-        # Determine product category from items (use first item's category or default)
-        product_category = None
-        if request_dict.get('items'):
-            # You can enhance this by adding product category to your product model
-            product_category = "machinery"  # Default category
-        
-        shipping_info = calculate_supplier_shipping_cost(
-            accepted_supplier.id, 
-            request_dict.get('delivery_address'),
-            subtotal,
-            product_category
-        )
-        
-        # Generate PDF
-        pdf_generator = InvoicePDFGenerator()
-        invoice_number = f"INV-{request_id:04d}-{accepted_supplier.id:04d}-{datetime.now().strftime('%Y%m%d')}"
-        pdf_buffer = pdf_generator.create_invoice_pdf(request_dict, supplier_dict, fulfillment_dict, invoice_number, shipping_info)
-        
-        # Return PDF as response
-        from flask import send_file
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name=f"invoice_{request_data.request_number}_{accepted_supplier.name}_{datetime.now().strftime('%Y%m%d')}.pdf",
-            mimetype='application/pdf'
-        )
+        return send_invoice_pdf(session, request_data, accepted_supplier.id, accepted_supplier)
         
     except Exception as e:
         import traceback
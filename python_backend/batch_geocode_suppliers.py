@@ -1,48 +1,44 @@
-import os
-import requests
+import sys
 from sqlalchemy.orm import sessionmaker
 from db_init import get_engine
 from models import Supplier
-
-MAPBOX_TOKEN = os.environ.get('MAPBOX_TOKEN') or '<YOUR_MAPBOX_TOKEN_HERE>'
-
-if MAPBOX_TOKEN == '<YOUR_MAPBOX_TOKEN_HERE>':
-    print('ERROR: Please set your Mapbox token in the script or as MAPBOX_TOKEN environment variable.')
-    exit(1)
-
-def geocode_address(address):
-    url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{address}.json?access_token={MAPBOX_TOKEN}&country=IN"
-    resp = requests.get(url)
-    data = resp.json()
-    if data.get('features') and len(data['features']) > 0:
-        lng, lat = data['features'][0]['center']
-        return lat, lng
-    return None, None
+from geocoding import get_geocoder
 
 def batch_geocode_suppliers():
+    try:
+        geocoder = get_geocoder()
+    except ValueError as e:
+        print(f'ERROR: {e}. Set MAPBOX_TOKEN, or GEOCODER_PROVIDER=gazetteer to geocode offline.')
+        sys.exit(1)
+    print(f"Using the {geocoder.provider.name} geocoder.")
+
     engine = get_engine()
     Session = sessionmaker(bind=engine)
     session = Session()
     
     suppliers = session.query(Supplier).filter((Supplier.lat == None) | (Supplier.lng == None)).all()
     print(f"Found {len(suppliers)} suppliers to geocode.")
-    updated = 0
+    to_geocode = []
     for supplier in suppliers:
         if not supplier.address:
             print(f"Skipping supplier {supplier.id} ({supplier.name}): No address.")
             continue
-        print(f"Geocoding supplier {supplier.id} ({supplier.name}): {supplier.address}")
-        lat, lng = geocode_address(supplier.address)
-        if lat is not None and lng is not None:
-            supplier.lat = lat
-            supplier.lng = lng
-            session.commit()
-            print(f"Updated supplier {supplier.id} with lat={lat}, lng={lng}")
+        to_geocode.append(supplier)
+
+    # One cache lookup and a bounded pool of provider calls for the whole batch
+    results = geocoder.geocode_many([s.address for s in to_geocode])
+    updated = 0
+    for supplier in to_geocode:
+        coords = results.get(supplier.address)
+        if coords is not None:
+            supplier.lat, supplier.lng = coords
+            print(f"Updated supplier {supplier.id} with lat={supplier.lat}, lng={supplier.lng}")
             updated += 1
         else:
             print(f"Failed to geocode supplier {supplier.id} ({supplier.name})")
+    session.commit()
     print(f"Done. Updated {updated} suppliers.")
     session.close()
 
 if __name__ == '__main__':
-    batch_geocode_suppliers() 
\ No newline at end of file
+    batch_geocode_suppliers() 
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark /reports/analytics on a synthetic dataset (1M transactions by
+default). Compares the old approach (load every stock_in/stock_out
+Transaction and read t.product.cost per row) with the GROUP BY version in
+api.compute_analytics_report.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database). Usage:
+    python benchmarks/bench_analytics_report.py [--transactions 1000000] [--skip-legacy]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--transactions', type=int, default=1000000)
+parser.add_argument('--products', type=int, default=5000)
+parser.add_argument('--suppliers', type=int, default=50)
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_analytics.sqlite3'))
+parser.add_argument('--skip-legacy', action='store_true')
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from db_init import get_engine, get_session
+from models import Base, Product, Supplier, Transaction, TransactionType
+import api
+
+def build_dataset():
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Supplier), [{'id': i, 'name': f'Supplier {i}'} for i in range(1, args.suppliers + 1)])
+        conn.execute(insert(Product), [{
+            'id': i, 'name': f'Product {i}', 'sku': f'SKU{i:06d}', 'category': f'cat{i % 12}',
+            'quantity': rng.choice([0, rng.randint(1, 500)]), 'cost': round(rng.uniform(5, 500), 2),
+            'reorder_level': rng.randint(5, 50), 'supplier_id': rng.randint(1, args.suppliers),
+        } for i in range(1, args.products + 1)])
+        batch = []
+        for i in range(1, args.transactions + 1):
+            batch.append({
+                'id': i, 'product_id': rng.randint(1, args.products),
+                'type': TransactionType.stock_in if i % 3 else TransactionType.stock_out,
+                'quantity': rng.randint(1, 100), 'date': start + timedelta(minutes=i),
+            })
+            if len(batch) == 50000:
+                conn.execute(insert(Transaction), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Transaction), batch)
+
+def legacy_stock_values(session):
+    # The per-row loop the endpoint used to run
+    stock_in_value = 0
+    stock_out_value = 0
+    for t in session.query(Transaction).filter(Transaction.type == 'stock_in').all():
+        if t.product and t.product.cost:
+            stock_in_value += t.quantity * t.product.cost
+    for t in session.query(Transaction).filter(Transaction.type == 'stock_out').all():
+        if t.product and t.product.cost:
+            stock_out_value += t.quantity * t.product.cost
+    return stock_in_value, stock_out_value
+
+def timed(fn, *fn_args):
+    start = time.perf_counter()
+    result = fn(*fn_args)
+    return result, time.perf_counter() - start
+
+def main():
+    print(f"Building {args.transactions} transactions / {args.products} products in {args.db_path} ...")
+    _, build_time = timed(build_dataset)
+    print(f"  built in {build_time:.1f}s")
+
+    session = get_session()
+    report, new_time = timed(api.compute_analytics_report, session)
+    print(f"GROUP BY report:   {new_time * 1000:10.1f} ms")
+    if not args.skip_legacy:
+        session.expunge_all()
+        (legacy_in, legacy_out), legacy_time = timed(legacy_stock_values, session)
+        print(f"legacy in/out loop:{legacy_time * 1000:10.1f} ms  ({legacy_time / new_time:.0f}x slower)")
+        summary = report['transactionSummary']
+        assert abs(summary['stockInValue'] - legacy_in) < 1e-6 * max(legacy_in, 1)
+        assert abs(summary['stockOutValue'] - legacy_out) < 1e-6 * max(legacy_out, 1)
+    session.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Compare GET /products/<sku>/bom (one recursive CTE) with walking
+product.sub_components one lazy load per node: same tree, quantities and
+rolled-up cost, statement counts and time. The synthetic BOM is several
+levels deep, reuses shared sub-assemblies in many places, lists one
+sub-assembly twice under the same parent and contains a cycle, which must
+be cut per path.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database). Usage:
+    python benchmarks/bench_bom_explosion.py [--depth 6] [--fanout 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--depth', type=int, default=6)
+parser.add_argument('--fanout', type=int, default=4)
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_bom.sqlite3'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+from db_init import get_engine, get_session
+from models import Base, Product, ProductComponent
+import api
+
+def build_dataset(rng):
+    """Level 0 is the root; each level's products use `fanout` products from the level below"""
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    levels = [[1]]
+    next_id = 2
+    for _ in range(args.depth):
+        # Fewer distinct products than slots, so sub-assemblies are shared
+        width = max(args.fanout, len(levels[-1]) * args.fanout // 2)
+        levels.append(list(range(next_id, next_id + width)))
+        next_id += width
+    products = [{'id': pid, 'name': f'Item {pid}', 'sku': f'BOM{pid:06d}', 'cost': round(rng.uniform(1, 500), 2)}
+                for level in levels for pid in level]
+    lines = [{'parent_id': parent, 'child_id': child, 'quantity': rng.randint(1, 4)}
+             for upper, lower in zip(levels, levels[1:]) for parent in upper
+             for child in rng.sample(lower, min(args.fanout, len(lower)))]
+    # The same sub-assembly on two lines of one parent: each line needs its own subtree
+    lines.append(dict(lines[0], quantity=lines[0]['quantity'] + 1))
+    # A cycle: a leaf that contains the root
+    lines.append({'parent_id': levels[-1][0], 'child_id': 1, 'quantity': 1})
+    with engine.begin() as conn:
+        conn.execute(insert(Product), products)
+        conn.execute(insert(ProductComponent), lines)
+    return levels[-1][0]
+
+def lazy_bom(product, path=()):
+    # The per-node walk the endpoint used to do, with per-path cycle detection
+    path = path + (product.id,)
+    bom = []
+    for comp in product.sub_components:
+        child = comp.child
+        if child.id in path:
+            continue
+        subs = lazy_bom(child, path)
+        unit_cost = sum(s['unit_cost'] * s['quantity'] for s in subs) if subs else (child.cost or 0)
+        bom.append({'sku': child.sku, 'name': child.name, 'quantity': comp.quantity,
+                    'unit_cost': unit_cost, 'sub_components': subs})
+    return bom
+
+def add_extended(bom, factor=1):
+    for entry in bom:
+        entry['extended_quantity'] = factor * entry['quantity']
+        entry['extended_cost'] = entry['unit_cost'] * entry['extended_quantity']
+        add_extended(entry['sub_components'], entry['extended_quantity'])
+    return bom
+
+def lazy_where_used(session, part_id):
+    parents = {}
+    for comp in session.query(ProductComponent):
+        parents.setdefault(comp.child_id, []).append((comp.parent_id, comp.quantity))
+    used_in = {}
+    def walk(item, factor, path):
+        for parent, qty in parents.get(item, []):
+            if parent in path:
+                continue
+            used_in[parent] = used_in.get(parent, 0) + factor * qty
+            walk(parent, factor * qty, path + (parent,))
+    walk(part_id, 1, (part_id,))
+    return used_in
+
+def count_nodes(bom):
+    return sum(1 + count_nodes(e['sub_components']) for e in bom)
+
+def measure(fn):
+    engine = get_engine()
+    statements = []
+    listener = lambda *a, **kw: statements.append(a[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    event.remove(engine, 'before_cursor_execute', listener)
+    return result, len(statements), elapsed
+
+def main():
+    rng = random.Random(42)
+    leaf_id = build_dataset(rng)
+    client = api.app.test_client()
+    client.get('/products/BOM000001/bom')  # warm up the app and the SQLite page cache
+
+    resp, statements, elapsed = measure(lambda: client.get('/products/BOM000001/bom?include_cost=true'))
+    assert resp.status_code == 200, resp.get_json()
+    new = resp.get_json()
+    print(f"recursive CTE: {count_nodes(new['bom'])} nodes, {statements} statements, {elapsed * 1000:8.1f} ms")
+
+    session = get_session()
+    root = session.get(Product, 1)
+    old, statements, elapsed = measure(lambda: add_extended(lazy_bom(root)))
+    print(f"lazy walk:     {count_nodes(old)} nodes, {statements} statements, {elapsed * 1000:8.1f} ms")
+    session.close()
+    assert new['bom'] == old, 'BOM trees differ'
+
+    resp, statements, elapsed = measure(lambda: client.get(f'/products/BOM{leaf_id:06d}/where-used'))
+    assert resp.status_code == 200, resp.get_json()
+    used_in = {row['id']: row['quantity_per'] for row in resp.get_json()['used_in']}
+    print(f"where-used:    {len(used_in)} assemblies, {statements} statements, {elapsed * 1000:8.1f} ms")
+    session = get_session()
+    assert used_in == lazy_where_used(session, leaf_id), 'where-used differs'
+    session.close()
+
+if __name__ == '__main__':
+    main()
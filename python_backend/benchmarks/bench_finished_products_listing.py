@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Check that GET /finished_products issues the same number of SQL statements
+whatever the catalogue size (it used to run 3 + k queries per finished
+product), that the stored rollups match the per-product aggregates the old
+endpoint computed, and time it.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database). Usage:
+    python benchmarks/bench_finished_products_listing.py [--sizes 10 100 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_finished_products.sqlite3'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert, text
+from db_init import get_engine
+from models import Base, Product, FinishedProduct, FinishedProductMaterial, FinishedProductSkill, Skill
+from finished_product_rollups import refresh_rollups
+import api
+
+MATERIALS = 2000
+
+def build_dataset(size):
+    engine = get_engine()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rng = random.Random(size)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [{'id': i, 'name': f'Material {i}', 'sku': f'MAT{i:05d}',
+                                        'cost': round(rng.uniform(10, 5000), 2)} for i in range(1, MATERIALS + 1)])
+        conn.execute(insert(Skill), [{'id': i, 'name': name} for i, name in
+                                     enumerate(['wiring', 'welding', 'testing', 'assembly', 'painting'], 1)])
+        conn.execute(insert(FinishedProduct), [{'id': i, 'model_name': f'Panel {i}', 'total_cost': rng.uniform(5e4, 5e5)}
+                                               for i in range(1, size + 1)])
+        conn.execute(insert(FinishedProductMaterial), [{'finished_product_id': fp, 'material_id': rng.randint(1, MATERIALS),
+                                                        'quantity': rng.randint(1, 5)}
+                                                       for fp in range(1, size + 1) for _ in range(rng.randint(0, 12))])
+        conn.execute(insert(FinishedProductSkill), [{'finished_product_id': fp, 'skill_id': sid}
+                                                    for fp in range(1, size + 1) for sid in rng.sample(range(1, 6), 2)])
+        # Core inserts bypass the rollup hook
+        refresh_rollups(conn)
+
+def legacy_rollups(conn):
+    # The per-product aggregates the endpoint used to run
+    expected = {}
+    for (fp_id,) in conn.execute(text('SELECT id FROM finished_products')):
+        count, cost = conn.execute(text('''
+            SELECT COUNT(*), SUM(fpm.quantity * p.cost) FROM finished_product_materials fpm
+            JOIN products p ON fpm.material_id = p.id WHERE fpm.finished_product_id = :fp_id
+        '''), {'fp_id': fp_id}).fetchone()
+        skills = conn.execute(text('SELECT COUNT(*) FROM finished_product_skills WHERE finished_product_id = :fp_id'),
+                              {'fp_id': fp_id}).scalar()
+        expected[fp_id] = (cost or 0, count or 0, skills)
+    return expected
+
+def main():
+    client = api.app.test_client()
+    engine = get_engine()
+    counts = []
+    for size in args.sizes:
+        build_dataset(size)
+        statements = []
+        listener = lambda *a, **kw: statements.append(a[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        start = time.perf_counter()
+        resp = client.get('/finished_products')
+        elapsed = time.perf_counter() - start
+        event.remove(engine, 'before_cursor_execute', listener)
+        assert resp.status_code == 200, resp.get_json()
+        with engine.connect() as conn:
+            expected = legacy_rollups(conn)
+        for row in resp.get_json():
+            cost, count, skills = expected[row['id']]
+            assert abs(row['materials_cost'] - cost) < 1e-6 and row['materials_count'] == count \
+                and row['skills_count'] == skills, (row['id'], row['materials_cost'], cost)
+        print(f"{size:5d} finished products: {len(statements)} statements, {elapsed * 1000:8.1f} ms")
+        counts.append(len(statements))
+    assert len(set(counts)) == 1, f"statement count grows with catalogue size: {counts}"
+
+if __name__ == '__main__':
+    main()
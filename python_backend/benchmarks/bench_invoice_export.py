@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark the bulk invoice export (GET /supplier-requests/invoices/export) on
+a synthetic month-end (2,000 accepted supplier requests by default, 5-40
+items each):
+  - cold: every PDF rendered by the pool while the ZIP streams
+  - warm: the same export again, every PDF from the cache
+Reports the time to the first ZIP bytes and to the end; with --trace-memory
+also the peak Python memory of the API process while streaming (tracemalloc
+slows everything down), which should not grow with the size of the ZIP.
+Checks the ZIP is valid and holds one PDF per invoice, identical to the
+single download, and that the batched shipping and taxes match
+calculate_supplier_shipping_cost, also for suppliers that cannot be located.
+
+The dataset is written to its own SQLite file and the PDFs to a scratch
+directory. Usage:
+    python benchmarks/bench_invoice_export.py [--invoices 2000] [--workers 4] [--trace-memory]
+"""
+
+import argparse
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--invoices', type=int, default=2000)
+parser.add_argument('--workers', type=int, default=4)
+parser.add_argument('--trace-memory', action='store_true')
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_invoice_export.sqlite3'))
+parser.add_argument('--pdf-dir', default=os.path.join(tempfile.gettempdir(), 'bench_invoice_export'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+os.environ['INVOICE_PDF_DIR'] = args.pdf_dir
+os.environ['INVOICE_PDF_WORKERS'] = str(args.workers)
+os.environ.setdefault('GEOCODER_PROVIDER', 'gazetteer')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text
+from db_init import get_engine, get_session
+from models import Base, Supplier, Product, SupplierRequest, SupplierRequestItem, supplier_request_suppliers
+import api
+
+CATEGORIES = ['electronics', 'machinery', 'construction', 'textiles', 'switchgear']
+MONTH_START = datetime(2025, 9, 1)
+
+def build_dataset(rng):
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    shutil.rmtree(args.pdf_dir, ignore_errors=True)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Added to deployed databases by hand; not in the model
+        for column in ('fulfillment_status VARCHAR(20)', 'packing_timestamp DATETIME',
+                       'dispatched_timestamp DATETIME', 'delivered_timestamp DATETIME'):
+            conn.execute(text(f'ALTER TABLE supplier_request_suppliers ADD COLUMN {column}'))
+        conn.execute(insert(Supplier), [{'id': i, 'name': f'Supplier {i}', 'email': f's{i}@example.com',
+                                         'address': rng.choice(['MIDC, Pune', 'Whitefield, Bengaluru', 'Andheri, Mumbai']),
+                                         'lat': 18.5 + rng.random(), 'lng': 73.8 + rng.random()} for i in range(1, 41)])
+        # Not located: no address, and an address the geocoder finds nothing for
+        conn.execute(insert(Supplier), [{'id': 41, 'name': 'Supplier 41', 'email': 's41@example.com', 'address': None},
+                                        {'id': 42, 'name': 'Supplier 42', 'email': 's42@example.com',
+                                         'address': 'Somewhere without a place'}])
+        conn.execute(insert(Product), [{'id': i, 'name': f'Product {i}', 'sku': f'SKU-{i}',
+                                        'category': rng.choice(CATEGORIES)} for i in range(1, 501)])
+        conn.execute(insert(SupplierRequest), [{'id': i, 'request_number': f'SR-{i:05d}', 'title': f'Request {i}',
+                                                'priority': 'medium', 'status': 'approved', 'delivery_address': 'Pune',
+                                                'created_at': MONTH_START + timedelta(minutes=rng.randint(0, 30 * 24 * 60 - 1))}
+                                               for i in range(1, args.invoices + 1)])
+        items = []
+        for request_id in range(1, args.invoices + 1):
+            for _ in range(rng.randint(5, 40)):
+                quantity, unit_price = rng.randint(1, 50), round(rng.uniform(10, 5000), 2)
+                items.append({'request_id': request_id, 'product_id': rng.randint(1, 500), 'quantity': quantity,
+                              'unit_price': unit_price, 'total_price': quantity * unit_price})
+        conn.execute(insert(SupplierRequestItem), items)
+        conn.execute(text('UPDATE supplier_requests SET total_amount = (SELECT SUM(total_price) FROM supplier_request_items '
+                          'WHERE supplier_request_items.request_id = supplier_requests.id)'))
+        conn.execute(insert(supplier_request_suppliers), [
+            {'request_id': i, 'supplier_id': (i % 40) + 1, 'supplier_status': 'accepted', 'fulfillment_status': 'delivered'}
+            for i in range(1, args.invoices + 1)])
+
+def export(client):
+    """(seconds to first bytes, seconds in total, peak traced bytes or None, ZIP bytes); the ZIP is spooled to disk"""
+    if args.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get('/supplier-requests/invoices/export?start_date=2025-09-01&end_date=2025-09-30')
+    assert response.status_code == 200, response.get_data(as_text=True)[:200]
+    first = None
+    with tempfile.TemporaryFile() as spool:
+        for chunk in response.response:
+            if first is None and chunk:
+                first = time.perf_counter() - start
+            spool.write(chunk)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        tracemalloc.stop()
+        spool.seek(0)
+        return first, elapsed, peak, spool.read()
+
+def check_shipping(rng):
+    session = get_session()
+    request_ids = rng.sample(range(1, args.invoices + 1), 20)
+    requests_by_id = {r.id: r for r in session.query(SupplierRequest).filter(SupplierRequest.id.in_(request_ids))}
+    items = api.invoice_item_rows(session, request_ids)
+    suppliers = {s.id: s for s in session.query(Supplier)}
+    fulfillment = type('Fulfillment', (), {'fulfillment_status': 'delivered', 'packing_timestamp': None,
+                                           'dispatched_timestamp': None, 'delivered_timestamp': None})
+    shipping_basis = api.invoice_shipping_basis(session)
+    jobs = [api.invoice_pdf_job(requests_by_id[i], items[i], suppliers[(i % 40) + 1], fulfillment, shipping_basis)
+            for i in request_ids]
+    jobs += [api.invoice_pdf_job(requests_by_id[request_ids[0]], items[request_ids[0]], suppliers[supplier_id],
+                                 fulfillment, shipping_basis) for supplier_id in (41, 42)]
+    batched = api.invoice_shipping_infos(jobs, suppliers, session)
+    session.close()
+    for job, info in zip(jobs, batched):
+        single = api.calculate_supplier_shipping_cost(job['supplier']['id'], 'Pune', lines=job['tax_lines'])
+        assert info == single, (info, single)
+
+def main():
+    rng = random.Random(42)
+    print(f"Building {args.invoices} supplier requests in {args.db_path} ... ({os.cpu_count()} CPUs; "
+          f"the pool only renders in parallel with more than one)")
+    build_dataset(rng)
+    check_shipping(rng)
+
+    client = api.app.test_client()
+    for label in ('cold, rendered by the pool', 'warm, PDF cache'):
+        first, elapsed, peak, data = export(client)
+        memory = f", peak traced memory {peak / 2**20:5.1f} MiB" if peak is not None else ''
+        print(f"{label:27s} first bytes {first:6.2f} s, done {elapsed:7.2f} s ({args.invoices / elapsed:6.1f} PDFs/s), "
+              f"ZIP {len(data) / 2**20:6.1f} MiB{memory}")
+
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    assert archive.testzip() is None
+    names = archive.namelist()
+    # Every request of the month, the 30th included
+    assert len(names) == args.invoices and 'errors.txt' not in names
+    single = client.get('/supplier-requests/1/download-invoice/2')
+    assert archive.read(next(name for name in names if name.startswith('invoice_SR-00001_2_'))) == single.data
+    api.invoice_pdfs.shutdown()
+    print("✓ batched shipping and taxes match calculate_supplier_shipping_cost; "
+          "ZIP valid with one PDF per invoice, identical to the single download")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark invoice PDF downloads (GET /supplier-requests/<id>/download-invoice/<supplier_id>)
+on synthetic supplier requests (200 by default, 5-40 items each), downloaded
+by 8 concurrent clients:
+  - legacy: a new InvoicePDFGenerator per PDF, rendered in the request thread
+            (rendering only; the route also computed shipping and taxes)
+  - cold:   first downloads through the route, rendered by the pool into the PDF cache
+  - warm:   repeat downloads, served from the cache
+Checks cached PDFs are byte-identical on repeat, that If-None-Match gets 304
+and a Range gets 206, and that changing an item drops the request's PDF.
+
+The dataset is written to its own SQLite file and the PDFs to a scratch
+directory. Usage:
+    python benchmarks/bench_invoice_pdfs.py [--requests 200] [--clients 8] [--workers 4]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--requests', type=int, default=200)
+parser.add_argument('--clients', type=int, default=8)
+parser.add_argument('--workers', type=int, default=4)
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_invoice_pdfs.sqlite3'))
+parser.add_argument('--pdf-dir', default=os.path.join(tempfile.gettempdir(), 'bench_invoice_pdfs'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+os.environ['INVOICE_PDF_DIR'] = args.pdf_dir
+os.environ['INVOICE_PDF_WORKERS'] = str(args.workers)
+os.environ.setdefault('GEOCODER_PROVIDER', 'gazetteer')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text
+from db_init import get_engine, get_session
+from models import Base, Supplier, Product, SupplierRequest, SupplierRequestItem, supplier_request_suppliers
+from pdf_generator import InvoicePDFGenerator
+import api
+
+CATEGORIES = ['electronics', 'machinery', 'construction', 'textiles', 'switchgear']
+
+def build_dataset(rng):
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    shutil.rmtree(args.pdf_dir, ignore_errors=True)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Added to deployed databases by hand; not in the model
+        for column in ('fulfillment_status VARCHAR(20)', 'packing_timestamp DATETIME',
+                       'dispatched_timestamp DATETIME', 'delivered_timestamp DATETIME'):
+            conn.execute(text(f'ALTER TABLE supplier_request_suppliers ADD COLUMN {column}'))
+        conn.execute(insert(Supplier), [{'id': i, 'name': f'Supplier {i}', 'email': f's{i}@example.com',
+                                         'address': rng.choice(['MIDC, Pune', 'Whitefield, Bengaluru', 'Andheri, Mumbai']),
+                                         'lat': 18.5 + rng.random(), 'lng': 73.8 + rng.random()} for i in range(1, 21)])
+        conn.execute(insert(Product), [{'id': i, 'name': f'Product {i}', 'sku': f'SKU-{i}',
+                                        'category': rng.choice(CATEGORIES)} for i in range(1, 501)])
+        conn.execute(insert(SupplierRequest), [{'id': i, 'request_number': f'SR-{i:05d}', 'title': f'Request {i}',
+                                                'priority': 'medium', 'status': 'approved',
+                                                'delivery_address': 'Pune'} for i in range(1, args.requests + 1)])
+        items, totals = [], {}
+        for request_id in range(1, args.requests + 1):
+            for _ in range(rng.randint(5, 40)):
+                quantity, unit_price = rng.randint(1, 50), round(rng.uniform(10, 5000), 2)
+                items.append({'request_id': request_id, 'product_id': rng.randint(1, 500), 'quantity': quantity,
+                              'unit_price': unit_price, 'total_price': quantity * unit_price})
+                totals[request_id] = totals.get(request_id, 0) + quantity * unit_price
+        conn.execute(insert(SupplierRequestItem), items)
+        for request_id, total in totals.items():
+            conn.execute(text('UPDATE supplier_requests SET total_amount = :total WHERE id = :id'),
+                         {'total': total, 'id': request_id})
+        conn.execute(insert(supplier_request_suppliers), [
+            {'request_id': i, 'supplier_id': (i % 20) + 1, 'supplier_status': 'accepted', 'fulfillment_status': 'delivered'}
+            for i in range(1, args.requests + 1)])
+
+def download_all(paths):
+    def fetch(chunk):
+        client = api.app.test_client()
+        results = []
+        for path in chunk:
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code, response.get_data(as_text=True)[:200])
+            results.append((path, response.headers['ETag'], response.data))
+        return results
+    chunks = [paths[i::args.clients] for i in range(args.clients)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = [result for chunk in pool.map(fetch, chunks) for result in chunk]
+    return time.perf_counter() - start, {path: (etag, data) for path, etag, data in results}
+
+def legacy_render_all(request_ids):
+    # What the route did per download, minus the queries: a new generator, rendered inline
+    def render(request_id):
+        session = get_session()
+        request_data = session.get(SupplierRequest, request_id)
+        items = session.query(SupplierRequestItem).filter(SupplierRequestItem.request_id == request_id).all()
+        request_dict = {'id': request_id, 'request_number': request_data.request_number, 'title': request_data.title,
+                        'priority': request_data.priority, 'status': request_data.status,
+                        'total_amount': request_data.total_amount, 'items': [
+                            {'product_name': f'Product {item.product_id}', 'product_sku': f'SKU-{item.product_id}',
+                             'quantity': item.quantity, 'unit_price': item.unit_price,
+                             'total_price': item.quantity * item.unit_price} for item in items]}
+        session.close()
+        InvoicePDFGenerator().create_invoice_pdf(request_dict, {'name': 'Supplier', 'email': ''},
+                                                 {'fulfillment_status': 'delivered'}, f'INV-{request_id}')
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(render, request_ids))
+    return time.perf_counter() - start
+
+def main():
+    rng = random.Random(42)
+    print(f"Building {args.requests} supplier requests in {args.db_path} ... ({os.cpu_count()} CPUs; "
+          f"the pool only renders in parallel with more than one)")
+    build_dataset(rng)
+    request_ids = list(range(1, args.requests + 1))
+    paths = [f'/supplier-requests/{i}/download-invoice/{(i % 20) + 1}' for i in request_ids]
+
+    elapsed = legacy_render_all(request_ids)
+    print(f"legacy, in request thread: {elapsed / len(paths) * 1000:8.2f} ms per PDF ({len(paths) / elapsed:.1f}/s)")
+
+    api.app.test_client().get(paths[0])  # starts the pool workers
+    elapsed, cold = download_all(paths[1:])
+    print(f"cold, process pool:        {elapsed / (len(paths) - 1) * 1000:8.2f} ms per PDF ({(len(paths) - 1) / elapsed:.1f}/s)")
+    elapsed, warm = download_all(paths[1:])
+    print(f"warm, PDF cache:           {elapsed / (len(paths) - 1) * 1000:8.2f} ms per PDF ({(len(paths) - 1) / elapsed:.1f}/s)")
+    assert all(warm[path] == cold[path] for path in cold)
+
+    client = api.app.test_client()
+    etag = warm[paths[1]][0]
+    assert client.get(paths[1], headers={'If-None-Match': etag}).status_code == 304
+    partial = client.get(paths[1], headers={'Range': 'bytes=0-1023'})
+    assert partial.status_code == 206 and partial.data == warm[paths[1]][1][:1024]
+
+    session = get_session()
+    item = session.query(SupplierRequestItem).filter(SupplierRequestItem.request_id == 2).first()
+    item.quantity += 1
+    session.commit()
+    session.close()
+    assert not [name for name in os.listdir(args.pdf_dir) if name.startswith('2-')]
+    assert client.get(paths[1]).headers['ETag'] != etag
+    api.invoice_pdfs.shutdown()
+    print("✓ cached PDFs identical on repeat; 304 and 206 served; an item change drops the request's PDF")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark /match-products scoring on synthetic finished products (50k models
+by default). Times the in-memory index (build once, then per request) against
+the old loop that parsed every product's JSON tags on each request, and
+checks both return the same top-k.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database). Usage:
+    python benchmarks/bench_match_products.py [--models 50000] [--requests 200] [--skip-legacy]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--models', type=int, default=50000)
+parser.add_argument('--requests', type=int, default=200)
+parser.add_argument('--top-k', type=int, default=50)
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_match.sqlite3'))
+parser.add_argument('--skip-legacy', action='store_true')
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from db_init import get_engine, get_session
+from models import Base, FinishedProduct
+from aggregator import jaccard_similarity
+from product_match_index import product_match_index, WEIGHTS
+
+APPLICATIONS = ['Auto DG-Solar Switch', 'Motor Control', 'Power Distribution', 'Lighting', 'HVAC', 'Pumping',
+                'EV Charging', 'Data Center', 'Solar Inverter', 'Capacitor Bank']
+COMPLIANCE = ['IS-8623', 'IEC-61439', 'IS-13947', 'IEC-60947', 'UL-508A', 'CE', 'BIS']
+FEATURES = ['Remote monitoring', 'Harmonic filtering', 'Surge protection', 'Energy metering', 'IoT gateway',
+            'Touch HMI', 'Soft starter', 'VFD', 'Auto changeover', 'Earth leakage relay', 'Power factor correction']
+
+def build_dataset():
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    rows = []
+    for i in range(1, args.models + 1):
+        low = rng.choice([None, rng.randint(5, 400)])
+        rows.append({
+            'id': i, 'model_name': f'Panel {i}', 'total_cost': rng.uniform(5e4, 5e5), 'base_price': rng.uniform(6e4, 6e5),
+            'application_tags': json.dumps(rng.sample(APPLICATIONS, rng.randint(1, 3))),
+            'compliance_tags': json.dumps(rng.sample(COMPLIANCE, rng.randint(0, 3))),
+            'features': json.dumps(rng.sample(FEATURES, rng.randint(0, 4))),
+            'min_load_kw': low, 'max_load_kw': low + rng.randint(10, 200) if low is not None else None,
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(FinishedProduct), rows)
+
+def random_request(rng):
+    return {
+        'application': rng.choice(APPLICATIONS),
+        'power_load_kw': rng.randint(5, 500),
+        'compliance': rng.sample(COMPLIANCE, rng.randint(1, 2)),
+        'preferred_features': rng.sample(FEATURES, rng.randint(1, 3)),
+    }
+
+def legacy_match(session, input_data):
+    # The per-request loop /match-products used to run
+    results = []
+    for p in session.query(FinishedProduct).all():
+        why = []
+        load_score = 0.0
+        if p.min_load_kw is not None and p.max_load_kw is not None and input_data.get('power_load_kw'):
+            power_load = float(input_data['power_load_kw'])
+            if p.min_load_kw <= power_load <= p.max_load_kw:
+                load_score = 1.0
+                why.append(f"Supports {power_load}kW load")
+            elif p.min_load_kw <= power_load + 10 <= p.max_load_kw:
+                load_score = 0.7
+                why.append("Close to required load range")
+        app_tags = json.loads(p.application_tags) if p.application_tags else []
+        app_score = jaccard_similarity([a.lower() for a in app_tags], [input_data.get('application', '').lower()])
+        if app_score > 0:
+            why.append(f"Application: {input_data['application']}")
+        comp_tags = json.loads(p.compliance_tags) if p.compliance_tags else []
+        input_comp = [c.lower() for c in input_data.get('compliance', [])]
+        comp_score = jaccard_similarity([c.lower() for c in comp_tags], input_comp)
+        if comp_score > 0:
+            why.append(f"Compliant with {', '.join(input_comp)}")
+        prod_features = json.loads(p.features) if p.features else []
+        input_features = [f.lower() for f in input_data.get('preferred_features', [])]
+        feat_score = jaccard_similarity([f.lower() for f in prod_features], input_features)
+        if feat_score > 0:
+            why.append(f"Includes features: {', '.join(input_features)}")
+        match_score = (WEIGHTS['load'] * load_score + WEIGHTS['application'] * app_score +
+                       WEIGHTS['compliance'] * comp_score + WEIGHTS['features'] * feat_score)
+        results.append({'product_id': p.id, 'match_score': round(match_score * 100, 1), 'why_suitable': why,
+                        'application_tags': app_tags, 'compliance_tags': comp_tags, 'features': prod_features})
+    results.sort(key=lambda x: x['match_score'], reverse=True)
+    return results
+
+def main():
+    print(f"Building {args.models} finished products in {args.db_path} ...")
+    build_dataset()
+
+    start = time.perf_counter()
+    index = product_match_index.get()
+    print(f"index build:        {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+    rng = random.Random(7)
+    requests = [random_request(rng) for _ in range(args.requests)]
+    timings = []
+    for req in requests:
+        start = time.perf_counter()
+        index.match(req, args.top_k)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"indexed match:      {timings[len(timings) // 2] * 1000:10.2f} ms median, "
+          f"{timings[int(len(timings) * 0.95)] * 1000:.2f} ms p95 over {len(timings)} requests")
+
+    if not args.skip_legacy:
+        session = get_session()
+        keys = ('product_id', 'match_score', 'why_suitable', 'application_tags', 'compliance_tags', 'features')
+        for req in requests[:3]:
+            start = time.perf_counter()
+            legacy = legacy_match(session, req)[:args.top_k]
+            legacy_time = time.perf_counter() - start
+            new = [{k: row[k] for k in keys} for row in index.match(req, args.top_k)]
+            assert new == legacy, 'indexed top-k differs from the legacy loop'
+        print(f"legacy loop:        {legacy_time * 1000:10.1f} ms per request")
+        session.close()
+
+if __name__ == '__main__':
+    main()
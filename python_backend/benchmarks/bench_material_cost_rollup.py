@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark material price propagation: update 1k material costs in one
+session commit against 20k finished products and time how long the
+reverse-BOM reprice adds, then time a full rebuild. Checks the stored
+materials_cost, total_cost and base_price against values computed in Python.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database). Usage:
+    python benchmarks/bench_material_cost_rollup.py [--models 20000] [--materials 5000] [--updates 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--models', type=int, default=20000)
+parser.add_argument('--materials', type=int, default=5000)
+parser.add_argument('--updates', type=int, default=1000)
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_cost_rollup.sqlite3'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+from db_init import get_engine, get_session
+from models import Base, Product, FinishedProduct, FinishedProductMaterial
+from finished_product_rollups import refresh_rollups
+
+def build_dataset(rng):
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    costs = {i: round(rng.uniform(10, 5000), 2) for i in range(1, args.materials + 1)}
+    boms = {fp: [(rng.randint(1, args.materials), rng.randint(1, 5)) for _ in range(rng.randint(1, 15))]
+            for fp in range(1, args.models + 1)}
+    labor = {fp: round(rng.uniform(0, 20000), 2) for fp in boms}
+    margin = {fp: rng.choice([10.0, 15.0, 20.0, 25.0]) for fp in boms}
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [{'id': i, 'name': f'Material {i}', 'sku': f'MAT{i:05d}', 'cost': cost}
+                                       for i, cost in costs.items()])
+        totals = {fp: labor[fp] + sum(q * costs[m] for m, q in bom) for fp, bom in boms.items()}
+        conn.execute(insert(FinishedProduct), [{'id': fp, 'model_name': f'Panel {fp}', 'profit_margin_percent': margin[fp],
+                                                'total_cost': total, 'base_price': total * (1 + margin[fp] / 100)}
+                                               for fp, total in totals.items()])
+        conn.execute(insert(FinishedProductMaterial), [{'finished_product_id': fp, 'material_id': m, 'quantity': q}
+                                                       for fp, bom in boms.items() for m, q in bom])
+        # Core inserts bypass the hooks: fill materials_cost without repricing
+        refresh_rollups(conn)
+    return costs, boms, labor, margin
+
+def check(costs, boms, labor, margin):
+    with get_engine().connect() as conn:
+        rows = conn.execute(select(FinishedProduct.id, FinishedProduct.materials_cost,
+                                   FinishedProduct.total_cost, FinishedProduct.base_price)).all()
+    for fp, materials_cost, total_cost, base_price in rows:
+        expected_materials = sum(q * costs[m] for m, q in boms[fp])
+        expected_total = labor[fp] + expected_materials
+        assert abs(materials_cost - expected_materials) < 1e-6 * max(1, expected_materials), fp
+        assert abs(total_cost - expected_total) < 1e-6 * max(1, expected_total), fp
+        assert abs(base_price - expected_total * (1 + margin[fp] / 100)) < 1e-6 * max(1, base_price), fp
+
+def main():
+    rng = random.Random(42)
+    print(f"Building {args.models} finished products over {args.materials} materials in {args.db_path} ...")
+    costs, boms, labor, margin = build_dataset(rng)
+    changed = rng.sample(sorted(costs), args.updates)
+
+    session = get_session()
+    products = session.query(Product).filter(Product.id.in_(changed)).all()
+    for p in products:
+        p.cost = costs[p.id] = round(p.cost * rng.uniform(0.8, 1.3), 2)
+    start = time.perf_counter()
+    session.commit()
+    elapsed = time.perf_counter() - start
+    session.close()
+    affected = sum(1 for bom in boms.values() if any(m in set(changed) for m, _ in bom))
+    print(f"{args.updates} price updates, {affected} models repriced: {elapsed * 1000:8.1f} ms (commit incl. rollup)")
+    check(costs, boms, labor, margin)
+
+    start = time.perf_counter()
+    with get_engine().begin() as conn:
+        refresh_rollups(conn, reprice=True)
+    print(f"full rebuild of {args.models} models:       {(time.perf_counter() - start) * 1000:8.1f} ms")
+    check(costs, boms, labor, margin)
+    print("✓ stored costs match")
+
+if __name__ == '__main__':
+    main()
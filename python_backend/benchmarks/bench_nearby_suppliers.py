@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /suppliers/nearby/<warehouse_id> on synthetic suppliers (50k
+by default, clustered around Indian cities) against the old path, which
+loaded every geocoded supplier and ran a Python haversine for each one.
+Checks both return the same suppliers and distances, then that the
+supplier x warehouse distance table stays equal to a full rebuild after
+suppliers and a warehouse move.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database). Usage:
+    python benchmarks/bench_nearby_suppliers.py [--suppliers 50000] [--warehouses 20]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--suppliers', type=int, default=50000)
+parser.add_argument('--warehouses', type=int, default=20)
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_nearby_suppliers.sqlite3'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from db_init import get_engine, get_session
+from models import Base, Supplier, Warehouse, SupplierWarehouseDistance
+from supplier_geo import rebuild_distances, main_warehouse_distance, haversine_km, MAIN_WAREHOUSE_NAME
+import api
+
+CITIES = [(18.52, 73.86), (19.08, 72.88), (28.61, 77.21), (12.97, 77.59), (13.08, 80.27), (22.57, 88.36),
+          (17.39, 78.49), (23.02, 72.57), (26.91, 75.79), (21.15, 79.09)]
+
+def build_dataset(rng):
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+
+    def near_city(spread):
+        lat, lng = rng.choice(CITIES)
+        return lat + rng.gauss(0, spread), lng + rng.gauss(0, spread)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Supplier), [dict(zip(('lat', 'lng'), near_city(1.0)), id=i, name=f'Supplier {i}')
+                                        for i in range(1, args.suppliers + 1)])
+        conn.execute(insert(Warehouse), [dict(zip(('lat', 'lng'), near_city(0.2)), id=i,
+                                              name=MAIN_WAREHOUSE_NAME if i == 1 else f'Warehouse {i}')
+                                         for i in range(1, args.warehouses + 1)])
+    session = get_session()
+    rebuild_distances(session)
+    session.commit()
+    session.close()
+
+def legacy_distance(lat1, lng1, lat2, lng2):
+    R = 6371
+    lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+def legacy_nearby(session, warehouse_id, radius_km=50, k=3):
+    # What the endpoint did per request
+    warehouse = session.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
+    nearby = []
+    for supplier in session.query(Supplier).filter(Supplier.lat.isnot(None), Supplier.lng.isnot(None)).all():
+        distance = legacy_distance(warehouse.lat, warehouse.lng, supplier.lat, supplier.lng)
+        if distance <= radius_km:
+            nearby.append((supplier.id, round(distance, 2)))
+    nearby.sort(key=lambda x: (x[1], x[0]))
+    return nearby[:k]
+
+def stored_distances(session):
+    return {(row.supplier_id, row.warehouse_id): row.distance_km for row in session.query(SupplierWarehouseDistance)}
+
+def main():
+    rng = random.Random(42)
+    print(f"Building {args.suppliers} suppliers, {args.warehouses} warehouses in {args.db_path} ...")
+    build_dataset(rng)
+    client = api.app.test_client()
+    warehouse_ids = list(range(1, args.warehouses + 1))
+
+    client.get('/suppliers/nearby/1')  # loads the index
+    for params in ({}, {'radius_km': 200, 'k': 10}):
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        start = time.perf_counter()
+        indexed = {wid: client.get(f'/suppliers/nearby/{wid}?{query}').get_json() for wid in warehouse_ids}
+        elapsed = time.perf_counter() - start
+        print(f"index,  {params or 'defaults'}: {elapsed / len(warehouse_ids) * 1000:8.2f} ms per warehouse")
+
+        session = get_session()
+        start = time.perf_counter()
+        legacy = {wid: legacy_nearby(session, wid, **params) for wid in warehouse_ids}
+        elapsed = time.perf_counter() - start
+        session.close()
+        print(f"legacy, {params or 'defaults'}: {elapsed / len(warehouse_ids) * 1000:8.2f} ms per warehouse")
+        for wid in warehouse_ids:
+            got = sorted((row['id'], row['distance_km']) for row in indexed[wid])
+            assert got == sorted(legacy[wid]), (wid, indexed[wid], legacy[wid])
+
+    # Move 100 suppliers (one loses its coordinates) and a warehouse through the ORM
+    session = get_session()
+    for supplier in session.query(Supplier).filter(Supplier.id.in_(rng.sample(range(1, args.suppliers + 1), 100))):
+        supplier.lat, supplier.lng = supplier.lat + 0.3, supplier.lng - 0.2
+    session.get(Supplier, 1).lat = None
+    session.get(Warehouse, 2).lng += 0.5
+    session.add(Supplier(name='New supplier', lat=18.6, lng=73.9))
+    start = time.perf_counter()
+    session.commit()
+    print(f"commit with 102 supplier and 1 warehouse moves: {(time.perf_counter() - start) * 1000:.1f} ms")
+    incremental = stored_distances(session)
+    rebuild_distances(session)
+    rebuilt = stored_distances(session)
+    session.rollback()
+    assert incremental.keys() == rebuilt.keys()
+    assert all(abs(incremental[key] - rebuilt[key]) < 1e-9 for key in rebuilt)
+
+    supplier = session.get(Supplier, 2)
+    expected = float(haversine_km(session.get(Warehouse, 1).lat, session.get(Warehouse, 1).lng, supplier.lat, supplier.lng))
+    assert abs(main_warehouse_distance(session, 2, supplier.lat, supplier.lng) - expected) < 1e-9
+    session.close()
+    print("✓ nearby results match the full scan; distance table matches a rebuild after moves")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Check that GET /orders/<id>/price-breakdown issues the same number of SQL
+statements whatever the number of order lines (it used to run several
+queries per line), and time it for small and large orders.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database) and geocoding uses the offline gazetteer. Usage:
+    python benchmarks/bench_order_price_breakdown.py [--lines 5 50 500]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--lines', type=int, nargs='+', default=[5, 50, 500])
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_order_pricing.sqlite3'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+os.environ['GEOCODER_PROVIDER'] = 'gazetteer'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+from db_init import get_engine, get_session
+from models import (Base, Product, FinishedProduct, FinishedProductMaterial, FinishedProductSkill,
+                    Skill, Employee, Order, OrderItem)
+from skill_index import rebuild_employee_skills
+import api
+
+PRODUCTS = 2000
+FINISHED = 500
+
+def build_dataset():
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    skills = ['wiring', 'welding', 'testing', 'assembly', 'painting']
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [{'id': i, 'name': f'Material {i}', 'sku': f'MAT{i:05d}',
+                                        'cost': round(rng.uniform(10, 5000), 2)} for i in range(1, PRODUCTS + 1)])
+        conn.execute(insert(Skill), [{'id': i, 'name': name} for i, name in enumerate(skills, 1)])
+        conn.execute(insert(Employee), [{'first_name': f'E{i}', 'last_name': 'X', 'is_available': True,
+                                         'skills': json.dumps(rng.sample(skills, 2)),
+                                         'hourly_rate': rng.uniform(15, 60)} for i in range(200)])
+        conn.execute(insert(FinishedProduct), [{'id': i, 'model_name': f'Panel {i}', 'base_price': rng.uniform(5e4, 5e5),
+                                                'estimated_hours': rng.randint(1, 40)} for i in range(1, FINISHED + 1)])
+        conn.execute(insert(FinishedProductMaterial), [{'finished_product_id': fp, 'material_id': rng.randint(1, PRODUCTS),
+                                                        'quantity': rng.randint(1, 5)}
+                                                       for fp in range(1, FINISHED + 1) for _ in range(8)])
+        conn.execute(insert(FinishedProductSkill), [{'finished_product_id': fp, 'skill_id': sid}
+                                                    for fp in range(1, FINISHED + 1) for sid in rng.sample(range(1, 6), 2)])
+        for order_id, lines in enumerate(args.lines, 1):
+            conn.execute(insert(Order), [{'id': order_id, 'order_number': f'BENCH-{order_id}', 'total_amount': 0,
+                                          'delivery_address': 'Plot 12, MIDC, Nagpur'}])
+            conn.execute(insert(OrderItem), [{'order_id': order_id, 'product_id': rng.randint(1, FINISHED),
+                                              'quantity': rng.randint(1, 10), 'unit_price': 1, 'total_price': 1}
+                                             for _ in range(lines)])
+    # Core inserts bypass the employee_skills hook
+    session = get_session()
+    rebuild_employee_skills(session)
+    session.commit()
+    session.close()
+
+def main():
+    build_dataset()
+    client = api.app.test_client()
+    engine = get_engine()
+    # Warm the geocode cache and skill rates so every measured request sees the same cache hits
+    client.get('/orders/1/price-breakdown')
+    counts = []
+    for order_id, lines in enumerate(args.lines, 1):
+        statements = []
+        listener = lambda *a, **kw: statements.append(a[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        start = time.perf_counter()
+        resp = client.get(f'/orders/{order_id}/price-breakdown')
+        elapsed = time.perf_counter() - start
+        event.remove(engine, 'before_cursor_execute', listener)
+        assert resp.status_code == 200, resp.get_json()
+        print(f"{lines:5d} lines: {len(statements)} statements, {elapsed * 1000:8.1f} ms")
+        counts.append(len(statements))
+    assert len(set(counts)) == 1, f"statement count grows with order size: {counts}"
+
+if __name__ == '__main__':
+    main()
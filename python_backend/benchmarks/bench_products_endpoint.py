@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /products throughput with a fresh engine per request (the old
+get_engine() behaviour) versus the shared pooled engine.
+
+Usage: python benchmarks/bench_products_endpoint.py [--clients 8] [--seconds 10]
+Needs the database configured in db_init.DATABASE_URL to be reachable.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import db_init
+import api
+
+def legacy_session():
+    # What every route used to do: new engine (echo on), new sessionmaker, new connection
+    engine = create_engine(db_init.DATABASE_URL, echo=True)
+    Session = sessionmaker(bind=engine)
+    return Session()
+
+def run(clients, seconds):
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        client = api.app.test_client()
+        done = 0
+        while time.perf_counter() < deadline:
+            resp = client.get('/products')
+            assert resp.status_code == 200, resp.status_code
+            done += 1
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        total = sum(pool.map(lambda _: worker(), range(clients)))
+    elapsed = time.perf_counter() - start
+    return total / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    pooled_get_session = api.get_session
+    api.get_session = legacy_session
+    before = run(args.clients, args.seconds)
+    api.get_session = pooled_get_session
+    after = run(args.clients, args.seconds)
+
+    print(f"GET /products with {args.clients} clients for {args.seconds}s each")
+    print(f"  per-request engine: {before:8.1f} req/s")
+    print(f"  pooled engine:      {after:8.1f} req/s  ({after / before:.1f}x)")
+    print(f"  pool: {db_init.get_pool_status()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark stock forecasts for a whole catalogue: GET /products/forecast (daily
+rollup rows into a products x days matrix, cached) against the old
+one-request-per-product path (fetch the product's stock_out rows, bin them
+by day in Python, run stock_forecast_analysis). Checks both give the same
+numbers, then that a new stock movement refreshes the cache.
+
+The dataset is written to its own SQLite file (never the configured MySQL
+database). Usage:
+    python benchmarks/bench_stock_forecast.py [--products 2000] [--transactions 50000] [--days 14]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--products', type=int, default=2000)
+parser.add_argument('--transactions', type=int, default=50000)
+parser.add_argument('--days', type=int, default=14)
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'bench_forecast.sqlite3'))
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = f'sqlite:///{args.db_path}'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from db_init import get_engine, get_session
+from models import Base, Product, Transaction, TransactionType
+from forecasting import stock_forecast_analysis
+from product_daily_stats import rebuild_daily_stats
+import api
+
+def build_dataset(rng):
+    if os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [{'id': i, 'name': f'Material {i}', 'sku': f'MAT{i:05d}', 'category': 'bench',
+                                        'quantity': rng.randint(0, 500)} for i in range(1, args.products + 1)])
+        conn.execute(insert(Transaction), [{
+            'product_id': rng.randint(1, args.products),
+            'type': TransactionType.stock_out if rng.random() < 0.8 else TransactionType.stock_in,
+            'quantity': rng.choice([1, 2, 3, 5, 8, 20, 60]),
+            'date': now - timedelta(days=rng.randint(0, 3 * args.days), seconds=rng.randint(0, 86399)),
+        } for _ in range(args.transactions)])
+    # Core inserts bypass the product_daily_stats hook
+    session = get_session()
+    rebuild_daily_stats(session)
+    session.commit()
+    session.close()
+
+def legacy_forecast(session, product_id, days):
+    # What /products/<id>/forecast did per request, over the same whole-day window
+    product = session.query(Product).filter_by(id=product_id).first()
+    window_start = date.today() - timedelta(days=days)
+    since = datetime.combine(window_start, datetime.min.time())
+    txs = (session.query(Transaction)
+           .filter(Transaction.product_id == product_id, Transaction.type == 'stock_out',
+                   Transaction.date >= since, Transaction.date < since + timedelta(days=days))
+           .order_by(Transaction.date.asc()).all())
+    daily_outflow = {}
+    for tx in txs:
+        daily_outflow[tx.date.date()] = daily_outflow.get(tx.date.date(), 0) + tx.quantity
+    all_days = [window_start + timedelta(days=i) for i in range(days)]
+    result = stock_forecast_analysis(product.quantity, [daily_outflow.get(day, 0) for day in all_days])
+    result['anomaly_dates'] = [str(all_days[i]) for i in result['anomaly_indexes']]
+    return result
+
+def main():
+    rng = random.Random(42)
+    print(f"Building {args.products} products, {args.transactions} transactions in {args.db_path} ...")
+    build_dataset(rng)
+    client = api.app.test_client()
+
+    start = time.perf_counter()
+    resp = client.get(f'/products/forecast?days={args.days}')
+    cold = time.perf_counter() - start
+    assert resp.status_code == 200, resp.get_json()
+    bulk = {row['product_id']: row for row in resp.get_json()['forecasts']}
+    start = time.perf_counter()
+    client.get(f'/products/forecast?days={args.days}')
+    warm = time.perf_counter() - start
+    print(f"bulk forecast, {len(bulk)} products: {cold * 1000:8.1f} ms cold, {warm * 1000:6.1f} ms cached")
+
+    start = time.perf_counter()
+    for product_id in list(bulk)[:200]:
+        client.get(f'/products/{product_id}/forecast?days={args.days}')
+    print(f"200 per-product calls (cached):   {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    session = get_session()
+    start = time.perf_counter()
+    legacy = {pid: legacy_forecast(session, pid, args.days) for pid in bulk}
+    print(f"legacy per-product path, all:     {(time.perf_counter() - start) * 1000:8.1f} ms")
+    keys = ('predicted_depletion_days', 'smoothed_daily_average', 'anomaly_indexes', 'anomaly_dates')
+    mismatches = [pid for pid in bulk if {k: bulk[pid][k] for k in keys} != legacy[pid]]
+    assert not mismatches, f"{len(mismatches)} products differ, e.g. {mismatches[:5]}"
+
+    # A stock movement drops the cached table
+    session.add(Transaction(product_id=1, type=TransactionType.stock_out, quantity=1000,
+                            date=datetime.combine(date.today() - timedelta(days=1), datetime.min.time())))
+    session.commit()
+    refreshed = client.get(f'/products/1/forecast?days={args.days}').get_json()
+    assert refreshed == legacy_forecast(session, 1, args.days) and refreshed != legacy[1]
+    session.close()
+    print("✓ bulk results match the per-product path and refresh after a stock movement")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark SupplierPerformanceManager.evaluate() on synthetic suppliers
+(10k suppliers x 100 deliveries by default). Compares the vectorized
+evaluation with the old per-supplier loop, where every metric re-walked the
+transaction list, and checks both produce the same report. No database needed.
+Usage:
+    python benchmarks/bench_supplier_scoring.py [--suppliers 10000] [--deliveries 100] [--skip-legacy]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--suppliers', type=int, default=10000)
+parser.add_argument('--deliveries', type=int, default=100)
+parser.add_argument('--skip-legacy', action='store_true')
+args = parser.parse_args()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supplier_performance import Supplier, LocalSupplier, InternationalSupplier, SupplierPerformanceManager
+
+def build_suppliers():
+    rng = random.Random(42)
+    base_date = datetime(2025, 1, 1)
+    kinds = (Supplier, LocalSupplier, InternationalSupplier)
+    suppliers = []
+    for i in range(args.suppliers):
+        s = kinds[i % 3](f'Supplier {i}')
+        for _ in range(args.deliveries):
+            order_date = base_date + timedelta(days=rng.randint(0, 365))
+            ordered = rng.randint(50, 200)
+            s.add_transaction({
+                'unit_price': round(rng.uniform(20, 150), 2),
+                'order_date': order_date,
+                'delivery_date': order_date + timedelta(days=rng.randint(1, 14)),
+                'lead_time': rng.randint(3, 10),
+                'quantity_ordered': ordered,
+                'rejected_quantity': rng.randint(0, ordered // 10),
+            })
+        suppliers.append(s)
+    return suppliers
+
+def legacy_row(s):
+    # What each Supplier method used to do: one walk of the list per metric
+    txs = s.get_transactions()
+    price = round(statistics.mean([t['unit_price'] for t in txs]), 2)
+    on_time = round(100 * sum(1 for t in txs if (t['delivery_date'] - t['order_date']).days <= t['lead_time']) / len(txs), 1)
+    ordered = sum(t['quantity_ordered'] for t in txs)
+    rejection = round(100 * sum(t.get('rejected_quantity', 0) for t in txs) / ordered, 2)
+    lead_time = round(statistics.mean([(t['delivery_date'] - t['order_date']).days for t in txs]), 2)
+    score = round(((on_time / 100) * 4 + (1 - rejection / 100) * 3 +
+                   (1 - min(lead_time / 10, 1)) * 2 + (1 - min(price / 100, 1)) * 1) * 2, 2)
+    # Subclasses re-walked the list again for their lead-time bonus/penalty
+    lead_again = round(statistics.mean([(t['delivery_date'] - t['order_date']).days for t in txs]), 2)
+    if isinstance(s, LocalSupplier):
+        score = round(score + (0.5 if lead_again < 5 else 0), 2)
+    elif isinstance(s, InternationalSupplier):
+        score = round(score + (-0.5 if lead_again > 7 else 0), 2)
+    return {'name': s.get_name(), 'avg_price': price, 'on_time_rate': on_time,
+            'rejection_rate': rejection, 'avg_lead_time': lead_time, 'score': score}
+
+def legacy_evaluate(suppliers):
+    report = [legacy_row(s) for s in suppliers]
+    report.sort(key=lambda x: (-x['score'], x['avg_price'], x['avg_lead_time']))
+    return report
+
+def timed(fn, *fn_args):
+    start = time.perf_counter()
+    result = fn(*fn_args)
+    return result, time.perf_counter() - start
+
+def main():
+    print(f"Building {args.suppliers} suppliers x {args.deliveries} deliveries ...")
+    suppliers, build_time = timed(build_suppliers)
+    print(f"  built in {build_time:.1f}s")
+
+    report, new_time = timed(SupplierPerformanceManager(suppliers).evaluate)
+    print(f"vectorized evaluate:{new_time * 1000:10.1f} ms")
+    if not args.skip_legacy:
+        legacy, legacy_time = timed(legacy_evaluate, suppliers)
+        print(f"legacy evaluate:    {legacy_time * 1000:10.1f} ms  ({legacy_time / new_time:.1f}x slower)")
+        mismatches = sum(1 for a, b in zip(report, legacy) if a != b)
+        assert not mismatches, f'{mismatches} report rows differ from the legacy evaluation'
+
+if __name__ == '__main__':
+    main()
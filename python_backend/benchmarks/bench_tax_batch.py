@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark TaxCalculator.calculate_batch (what POST /tax/batch runs) on a
+synthetic month of invoices (5k invoices of 1-40 lines by default) against
+calling calculate_taxes once per line, as the per-invoice code paths did.
+Checks every line agrees with the scalar result within rounding, and that each
+invoice's totals are exactly the sums of its rounded lines. No database is
+needed. Usage:
+    python benchmarks/bench_tax_batch.py [--invoices 5000] [--max-lines 40]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--invoices', type=int, default=5000)
+parser.add_argument('--max-lines', type=int, default=40)
+args = parser.parse_args()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tax_calculator import tax_calculator
+
+ADDRESSES = ['Plot 4, MIDC, Pune 411019', 'Andheri East, Mumbai', 'Whitefield, Bengaluru', 'Sector 62, Noida, UP',
+             'Guindy, Chennai, Tamil Nadu', 'Salt Lake, Kolkata', 'Naroda, Ahmedabad', 'Unknown']
+CATEGORIES = list(tax_calculator.gst_rates) + ['switchgear', None]
+
+def make_invoices(rng):
+    invoices = []
+    for i in range(args.invoices):
+        invoices.append({
+            'id': i,
+            'supplier_address': rng.choice(ADDRESSES),
+            'shipping_cost': rng.choice([0, round(rng.uniform(100, 20000), 2)]),
+            'lines': [{'amount': round(rng.uniform(-500, 250000), 2), 'category': rng.choice(CATEGORIES)}
+                      for _ in range(rng.randint(1, args.max_lines))]
+        })
+    return invoices
+
+def main():
+    rng = random.Random(42)
+    invoices = make_invoices(rng)
+    line_count = sum(len(invoice['lines']) for invoice in invoices)
+    print(f"{len(invoices)} invoices, {line_count} lines")
+
+    start = time.perf_counter()
+    scalar = [[tax_calculator.calculate_taxes(line['amount'], invoice['supplier_address'], line['category'])
+               for line in invoice['lines']] for invoice in invoices]
+    elapsed = time.perf_counter() - start
+    print(f"calculate_taxes per line: {elapsed:8.3f} s")
+
+    start = time.perf_counter()
+    batch = tax_calculator.calculate_batch(invoices)
+    elapsed = time.perf_counter() - start
+    print(f"calculate_batch:          {elapsed:8.3f} s")
+
+    for invoice, expected in zip(batch['invoices'], scalar):
+        lines = invoice['lines']
+        for line, breakdown in zip(lines, expected):
+            # The scalar path does not round; CGST and SGST are rounded separately, so their sum may be a paisa off
+            assert abs(line['igst'] - breakdown.igst) <= 0.0051 and abs(line['cgst'] - breakdown.cgst) <= 0.0051
+            assert abs(line['total_tax'] - breakdown.total_tax) <= 0.0101, (invoice['id'], line, breakdown)
+            assert line['tax_type'] == breakdown.tax_type
+        goods_tax = round(sum(round(line['total_tax'] * 100) for line in lines))
+        assert round(invoice['total_tax'] * 100) == goods_tax + round(invoice['shipping_tax'] * 100)
+        assert round(invoice['subtotal'] * 100) == sum(round(line['amount'] * 100) for line in lines)
+        assert round(invoice['cgst'] * 100) == round(invoice['sgst'] * 100)
+    print("✓ lines match calculate_taxes within rounding; invoice totals are the sums of their lines")
+
+if __name__ == '__main__':
+    main()
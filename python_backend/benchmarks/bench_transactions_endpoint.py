@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Time GET /transactions and GET /reports/transactions and check how many SQL
+statements each one issues. Both endpoints must stay at a constant number of
+statements however many transactions exist (the old per-row lazy loads made
+it up to 6 per transaction).
+
+Usage: python benchmarks/bench_transactions_endpoint.py [--max-statements 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+import db_init
+import api
+
+def count_statements(client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db_init.get_engine()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        start = time.perf_counter()
+        resp = client.get(url)
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert resp.status_code == 200, resp.status_code
+    return len(resp.get_json()), len(statements), elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-statements', type=int, default=3)
+    args = parser.parse_args()
+
+    client = api.app.test_client()
+    for url in ('/transactions', '/reports/transactions'):
+        rows, statements, elapsed = count_statements(client, url)
+        print(f"GET {url}: {rows} rows, {statements} statements, {elapsed * 1000:.1f} ms")
+        assert statements <= args.max_statements, f"{url} issued {statements} statements"
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the stock ledger, with 32 parallel clients by
+default, each with its own Flask test client.
+
+1. Oversell: every client keeps posting stock_out of 1 unit against one
+   product that has --stock units. Exactly --stock moves must succeed, the
+   rest get 400 and the product ends at 0.
+2. Orders: every client places --orders multi-line orders over a small set
+   of shared products, listing them in random order (the pattern that
+   deadlocked with per-line locking). Reports orders/s and checks that
+   every product's quantity is its starting stock minus what the accepted
+   orders took, that no request failed with a 500, and that
+   inventory_summary and product_daily_stats still agree with a full
+   recompute.
+
+The dataset is written to its own SQLite file by default. SQLite runs one
+writer at a time and ignores FOR UPDATE, so the numbers that matter come
+from MySQL: pass --database-url pointing at a scratch database (ALL its
+tables are dropped and recreated). Usage:
+    python benchmarks/stress_stock_ledger.py [--clients 32] [--stock 500] [--orders 20] [--database-url URL]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--clients', type=int, default=32)
+parser.add_argument('--stock', type=int, default=500, help='units of the contended product in the oversell run')
+parser.add_argument('--orders', type=int, default=20, help='orders per client')
+parser.add_argument('--products', type=int, default=8, help='products shared by all orders')
+parser.add_argument('--db-path', default=os.path.join(tempfile.gettempdir(), 'stress_stock_ledger.sqlite3'))
+parser.add_argument('--database-url', help='scratch database to run against instead of the SQLite file')
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{args.db_path}'
+# Every client holds a connection for the length of its request
+os.environ.setdefault('DB_POOL_SIZE', str(args.clients))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert, func
+from db_init import get_engine, get_session
+from models import Base, Customer, Order, OrderItem, Product, Transaction, User, UserRole
+import inventory_summary
+import product_daily_stats
+import api
+
+OVERSOLD_ID = 1
+
+def build_dataset():
+    if not args.database_url and os.path.exists(args.db_path):
+        os.remove(args.db_path)
+    engine = get_engine()
+    if engine.dialect.name == 'sqlite':
+        # 32 writers queue on SQLite's single write lock for longer than its default 5 s
+        event.listen(engine, 'connect', lambda dbapi_conn, record: dbapi_conn.execute('PRAGMA busy_timeout = 60000'))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=1, username='stress', email='stress@example.com',
+                                         password_hash='-', role=UserRole.admin))
+        conn.execute(insert(Customer).values(id=1, name='Stress Customer'))
+        conn.execute(insert(Product), [{'id': i, 'name': f'Part {i}', 'sku': f'STRESS{i:03d}', 'category': f'cat{i % 3}',
+                                        'quantity': args.stock if i == OVERSOLD_ID else 10 ** 6, 'cost': 10.0 + i,
+                                        'reorder_level': 10} for i in range(1, args.products + 2)])
+    session = get_session()
+    inventory_summary.rebuild_summary(session)
+    session.commit()
+    session.close()
+
+def run_clients(work):
+    """Run work(client_index, test_client) on every client at once; returns (Counter of status codes, seconds)"""
+    statuses = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients)
+
+    def client_main(index):
+        client = api.app.test_client()
+        barrier.wait()
+        for status in work(index, client):
+            with lock:
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=client_main, args=(i,)) for i in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses, time.perf_counter() - start
+
+def oversell_run():
+    attempts = args.stock // args.clients + 5
+
+    def work(index, client):
+        for _ in range(attempts):
+            yield client.post('/transactions', json={'product_id': OVERSOLD_ID, 'type': 'stock_out',
+                                                     'quantity': 1, 'location': 'Main Warehouse'}).status_code
+
+    statuses, elapsed = run_clients(work)
+    session = get_session()
+    left = session.get(Product, OVERSOLD_ID).quantity
+    moved = session.query(func.count(Transaction.id)).filter(Transaction.product_id == OVERSOLD_ID).scalar()
+    session.close()
+    print(f"oversell: {args.clients * attempts} stock_outs of 1 against {args.stock} units in {elapsed:.2f} s -> "
+          f"{dict(statuses)}, quantity left {left}")
+    assert statuses[201] == args.stock == moved and left == 0 and statuses[500] == 0, "oversold or failed"
+
+def order_run():
+    shared = list(range(OVERSOLD_ID + 1, args.products + 2))
+    placed = [Counter() for _ in range(args.clients)]
+
+    def work(index, client):
+        rng = random.Random(index)
+        for _ in range(args.orders):
+            lines = rng.sample(shared, rng.randint(2, len(shared)))
+            items = [{'product_id': pid, 'quantity': rng.randint(1, 5)} for pid in lines]
+            resp = client.post('/orders', json={'customer_id': 1, 'items': items})
+            if resp.status_code == 201:
+                for item in items:
+                    placed[index][item['product_id']] += item['quantity']
+            yield resp.status_code
+
+    statuses, elapsed = run_clients(work)
+    taken = sum(placed, Counter())
+    session = get_session()
+    quantities = dict(session.query(Product.id, Product.quantity).filter(Product.id.in_(shared)))
+    order_count = session.query(func.count(Order.id)).scalar()
+    item_count = session.query(func.count(OrderItem.id)).scalar()
+    print(f"orders: {statuses[201]} multi-line orders from {args.clients} clients in {elapsed:.2f} s "
+          f"({statuses[201] / elapsed:.0f} orders/s), statuses {dict(statuses)}, {item_count} lines")
+    assert statuses[201] == order_count == args.clients * args.orders, "orders failed"
+    assert all(quantities[pid] == 10 ** 6 - taken[pid] for pid in shared), "stock does not match the orders"
+
+    drift = inventory_summary.find_drift(session)
+    stored = {(pid, day): values for pid, day, *values in product_daily_stats.daily_rows(session) if any(values)}
+    product_daily_stats.rebuild_daily_stats(session)
+    rebuilt = {(pid, day): values for pid, day, *values in product_daily_stats.daily_rows(session)}
+    session.rollback()
+    session.close()
+    assert not drift, f"inventory_summary drifted: {drift[:5]}"
+    assert stored == rebuilt, "product_daily_stats differs from a rebuild"
+
+def main():
+    print(f"Building the dataset in {args.database_url or args.db_path} ...")
+    build_dataset()
+    oversell_run()
+    order_run()
+    print("✓ no oversell, every order applied exactly, summaries consistent")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Multi-level bill of materials over the product_components table.
+
+explode_bom() walks a whole BOM with one recursive CTE instead of one lazy
+load per node. Every row carries its path from the root, so extended
+quantities (quantity multiplied down the path) come out of the query and
+cycles are cut per path: a sub-assembly used in two places is listed in
+both. A second path of component line ids tells apart two lines with the
+same parent and child, so each gets its own sub_components. where_used() is
+the reverse walk, from a part up to every assembly that contains it. Both
+need MySQL 8+ (or SQLite) for WITH RECURSIVE.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import String, cast, literal, select
+from models import Product, ProductComponent
+
+MAX_BOM_DEPTH = 50
+
+components = ProductComponent.__table__
+products = Product.__table__
+
+def _path_step(product_id):
+    return cast(product_id, String) + '/'
+
+def _tree_cte(start_id, down=True):
+    """
+    Recursive CTE of (component_id, parent_id, child_id, quantity,
+    extended_quantity, depth, path, line_path); path is product ids (for
+    cycle checks), line_path component ids (one per BOM line). Downwards
+    from `start_id` as the root, or upwards with `start_id` as the part
+    (then extended_quantity is the part count per unit of parent_id).
+    """
+    near, far = ((components.c.parent_id, components.c.child_id) if down
+                 else (components.c.child_id, components.c.parent_id))
+    anchor = select(
+        components.c.id.label('component_id'),
+        components.c.parent_id,
+        components.c.child_id,
+        components.c.quantity,
+        components.c.quantity.label('extended_quantity'),
+        literal(1).label('depth'),
+        # Wide enough for MAX_BOM_DEPTH ids; MySQL sizes the column from the anchor
+        cast(literal('/') + _path_step(near) + _path_step(far), String(1000)).label('path'),
+        cast(literal('/') + _path_step(components.c.id), String(1000)).label('line_path'),
+    ).where(near == start_id)
+    tree = anchor.cte('bom_tree', recursive=True)
+    tree_far = tree.c.child_id if down else tree.c.parent_id
+    step = select(
+        components.c.id,
+        components.c.parent_id,
+        components.c.child_id,
+        components.c.quantity,
+        tree.c.extended_quantity * components.c.quantity,
+        tree.c.depth + 1,
+        tree.c.path + _path_step(far),
+        tree.c.line_path + _path_step(components.c.id),
+    ).join(tree, near == tree_far).where(
+        tree.c.depth < MAX_BOM_DEPTH,
+        ~tree.c.path.contains('/' + _path_step(far)),
+    )
+    return tree.union_all(step)
+
+def explode_bom(session, root_id, include_cost=False):
+    """
+    Nested BOM of a product: [{sku, name, quantity, extended_quantity,
+    sub_components}], in component order. With include_cost every entry also
+    has unit_cost (own cost for a part, rolled up from its components for a
+    sub-assembly) and extended_cost. One query.
+    """
+    tree = _tree_cte(root_id)
+    rows = session.execute(
+        select(tree.c.component_id, tree.c.quantity, tree.c.extended_quantity, tree.c.depth, tree.c.line_path,
+               products.c.sku, products.c.name, products.c.cost)
+        .join(products, products.c.id == tree.c.child_id)
+        .order_by(tree.c.depth, tree.c.component_id)
+    ).all()
+
+    root = {'sub_components': []}
+    nodes = {}
+    for row in rows:
+        entry = {
+            'sku': row.sku,
+            'name': row.name,
+            'quantity': row.quantity,
+            'extended_quantity': row.extended_quantity,
+            'sub_components': [],
+        }
+        if include_cost:
+            entry['_cost'] = row.cost
+        nodes[row.line_path] = entry
+        # The parent's line path is this one minus the last id
+        parent_path = row.line_path[:row.line_path.rstrip('/').rfind('/') + 1]
+        nodes.get(parent_path, root)['sub_components'].append(entry)
+    if include_cost:
+        for entry in root['sub_components']:
+            _roll_up_cost(entry)
+    return root['sub_components']
+
+def _roll_up_cost(entry):
+    own_cost = entry.pop('_cost')
+    if entry['sub_components']:
+        unit_cost = sum(_roll_up_cost(child) * child['quantity'] for child in entry['sub_components'])
+    else:
+        unit_cost = own_cost or 0
+    entry['unit_cost'] = unit_cost
+    entry['extended_cost'] = unit_cost * entry['extended_quantity']
+    return unit_cost
+
+def bom_total_cost(bom):
+    """Cost of one unit of the root, from an explode_bom(include_cost=True) result"""
+    return sum(entry['unit_cost'] * entry['quantity'] for entry in bom)
+
+def where_used(session, part_id):
+    """
+    Every assembly that contains the part at any level, flattened:
+    [{id, sku, name, quantity_per, levels}], where quantity_per is how many of
+    the part go into one unit of the assembly (summed over all paths) and
+    levels the shallowest nesting. One query.
+    """
+    tree = _tree_cte(part_id, down=False)
+    rows = session.execute(
+        select(tree.c.parent_id, tree.c.extended_quantity, tree.c.depth, products.c.sku, products.c.name)
+        .join(products, products.c.id == tree.c.parent_id)
+        .order_by(tree.c.depth, tree.c.parent_id)
+    ).all()
+    used_in = {}
+    for row in rows:
+        entry = used_in.setdefault(row.parent_id, {
+            'id': row.parent_id, 'sku': row.sku, 'name': row.name, 'quantity_per': 0, 'levels': row.depth,
+        })
+        entry['quantity_per'] += row.extended_quantity
+    return list(used_in.values())
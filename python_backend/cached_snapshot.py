@@ -0,0 +1,103 @@
+"""
+In-process snapshots of database state, and dropping them on commit.
+
+CachedSnapshot keeps what loader(session, *key) returned for `ttl` seconds,
+one entry per key. invalidate() drops every entry; a load that an
+invalidate() raced with is returned to its caller but not kept, so a commit
+is never papered over by data read before it.
+
+stale_on_commit() registers the usual trio of Session hooks: after_flush
+notes in session.info that a cache went stale, after_commit drops it, and
+after_rollback forgets the note. Code that changes data behind the ORM
+(Core UPDATEs, raw SQL) calls mark_stale() itself.
+
+    supplier_index = CachedSnapshot(SupplierSpatialIndex.load, SUPPLIER_INDEX_TTL)
+    stale_on_commit('supplier_index_stale', target=supplier_index.invalidate)
+"""
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class CachedSnapshot:
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (value, loaded_at)
+        self._generation = 0
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries = {}
+
+    def _fresh(self, entry):
+        return entry is not None and time.monotonic() - entry[1] <= self.ttl
+
+    def get(self, *key):
+        entry = self._entries.get(key)
+        if self._fresh(entry):
+            return entry[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._fresh(entry):
+                return entry[0]
+            from db_init import get_engine
+            from sqlalchemy.orm import sessionmaker
+            generation = self._generation
+            session = sessionmaker(bind=get_engine())()
+            try:
+                value = self.loader(session, *key)
+            finally:
+                session.close()
+            # Don't keep a snapshot that an invalidate() raced with
+            if generation == self._generation:
+                # Expired entries (e.g. keys of previous days) go when a new one is stored
+                entries = {k: e for k, e in self._entries.items() if self._fresh(e)}
+                entries[key] = (value, time.monotonic())
+                self._entries = entries
+            return value
+
+def mark_stale(session, flag, keys=None):
+    """
+    Note in session.info that `flag`'s cache is stale once `session` commits:
+    all of it (keys None) or just the given keys.
+    """
+    pending = session.info.get(flag)
+    if keys is None or pending is True:
+        session.info[flag] = True
+    else:
+        session.info.setdefault(flag, set()).update(keys)
+
+def stale_on_commit(flag, predicate=None, target=None):
+    """
+    Register the after_flush / after_commit / after_rollback hooks for one cache.
+
+    predicate(session) runs after every flush and returns what went stale:
+    True for everything, an iterable of keys, or something falsy. Without a
+    predicate, only mark_stale() marks the cache. On commit target() is
+    called once if everything went stale, else target(key) once per key.
+    """
+    if predicate is not None:
+        @event.listens_for(Session, 'after_flush')
+        def _note_stale(session, flush_context):
+            stale = predicate(session)
+            if stale is True:
+                mark_stale(session, flag)
+            elif stale:
+                mark_stale(session, flag, stale)
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidate(session):
+        pending = session.info.pop(flag, None)
+        if pending is True:
+            target()
+        elif pending:
+            for key in pending:
+                target(key)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_pending(session):
+        session.info.pop(flag, None)
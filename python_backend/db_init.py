@@ -1,7 +1,10 @@
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 import sys
 import os
+import threading
+import time
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
     from python_backend.models import Base, User, UserRole, Product, Customer, Warehouse, Employee, Project, ProjectRequirement, ProjectStatus, Requisition, RequisitionStatus, Supplier, Transaction, Skill, FinishedProduct, FinishedProductSkill, FinishedProductMaterial, ProjectTask, ProjectTaskDependency, ProjectTaskMaterial, CompanyHoliday, Order, ApplicationTag
@@ -16,10 +19,93 @@ MYSQL_PASSWORD = 'newpassword'
 MYSQL_HOST = 'localhost'
 MYSQL_DB = 'stock_db'
 
-DATABASE_URL = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DB}'
+DATABASE_URL = os.getenv('DATABASE_URL', f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DB}')
+
+# Connection pool settings (one pool per process, shared by every request)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # below MySQL wait_timeout
+DB_ECHO = os.getenv('DB_ECHO', '0') == '1'
+
+_pool_wait_stats = {'checkouts': 0, 'total_wait_ms': 0.0, 'max_wait_ms': 0.0, 'timeouts': 0}
+_pool_stats_lock = threading.Lock()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to get a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with _pool_stats_lock:
+                _pool_wait_stats['timeouts'] += 1
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - start) * 1000
+            with _pool_stats_lock:
+                _pool_wait_stats['checkouts'] += 1
+                _pool_wait_stats['total_wait_ms'] += waited_ms
+                _pool_wait_stats['max_wait_ms'] = max(_pool_wait_stats['max_wait_ms'], waited_ms)
+
+_engine = None
+_engine_lock = threading.Lock()
+_session_factory = sessionmaker()
+# Request-scoped session; api.py commits/rolls back and removes it on teardown
+db_session = scoped_session(_session_factory)
 
 def get_engine():
-    return create_engine(DATABASE_URL, echo=True)
+    """Return the process-wide engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    DATABASE_URL,
+                    echo=DB_ECHO,
+                    poolclass=InstrumentedQueuePool,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                )
+                _session_factory.configure(bind=_engine)
+    return _engine
+
+def get_session():
+    """Return the session for the current request (or thread)."""
+    get_engine()
+    return db_session()
+
+def get_pool_status():
+    """Snapshot of connection pool usage for the admin endpoint."""
+    pool = get_engine().pool
+    with _pool_stats_lock:
+        stats = dict(_pool_wait_stats)
+    checkouts = stats['checkouts']
+    return {
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout_s': DB_POOL_TIMEOUT,
+        'pool_recycle_s': DB_POOL_RECYCLE,
+        'checkouts': checkouts,
+        'timeouts': stats['timeouts'],
+        'avg_wait_ms': round(stats['total_wait_ms'] / checkouts, 3) if checkouts else 0.0,
+        'max_wait_ms': round(stats['max_wait_ms'], 3),
+    }
+
+def _dispose_engine_after_fork():
+    # Forked workers must not share the parent's pooled sockets
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engine_after_fork)
 
 def create_tables():
     engine = get_engine()
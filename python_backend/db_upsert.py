@@ -0,0 +1,46 @@
+"""
+Counter rows that concurrent writers can create without colliding.
+
+add_to_rows() inserts a row per key, or adds to the row that already has
+that key, in one statement per row: INSERT ... ON DUPLICATE KEY UPDATE on
+MySQL, INSERT ... ON CONFLICT DO UPDATE on SQLite and PostgreSQL. An UPDATE
+followed by an INSERT when it matched nothing lets two writers that both
+create the same row fail on its unique key (and on InnoDB deadlock on the
+gap locks the UPDATE took).
+
+    add_to_rows(connection, stats_table, ('product_id', 'day'),
+                [{'product_id': 3, 'day': day, 'units_in': 5, 'units_out': 0, 'value_in': 60.0}])
+"""
+
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+def _insert(connection, table):
+    name = connection.dialect.name
+    if name in ('mysql', 'mariadb'):
+        return mysql.insert(table)
+    if name == 'postgresql':
+        return postgresql.insert(table)
+    if name == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError(f"add_to_rows does not support the {name} dialect")
+
+def add_to_rows(connection, table, key_columns, rows, replace_columns=()):
+    """
+    Insert `rows` (dicts with the same columns), or add their values to the
+    existing rows with the same key_columns. replace_columns (e.g. a
+    timestamp) are overwritten instead of added to. Rows are written in the
+    given order; sort them so concurrent writers lock rows in the same order.
+    """
+    if not rows:
+        return
+    stmt = _insert(connection, table)
+    columns = [col for col in rows[0] if col not in key_columns]
+    if connection.dialect.name in ('mysql', 'mariadb'):
+        new = stmt.inserted
+        stmt = stmt.on_duplicate_key_update({
+            col: new[col] if col in replace_columns else table.c[col] + new[col] for col in columns})
+    else:
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c[col] for col in key_columns], set_={
+            col: new[col] if col in replace_columns else table.c[col] + new[col] for col in columns})
+    connection.execute(stmt, rows)
@@ -0,0 +1,218 @@
+"""
+Stored material/skill rollups on finished products, and cost propagation.
+
+finished_products.materials_cost (SUM of material quantity * Product.cost),
+materials_count and skills_count are recomputed by a Session after_flush hook
+for every finished product whose materials or skills were touched, so
+GET /finished_products reads them straight off the row instead of
+aggregating per product.
+
+When a material's cost changes, the reverse BOM index on
+finished_product_materials(material_id) finds the finished products that use
+it and one UPDATE per batch reprices them: materials_cost is recomputed,
+total_cost moves by the same amount (so the labor part is kept) and
+base_price is total_cost plus profit_margin_percent. Models whose BOM is
+edited in the same flush keep the totals the endpoint just set.
+
+Bulk query(...).delete()/update() on the material and skill link tables (the
+edit endpoint clears and re-adds them) are caught by a do_orm_execute hook
+that refreshes the products they touched. Raw SQL and bulk updates of
+Product.cost bypass both hooks. Run
+    python finished_product_rollups.py --reconcile [--fix]
+to compare the stored values with a full recomputation, or --rebuild to
+recompute and reprice every finished product.
+"""
+
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from models import FinishedProduct, FinishedProductMaterial, FinishedProductSkill, Product, Skill
+from cached_snapshot import mark_stale
+
+ROLLUP_COLUMNS = ('materials_cost', 'materials_count', 'skills_count')
+PRICE_COLUMNS = ('total_cost', 'base_price')
+DEFAULT_MARGIN_PERCENT = 20.0
+BATCH_SIZE = 5000
+
+fp_table = FinishedProduct.__table__
+fpm_table = FinishedProductMaterial.__table__
+fps_table = FinishedProductSkill.__table__
+
+def _rollup_values():
+    """Correlated subqueries computing each rollup for the finished_products row being updated"""
+    materials = (fpm_table.c.finished_product_id == fp_table.c.id)
+    return {
+        'materials_cost': (
+            select(func.coalesce(func.sum(fpm_table.c.quantity * Product.cost), 0))
+            .select_from(fpm_table.join(Product.__table__, Product.id == fpm_table.c.material_id))
+            .where(materials).scalar_subquery()
+        ),
+        'materials_count': select(func.count()).select_from(fpm_table).where(materials).scalar_subquery(),
+        'skills_count': (
+            select(func.count()).select_from(fps_table)
+            .where(fps_table.c.finished_product_id == fp_table.c.id).scalar_subquery()
+        ),
+    }
+
+def _assignments(reprice):
+    values = _rollup_values()
+    assignments = [(fp_table.c[col], values[col]) for col in ROLLUP_COLUMNS]
+    if not reprice:
+        return assignments
+    new_materials = values['materials_cost']
+    # A NULL materials_cost (never computed) leaves the total where it is
+    total = (func.coalesce(fp_table.c.total_cost, 0) + new_materials
+             - func.coalesce(fp_table.c.materials_cost, new_materials))
+    margin = func.coalesce(fp_table.c.profit_margin_percent, DEFAULT_MARGIN_PERCENT)
+    # Priced columns first: MySQL evaluates SET left to right with the new
+    # values, so each right-hand side may only use columns assigned after it
+    return [
+        (fp_table.c.base_price, total * (1 + margin / 100.0)),
+        (fp_table.c.total_cost, total),
+    ] + assignments
+
+def _batches(ids, size=BATCH_SIZE):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def refresh_rollups(connection, fp_ids=None, reprice=False):
+    """
+    Recompute the rollups for the given finished products (all of them when
+    fp_ids is None). With reprice, total_cost and base_price follow the change
+    in materials cost. Returns the number of rows updated.
+    """
+    stmt = update(fp_table).ordered_values(*_assignments(reprice))
+    if fp_ids is None:
+        return connection.execute(stmt).rowcount
+    return sum(connection.execute(stmt.where(fp_table.c.id.in_(batch))).rowcount for batch in _batches(fp_ids))
+
+def finished_products_using(connection, material_ids):
+    """Reverse BOM lookup: ids of the finished products that use any of the materials"""
+    fp_ids = set()
+    for batch in _batches(material_ids):
+        fp_ids.update(connection.execute(
+            select(fpm_table.c.finished_product_id).where(fpm_table.c.material_id.in_(batch)).distinct()
+        ).scalars())
+    return fp_ids
+
+def _cost_changed(product):
+    return bool(inspect(product).attrs.cost.history.has_changes())
+
+def _affected_finished_products(session):
+    fp_ids = set()
+    material_ids = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, (FinishedProductMaterial, FinishedProductSkill)):
+            if obj.finished_product_id is not None:
+                fp_ids.add(obj.finished_product_id)
+            if isinstance(obj, FinishedProductMaterial) and obj in session.dirty:
+                # Moved to another finished product: the old one changes too
+                history = inspect(obj).attrs.finished_product_id.history
+                fp_ids.update(fp_id for fp_id in history.deleted if fp_id is not None)
+        elif isinstance(obj, FinishedProduct) and obj not in session.deleted:
+            fp_ids.add(obj.id)
+        elif isinstance(obj, Product) and (obj in session.deleted or (obj in session.dirty and _cost_changed(obj))):
+            material_ids.add(obj.id)
+    return fp_ids, material_ids
+
+@event.listens_for(Session, 'after_flush')
+def _update_finished_product_rollups(session, flush_context):
+    fp_ids, material_ids = _affected_finished_products(session)
+    if not fp_ids and not material_ids:
+        return
+    connection = session.connection()
+    repriced = finished_products_using(connection, material_ids) - fp_ids if material_ids else set()
+    refresh_rollups(connection, fp_ids)
+    if repriced and refresh_rollups(connection, repriced, reprice=True):
+        # Prices changed behind the ORM, where product_match_index's hook can't see them
+        mark_stale(session, 'match_index_stale')
+    # The UPDATEs went around the ORM; drop any loaded values so they are re-read
+    for obj in session.identity_map.values():
+        if isinstance(obj, FinishedProduct) and obj.id in fp_ids:
+            session.expire(obj, ROLLUP_COLUMNS)
+        elif isinstance(obj, FinishedProduct) and obj.id in repriced:
+            session.expire(obj, ROLLUP_COLUMNS + PRICE_COLUMNS)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _refresh_after_bulk_link_change(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (FinishedProductMaterial, FinishedProductSkill):
+        return None
+    table = mapper.local_table
+    session = orm_execute_state.session
+    connection = session.connection()
+    affected = select(table.c.finished_product_id).distinct()
+    if orm_execute_state.statement.whereclause is not None:
+        affected = affected.where(orm_execute_state.statement.whereclause)
+    fp_ids = set(connection.execute(affected).scalars())
+    result = orm_execute_state.invoke_statement()
+    if orm_execute_state.is_update:
+        # finished_product_id may have been rewritten
+        fp_ids.update(connection.execute(affected).scalars())
+    refresh_rollups(connection, fp_ids - {None})
+    return result
+
+def finished_product_skill_names(session, fp_ids):
+    """{finished_product_id: [skill name, ...]} for all the given products in one query"""
+    names = {}
+    if not fp_ids:
+        return names
+    rows = (session.query(FinishedProductSkill.finished_product_id, Skill.name)
+            .join(Skill, Skill.id == FinishedProductSkill.skill_id)
+            .filter(FinishedProductSkill.finished_product_id.in_(fp_ids))
+            .order_by(FinishedProductSkill.id))
+    for fp_id, name in rows:
+        names.setdefault(fp_id, []).append(name)
+    return names
+
+def find_drift(session, tolerance=1e-6):
+    """List (finished_product_id, column, stored, expected) for every rollup that is out of date"""
+    values = _rollup_values()
+    query = select(fp_table.c.id, *[fp_table.c[col] for col in ROLLUP_COLUMNS],
+                   *[values[col] for col in ROLLUP_COLUMNS]).order_by(fp_table.c.id)
+    drift = []
+    for row in session.execute(query):
+        fp_id, stored, expected = row[0], row[1:4], row[4:7]
+        for col, have, want in zip(ROLLUP_COLUMNS, stored, expected):
+            if abs((have or 0) - (want or 0)) > tolerance * max(1.0, abs(want or 0)):
+                drift.append((fp_id, col, have, want))
+    return drift
+
+if __name__ == '__main__':
+    from db_init import get_session
+
+    parser = argparse.ArgumentParser(description='Check or rebuild the finished product rollup columns')
+    parser.add_argument('--reconcile', action='store_true', help='compare stored rollups with a recomputation')
+    parser.add_argument('--fix', action='store_true', help='recompute and reprice everything if drift is found')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='recompute every rollup and reprice every finished product from current material costs')
+    args = parser.parse_args()
+
+    session = get_session()
+    if args.rebuild:
+        count = refresh_rollups(session.connection(), reprice=True)
+        session.commit()
+        print(f"✓ Recomputed and repriced {count} finished products")
+    else:
+        drift = find_drift(session)
+        if not drift:
+            print("✓ finished product rollups are up to date")
+        else:
+            print(f"✗ {len(drift)} stale values:")
+            for fp_id, col, have, want in drift:
+                print(f"   finished product {fp_id} {col}: stored={have} expected={want}")
+            if args.fix:
+                count = refresh_rollups(session.connection(), reprice=True)
+                session.commit()
+                print(f"✓ Recomputed and repriced {count} finished products")
+            else:
+                session.close()
+                sys.exit(1)
+    session.close()
@@ -1,6 +1,9 @@
 import math
 from typing import List, Dict
 
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
 def recursive_moving_average(data: List[float], alpha: float = 0.6) -> float:
     """
     Computes the exponentially weighted moving average (recursive) for a list of values.
@@ -52,6 +55,48 @@ def stock_forecast_analysis(current_stock: float, daily_outflow: List[float], al
         "anomaly_indexes": anomaly_indexes
     }
 
+def recursive_moving_average_matrix(outflow: np.ndarray, alpha: float = 0.6) -> np.ndarray:
+    """
+    recursive_moving_average() for every row of a products x days matrix at
+    once: one vector update per day instead of one Python loop per product.
+    """
+    if outflow.shape[1] == 0:
+        return np.zeros(outflow.shape[0])
+    avg = outflow[:, 0].astype(float)
+    for day in range(1, outflow.shape[1]):
+        avg = alpha * outflow[:, day] + (1 - alpha) * avg
+    return avg
+
+def detect_anomalies_matrix(outflow: np.ndarray, window: int = 5, threshold: float = 2.5) -> np.ndarray:
+    """
+    detect_anomalies() for every row: boolean products x days mask of spikes,
+    using one rolling window sum over the whole matrix.
+    """
+    spikes = np.zeros(outflow.shape, dtype=bool)
+    if outflow.shape[1] <= window:
+        return spikes
+    prev_avg = sliding_window_view(outflow, window, axis=1)[:, :-1].sum(axis=-1) / window
+    spikes[:, window:] = (prev_avg > 0) & (outflow[:, window:] > threshold * prev_avg)
+    return spikes
+
+def bulk_stock_forecast_analysis(current_stock: np.ndarray, outflow: np.ndarray, alpha: float = 0.6) -> List[Dict]:
+    """
+    stock_forecast_analysis() for many products: current_stock has one entry
+    per row of the products x days outflow matrix. Same values per product.
+    """
+    smoothed = recursive_moving_average_matrix(outflow, alpha)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depletion = np.where(smoothed > 0, current_stock / smoothed, np.inf)
+    spikes = detect_anomalies_matrix(outflow)
+    results = []
+    for row, (days, avg) in enumerate(zip(depletion.tolist(), smoothed.tolist())):
+        results.append({
+            "predicted_depletion_days": None if days == math.inf else max(1, math.ceil(days)),
+            "smoothed_daily_average": round(avg, 1),
+            "anomaly_indexes": np.flatnonzero(spikes[row]).tolist(),
+        })
+    return results
+
 # Example usage (for testing):
 if __name__ == "__main__":
     daily_outflow = [4, 5, 6, 8, 15, 7, 6]
@@ -0,0 +1,160 @@
+"""
+Address to state / city matcher over gazetteer_in.json.
+
+An address is split into words once and each run of up to the longest
+place name's length is looked up in one dict of state names (with aliases)
+and city names, longest first. The cost is a few dict lookups per word
+whatever the size of the gazetteer; over gazetteer_in.json an uncached
+lookup costs about what the old substring loops did. Only whole words
+match: "ka" inside "Kalyani" or "up" inside "pick up" no longer count.
+Two-letter state codes only match as upper-case words ("Pune, MH"), since
+most of them are also ordinary words. PIN codes are six digits; the split form "411 019" only
+counts right after a place name or at the end of the address, since flat and
+house numbers ("Flat 302 401") look the same.
+
+The state of an address comes from, in order: the postal circle of a PIN
+code (longest matching prefix), the last state name or known city in the
+address, a state code. A PIN is the one unambiguous part; state names also
+turn up in street and school names ("12 Delhi Road, Pune"). When a kind of
+place appears more than once, the last one wins (addresses go from street
+to region). Results are cached per address in an LRU, and
+resolve_many() resolves a batch with each distinct address matched once.
+
+    from gazetteer import gazetteer
+    match = gazetteer.resolve('Plot 4, MIDC, Pune 411019')
+    match.state, match.city, match.coords    # 'Maharashtra', 'pune', (18.5204, 73.8567)
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer_in.json')
+CACHE_SIZE = int(os.getenv('GAZETTEER_CACHE_SIZE', '4096'))
+
+class AddressMatch(NamedTuple):
+    """What an address resolved to; every field is None when nothing matched. Cached, so immutable."""
+    state: Optional[str] = None       # state name as in the gazetteer, e.g. 'Maharashtra'
+    state_code: Optional[str] = None  # e.g. 'MH'
+    city: Optional[str] = None        # canonical city name, e.g. 'bangalore' for 'Bengaluru'
+    coords: Optional[Tuple[float, float]] = None  # (lat, lng) of the city
+    pin: Optional[str] = None
+
+_WORD = re.compile(r'[^\W_]+|&')
+
+def _words(text):
+    # Punctuation separates words; '&' reads as 'and'
+    return ['and' if w == '&' else w for w in _WORD.findall(text)]
+
+def normalize_address(address):
+    """LRU key of an address: whitespace collapsed (case is kept, state codes depend on it)"""
+    return ' '.join((address or '').split())
+
+class Gazetteer:
+    def __init__(self, data, cache_size=CACHE_SIZE):
+        self.state_names = {s['code']: s['name'] for s in data['states']}
+        self.city_coords = {c['name']: (c['lat'], c['lng']) for c in data.get('cities', [])}
+        self.city_states = {c['name']: c.get('state') for c in data.get('cities', [])}
+        self.pin_prefixes = data.get('pin_prefixes', {})
+        self._pin_lengths = sorted({len(p) for p in self.pin_prefixes}, reverse=True)
+
+        # ('new', 'delhi') -> {'state': code, 'city': name}; ('delhi',) is both
+        self._places = {}
+        for s in data['states']:
+            for name in [s['name']] + s.get('aliases', []):
+                self._add_place(name, 'state', s['code'])
+        for c in data.get('cities', []):
+            for name in [c['name']] + c.get('aliases', []):
+                self._add_place(name, 'city', c['name'])
+        # First word of a place -> most words a place starting with it has
+        self._first_words = {}
+        for words in self._places:
+            self._first_words[words[0]] = max(self._first_words.get(words[0], 0), len(words))
+        self._resolve_cached = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _add_place(self, name, kind, value):
+        words = _words(name.lower())
+        # Addresses are matched as written, so 'Jammu & Kashmir' is indexed with '&' too
+        for spelling in {tuple(words), tuple('&' if w == 'and' else w for w in words)}:
+            self._places.setdefault(spelling, {}).setdefault(kind, value)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_GAZETTEER, **kwargs):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    def _pin_state(self, pin):
+        for length in self._pin_lengths:
+            code = self.pin_prefixes.get(pin[:length])
+            if code:
+                return code
+        return None
+
+    def _resolve(self, address):
+        words = _WORD.findall(address)
+        lower = _WORD.findall(address.lower())
+        if len(lower) != len(words):
+            # Lower-casing changed a word boundary (e.g. 'İ')
+            lower = [w.lower() for w in words]
+        places, first_words, state_names = self._places, self._first_words, self.state_names
+        count = len(words)
+        city = pin = named = code = None
+        after_place = False  # the previous word ended a state or city name
+        i = 0
+        while i < count:
+            word = lower[i]
+            longest = first_words.get(word)
+            if longest is None:
+                if word.isdigit():
+                    if len(word) == 6 and word[0] != '0':
+                        pin = word
+                    elif (len(word) == 3 and word[0] != '0' and i + 1 < count and len(lower[i + 1]) == 3
+                          and lower[i + 1].isdigit() and (after_place or lower[i + 2:] in ([], ['india']))):
+                        # "411 019"; flat and house numbers ("Flat 302 401") look the same, so a split
+                        # PIN only counts after a place name or at the end of the address
+                        pin = word + lower[i + 1]
+                        i += 1
+                elif words[i] in state_names:
+                    code = words[i]
+                after_place = False
+                i += 1
+                continue
+            for n in range(min(longest, count - i), 0, -1):
+                place = places.get(tuple(lower[i:i + n]))
+                if place:
+                    city = place.get('city', city)
+                    named = place.get('state') or self.city_states.get(place.get('city')) or named
+                    after_place = True
+                    i += n
+                    break
+            else:
+                if words[i] in state_names:
+                    code = words[i]
+                after_place = False
+                i += 1
+        code = (self._pin_state(pin) if pin else None) or named or code
+        return AddressMatch(state_names.get(code), code, city, self.city_coords.get(city), pin)
+
+    def resolve(self, address):
+        """AddressMatch for one address"""
+        normalized = normalize_address(address)
+        if not normalized:
+            return AddressMatch()
+        return self._resolve_cached(normalized)
+
+    def resolve_many(self, addresses) -> List[AddressMatch]:
+        """AddressMatch for each address, in order; repeated addresses are matched once"""
+        results: Dict[str, AddressMatch] = {}
+        for address in addresses:
+            key = normalize_address(address)
+            if key not in results:
+                results[key] = self._resolve_cached(key) if key else AddressMatch()
+        return [results[normalize_address(address)] for address in addresses]
+
+    def cache_info(self):
+        return self._resolve_cached.cache_info()
+
+# Global instance
+gazetteer = Gazetteer.from_file()
@@ -0,0 +1,207 @@
+"""
+Geocoding service with a persistent cache.
+
+Addresses are normalized (case, punctuation, whitespace) and looked up in the
+geocode_cache table before the provider is asked, so the same delivery or
+supplier address is only resolved once per TTL. Providers are pluggable:
+Mapbox over HTTP, or a local gazetteer file for offline use. Pick one with
+GEOCODER_PROVIDER=mapbox|gazetteer (default: mapbox when MAPBOX_TOKEN is set).
+
+    from geocoding import get_geocoder
+    coords = get_geocoder().geocode('12 MG Road, Pune')      # (lat, lng) or None
+    found = get_geocoder().geocode_many(addresses)            # {address: (lat, lng) or None}
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from db_init import get_engine
+from models import GeocodeCache
+from gazetteer import Gazetteer, gazetteer, DEFAULT_GAZETTEER
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = timedelta(days=int(os.getenv('GEOCODE_CACHE_TTL_DAYS', '90')))
+NEGATIVE_CACHE_TTL = timedelta(hours=int(os.getenv('GEOCODE_NEGATIVE_TTL_HOURS', '24')))
+REQUEST_TIMEOUT = float(os.getenv('GEOCODE_TIMEOUT', '5'))
+MAX_WORKERS = int(os.getenv('GEOCODE_MAX_WORKERS', '4'))
+
+cache_table = GeocodeCache.__table__
+
+class GeocodingError(Exception):
+    """The provider could not be reached or returned garbage (not the same as "no match")."""
+
+def normalize_address(address):
+    """Cache key form of an address: lower case, punctuation dropped, single spaces"""
+    text = re.sub(r'[^\w\s]', ' ', (address or '').lower())
+    return ' '.join(text.split())
+
+def _address_key(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+class MapboxProvider:
+    name = 'mapbox'
+    URL = 'https://api.mapbox.com/geocoding/v5/mapbox.places/{query}.json'
+
+    def __init__(self, token, country='IN', timeout=REQUEST_TIMEOUT):
+        self.token = token
+        self.country = country
+        self.timeout = timeout
+
+    def geocode(self, address):
+        params = {'access_token': self.token, 'limit': 1}
+        if self.country:
+            params['country'] = self.country
+        try:
+            resp = requests.get(self.URL.format(query=requests.utils.quote(address, safe='')),
+                                params=params, timeout=self.timeout)
+            resp.raise_for_status()
+            features = resp.json().get('features') or []
+        except (requests.RequestException, ValueError) as e:
+            # str(e) would carry the request URL, access token included
+            raise GeocodingError(f'Mapbox request failed ({type(e).__name__})')
+        if not features:
+            return None
+        lng, lat = features[0]['center']
+        return lat, lng
+
+class GazetteerProvider:
+    """Offline lookup: the coordinates of the gazetteer city named in the address"""
+    name = 'gazetteer'
+
+    def __init__(self, path=DEFAULT_GAZETTEER):
+        self.gazetteer = gazetteer if path == DEFAULT_GAZETTEER else Gazetteer.from_file(path)
+
+    def geocode(self, address):
+        return self.gazetteer.resolve(address).coords
+
+class Geocoder:
+    def __init__(self, provider, max_workers=MAX_WORKERS):
+        self.provider = provider
+        self.max_workers = max_workers
+
+    def _read_cache(self, keys):
+        now = datetime.now()
+        query = select(cache_table.c.address_key, cache_table.c.lat, cache_table.c.lng).where(
+            cache_table.c.provider == self.provider.name,
+            cache_table.c.address_key.in_(keys),
+            cache_table.c.expires_at > now,
+        )
+        try:
+            with get_engine().connect() as conn:
+                return {key: (lat, lng) if lat is not None else None for key, lat, lng in conn.execute(query)}
+        except SQLAlchemyError as e:
+            logger.warning('geocode cache read failed: %s', e)
+            return {}
+
+    def _write_cache(self, results):
+        """results: {key: (normalized address, coords or None)}"""
+        if not results:
+            return
+        now = datetime.now()
+        rows = [{
+            'provider': self.provider.name,
+            'address_key': key,
+            'address': normalized,
+            'lat': coords[0] if coords else None,
+            'lng': coords[1] if coords else None,
+            'created_at': now,
+            'expires_at': now + (CACHE_TTL if coords else NEGATIVE_CACHE_TTL),
+        } for key, (normalized, coords) in results.items()]
+        try:
+            with get_engine().begin() as conn:
+                conn.execute(delete(cache_table).where(cache_table.c.provider == self.provider.name,
+                                                       cache_table.c.address_key.in_(list(results))))
+                conn.execute(insert(cache_table), rows)
+        except SQLAlchemyError as e:
+            # Another worker may have cached the same address first; the cache is best effort
+            logger.warning('geocode cache write failed: %s', e)
+
+    def geocode(self, address):
+        """(lat, lng) for one address, None if the provider has no match. Raises GeocodingError."""
+        if not address or not address.strip():
+            return None
+        normalized = normalize_address(address)
+        key = _address_key(normalized)
+        cached = self._read_cache([key])
+        if key in cached:
+            return cached[key]
+        coords = self.provider.geocode(address)
+        self._write_cache({key: (normalized, coords)})
+        return coords
+
+    def geocode_many(self, addresses):
+        """
+        Geocode a batch: one cache query, provider calls for the misses on at
+        most `max_workers` threads, one cache write. Returns {address: coords
+        or None}; addresses whose lookup failed are left out.
+        """
+        by_key = {}
+        for address in addresses:
+            if address and address.strip():
+                normalized = normalize_address(address)
+                by_key.setdefault(_address_key(normalized), (normalized, []))[1].append(address)
+        if not by_key:
+            return {}
+        resolved = self._read_cache(list(by_key))
+        misses = [key for key in by_key if key not in resolved]
+
+        def lookup(key):
+            try:
+                return key, self.provider.geocode(by_key[key][1][0]), None
+            except GeocodingError as e:
+                return key, None, e
+
+        fresh = {}
+        if misses:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(misses)))) as pool:
+                for key, coords, error in pool.map(lookup, misses):
+                    if error is not None:
+                        logger.warning('geocoding %r failed: %s', by_key[key][1][0], error)
+                        continue
+                    resolved[key] = coords
+                    fresh[key] = (by_key[key][0], coords)
+        self._write_cache(fresh)
+        return {address: resolved[key] for key, (_, originals) in by_key.items() if key in resolved
+                for address in originals}
+
+def purge_expired():
+    """Delete expired cache rows; returns how many were removed"""
+    with get_engine().begin() as conn:
+        return conn.execute(delete(cache_table).where(cache_table.c.expires_at <= datetime.now())).rowcount
+
+def mapbox_token():
+    token = os.environ.get('MAPBOX_TOKEN') or os.environ.get('VITE_MAPBOX_TOKEN')
+    return token if token and token not in ('YOUR_MAPBOX_TOKEN', '<YOUR_MAPBOX_TOKEN_HERE>') else None
+
+def make_provider(name=None):
+    name = name or os.getenv('GEOCODER_PROVIDER') or ('mapbox' if mapbox_token() else 'gazetteer')
+    if name == 'mapbox':
+        if not mapbox_token():
+            raise ValueError('GEOCODER_PROVIDER=mapbox needs MAPBOX_TOKEN')
+        return MapboxProvider(mapbox_token(), country=os.getenv('GEOCODER_COUNTRY', 'IN') or None)
+    if name == 'gazetteer':
+        return GazetteerProvider(os.getenv('GEOCODER_GAZETTEER', DEFAULT_GAZETTEER))
+    raise ValueError(f"Unknown geocoding provider '{name}'")
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+def get_geocoder():
+    """Process-wide Geocoder for the configured provider"""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = Geocoder(make_provider())
+    return _geocoder
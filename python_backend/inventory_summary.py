@@ -0,0 +1,250 @@
+"""
+Incrementally maintained inventory summary.
+
+The inventory_summary table holds product count, quantity, stock value and
+stock-status counts per category and per supplier. A Session after_flush
+hook applies the change of every inserted, updated or deleted Product to
+those rows in the same DB transaction, so /reports/kpis and
+/reports/analytics read a handful of rows instead of scanning products.
+Catalogue totals are the sum of the category rows: a single total row
+would be updated, and stay locked until commit, by every stock move,
+serializing all writers. Rows are added to with an upsert (db_upsert.py),
+so two writers creating the same category or supplier row do not collide.
+
+Bulk UPDATE/DELETE statements and raw SQL bypass the hook. Run
+    python inventory_summary.py --reconcile [--fix]
+to compare the table with a full scan and rebuild it when it has drifted.
+"""
+
+import argparse
+import sys
+import os
+from collections import defaultdict
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func, case, inspect, insert, delete
+from sqlalchemy.orm import Session
+from models import Product, Supplier, InventorySummary
+from db_upsert import add_to_rows
+
+SCOPE_TOTAL = 'total'  # no longer written; rows from older tables are ignored and dropped by a rebuild
+SCOPE_CATEGORY = 'category'
+SCOPE_SUPPLIER = 'supplier'
+
+STATUS_COUNT_COLUMNS = {
+    'in_stock': 'in_stock_count',
+    'low_stock': 'low_stock_count',
+    'out_of_stock': 'out_of_stock_count',
+}
+SUMMARY_COLUMNS = ['product_count', 'total_quantity', 'total_value'] + list(STATUS_COUNT_COLUMNS.values())
+
+summary_table = InventorySummary.__table__
+
+def stock_status(quantity, reorder_level):
+    """Python twin of stock_status_case()"""
+    qty = quantity or 0
+    if qty == 0:
+        return 'out_of_stock'
+    if qty <= (reorder_level or 0):
+        return 'low_stock'
+    return 'in_stock'
+
+def stock_status_case(quantity=Product.quantity, reorder_level=Product.reorder_level):
+    """SQL version of the in_stock / low_stock / out_of_stock rule used by the product listings"""
+    qty = func.coalesce(quantity, 0)
+    return case(
+        (qty == 0, 'out_of_stock'),
+        (qty <= func.coalesce(reorder_level, 0), 'low_stock'),
+        else_='in_stock'
+    )
+
+def _scope_keys(category, supplier_id):
+    return [
+        (SCOPE_CATEGORY, category or ''),
+        (SCOPE_SUPPLIER, str(supplier_id) if supplier_id else ''),
+    ]
+
+def _add_contribution(deltas, values, sign):
+    quantity = values['quantity']
+    cost = values['cost']
+    contribution = {
+        'product_count': 1,
+        'total_quantity': quantity or 0,
+        # SUM(quantity * cost) skips rows where either is NULL
+        'total_value': quantity * cost if quantity is not None and cost is not None else 0,
+        STATUS_COUNT_COLUMNS[stock_status(quantity, values['reorder_level'])]: 1,
+    }
+    for key in _scope_keys(values['category'], values['supplier_id']):
+        for column, amount in contribution.items():
+            deltas[key][column] += sign * amount
+
+TRACKED_FIELDS = ('category', 'supplier_id', 'quantity', 'cost', 'reorder_level')
+
+def _current_values(product):
+    return {field: getattr(product, field) for field in TRACKED_FIELDS}
+
+def _previous_values(product):
+    state = inspect(product)
+    values = {}
+    for field in TRACKED_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        elif history.unchanged:
+            values[field] = history.unchanged[0]
+        else:
+            values[field] = None
+    return values
+
+def _collect_deltas(session):
+    deltas = defaultdict(lambda: defaultdict(float))
+    for obj in session.new:
+        if isinstance(obj, Product):
+            _add_contribution(deltas, _current_values(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            _add_contribution(deltas, _previous_values(obj), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj, include_collections=False):
+            before = _previous_values(obj)
+            after = _current_values(obj)
+            if before != after:
+                _add_contribution(deltas, before, -1)
+                _add_contribution(deltas, after, 1)
+    return deltas
+
+def apply_deltas(connection, deltas):
+    """Add per-scope deltas to inventory_summary, creating missing rows"""
+    now = datetime.now()
+    # Fixed row order, so concurrent writers lock summary rows in the same order
+    rows = [dict(scope=scope, scope_key=scope_key, updated_at=now, **{col: changes[col] for col in SUMMARY_COLUMNS})
+            for (scope, scope_key), changes in sorted(deltas.items()) if any(changes.values())]
+    add_to_rows(connection, summary_table, ('scope', 'scope_key'), rows, replace_columns=('updated_at',))
+
+def record_quantity_changes(connection, changes):
+    """
+    Apply quantity changes made with plain UPDATEs (see stock_ledger.py).
+    `changes` are (values after the change, quantity change) pairs, the
+    values holding TRACKED_FIELDS.
+    """
+    deltas = defaultdict(lambda: defaultdict(float))
+    for after, change in changes:
+        before = dict(after, quantity=(after['quantity'] or 0) - change)
+        _add_contribution(deltas, before, -1)
+        _add_contribution(deltas, after, 1)
+    apply_deltas(connection, deltas)
+
+@event.listens_for(Session, 'after_flush')
+def _update_inventory_summary(session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+def _expected_rows(session):
+    """Summary rows computed from scratch with two GROUP BY scans"""
+    status = stock_status_case()
+    aggregates = [
+        func.count(Product.id),
+        func.coalesce(func.sum(Product.quantity), 0),
+        func.coalesce(func.sum(Product.quantity * Product.cost), 0),
+        func.sum(case((status == 'in_stock', 1), else_=0)),
+        func.sum(case((status == 'low_stock', 1), else_=0)),
+        func.sum(case((status == 'out_of_stock', 1), else_=0)),
+    ]
+    expected = {}
+    for category, *row in session.query(Product.category, *aggregates).group_by(Product.category):
+        key = (SCOPE_CATEGORY, category or '')
+        expected[key] = _merge(expected.get(key), dict(zip(SUMMARY_COLUMNS, row)))
+    for supplier_id, *row in session.query(Product.supplier_id, *aggregates).group_by(Product.supplier_id):
+        key = (SCOPE_SUPPLIER, str(supplier_id) if supplier_id else '')
+        expected[key] = _merge(expected.get(key), dict(zip(SUMMARY_COLUMNS, row)))
+    return expected
+
+def _merge(existing, row):
+    # NULL and '' categories share one bucket
+    if not existing:
+        return row
+    return {col: existing[col] + row[col] for col in SUMMARY_COLUMNS}
+
+def rebuild_summary(session):
+    """Recompute the whole table from products. Caller commits."""
+    now = datetime.now()
+    session.execute(delete(summary_table))
+    rows = [dict(scope=scope, scope_key=key, updated_at=now, **values)
+            for (scope, key), values in _expected_rows(session).items()]
+    if rows:
+        session.execute(insert(summary_table), rows)
+    return len(rows)
+
+def find_drift(session, tolerance=1e-6):
+    """List (scope, key, column, stored, expected) for every value that disagrees with a full scan"""
+    stored = {
+        (row.scope, row.scope_key): {col: getattr(row, col) for col in SUMMARY_COLUMNS}
+        for row in session.execute(summary_table.select().where(summary_table.c.scope != SCOPE_TOTAL))
+    }
+    expected = _expected_rows(session)
+    zero = {col: 0 for col in SUMMARY_COLUMNS}
+    drift = []
+    for key in sorted(set(stored) | set(expected)):
+        have = stored.get(key, zero)
+        want = expected.get(key, zero)
+        for col in SUMMARY_COLUMNS:
+            if abs((have[col] or 0) - (want[col] or 0)) > tolerance * max(1.0, abs(want[col] or 0)):
+                drift.append((key[0], key[1], col, have[col], want[col]))
+    return drift
+
+def get_inventory_summary(session):
+    """
+    Dashboard view of the summary: totals, per-category and per-supplier
+    stock value and stock-status counts.
+    """
+    rows = session.execute(summary_table.select()).all()
+    supplier_ids = [int(row.scope_key) for row in rows if row.scope == SCOPE_SUPPLIER and row.scope_key]
+    supplier_names = dict(session.query(Supplier.id, Supplier.name).filter(Supplier.id.in_(supplier_ids))) if supplier_ids else {}
+    totals = {col: 0 for col in SUMMARY_COLUMNS}
+    by_category = {}
+    by_supplier = {}
+    for row in rows:
+        values = {col: getattr(row, col) for col in SUMMARY_COLUMNS}
+        if row.scope == SCOPE_CATEGORY:
+            # Every product is in exactly one category row
+            totals = {col: totals[col] + (values[col] or 0) for col in SUMMARY_COLUMNS}
+            if values['product_count']:
+                by_category[row.scope_key or 'Unknown'] = values
+        elif row.scope == SCOPE_SUPPLIER and values['product_count']:
+            name = supplier_names.get(int(row.scope_key)) if row.scope_key else None
+            key = str(name) if name is not None else 'Unknown'
+            by_supplier[key] = _merge(by_supplier.get(key), values)
+    return {'totals': totals, 'by_category': by_category, 'by_supplier': by_supplier}
+
+if __name__ == '__main__':
+    from db_init import get_session
+
+    parser = argparse.ArgumentParser(description='Check or rebuild the inventory_summary table')
+    parser.add_argument('--reconcile', action='store_true', help='compare the table with a full scan of products')
+    parser.add_argument('--fix', action='store_true', help='rebuild the table if drift is found')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the table unconditionally')
+    args = parser.parse_args()
+
+    session = get_session()
+    if args.rebuild:
+        count = rebuild_summary(session)
+        session.commit()
+        print(f"✓ Rebuilt inventory_summary ({count} rows)")
+    else:
+        drift = find_drift(session)
+        if not drift:
+            print("✓ inventory_summary matches products")
+        else:
+            print(f"✗ {len(drift)} drifted values:")
+            for scope, key, col, have, want in drift:
+                print(f"   {scope}:{key or '-'} {col}: stored={have} expected={want}")
+            if args.fix:
+                count = rebuild_summary(session)
+                session.commit()
+                print(f"✓ Rebuilt inventory_summary ({count} rows)")
+            else:
+                session.close()
+                sys.exit(1)
+    session.close()
@@ -0,0 +1,255 @@
+"""
+Invoice PDFs: rendered in a process pool, cached on disk.
+
+Rendering a ReportLab invoice takes tens of milliseconds of CPU and used to
+run in the request thread, with a fresh InvoicePDFGenerator (and all its
+styles) per download. Here PDFs are rendered by a small process pool whose
+workers each keep one generator, and written to INVOICE_PDF_DIR under a
+SHA-256 of everything that goes into the document. The invoice number
+carries the date, so a cached PDF is reused for the rest of the day. A
+download whose inputs hash to a cached file is served from disk without
+computing shipping or taxes. The digest is the ETag, and send_file(...,
+conditional=True) answers If-None-Match and Range requests.
+
+A request's PDFs are deleted when a commit changes the request or its items
+(fulfillment updates touch the request's updated_at). Changes made outside
+the ORM only show up through the content hash, and each new render removes
+the older PDFs of the same request and supplier.
+
+    pdf, digest = invoice_pdfs.get_or_render(request_id, supplier_id, key_inputs, build_args)
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models import SupplierRequest, SupplierRequestItem
+from cached_snapshot import stale_on_commit
+
+INVOICE_PDF_DIR = os.getenv('INVOICE_PDF_DIR', os.path.join(tempfile.gettempdir(), 'invoice_pdfs'))
+INVOICE_PDF_WORKERS = int(os.getenv('INVOICE_PDF_WORKERS', '2'))  # 0 renders in the request thread
+INVOICE_PDF_TIMEOUT = float(os.getenv('INVOICE_PDF_TIMEOUT', '60'))
+RENDER_VERSION = 2  # bump when pdf_generator's layout or the GST rates change, so cached PDFs are not reused
+
+class CachedPDFGone(Exception):
+    """A cached PDF was deleted between the lookup and the read"""
+
+# One generator per process (each pool worker, or the API process when INVOICE_PDF_WORKERS=0)
+_generator = None
+
+def render_invoice_pdf(request_data, supplier_data, fulfillment_data, invoice_number, shipping_info):
+    """PDF bytes; runs in a pool worker"""
+    global _generator
+    if _generator is None:
+        from pdf_generator import InvoicePDFGenerator
+        _generator = InvoicePDFGenerator()
+    return _generator.create_invoice_pdf(request_data, supplier_data, fulfillment_data,
+                                         invoice_number, shipping_info).getvalue()
+
+def input_digest(key_inputs):
+    """SHA-256 over the JSON of everything the PDF depends on"""
+    payload = json.dumps([RENDER_VERSION, key_inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class InvoicePDFService:
+    def __init__(self, directory=INVOICE_PDF_DIR, workers=INVOICE_PDF_WORKERS, timeout=INVOICE_PDF_TIMEOUT):
+        self.directory = directory
+        self.workers = workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._rendering = {}  # digest -> Future, so concurrent misses render once
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded server can deadlock the child on a held lock
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def path_for(self, request_id, supplier_id, digest):
+        return os.path.join(self.directory, f'{request_id}-{supplier_id}-{digest}.pdf')
+
+    def _files_of(self, request_id, supplier_id=None):
+        prefix = f'{request_id}-' if supplier_id is None else f'{request_id}-{supplier_id}-'
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names
+                if name.startswith(prefix) and re.fullmatch(r'\d+-\d+-[0-9a-f]{64}\.pdf', name)]
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, request_id):
+        """Delete every cached PDF of a supplier request"""
+        self._remove(self._files_of(request_id))
+
+    def _drop_pool(self, pool):
+        logging.exception("Invoice PDF pool broken, rendering in process")
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+
+    def _submit(self, args):
+        """Future of the PDF bytes for create_invoice_pdf args"""
+        if self.workers > 0:
+            pool = self._get_pool()
+            try:
+                return pool, pool.submit(render_invoice_pdf, *args)
+            except BrokenProcessPool:
+                self._drop_pool(pool)
+        future = Future()
+        try:
+            future.set_result(render_invoice_pdf(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return None, future
+
+    def _collect(self, pool, future, args):
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # A worker died (killed, out of memory); start a new pool next time and render this one here
+            self._drop_pool(pool)
+            return render_invoice_pdf(*args)
+
+    def _store(self, request_id, supplier_id, digest, pdf):
+        """Write a rendered PDF into the cache, replacing older ones of the same request and supplier"""
+        path = self.path_for(request_id, supplier_id, digest)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        stale = [p for p in self._files_of(request_id, supplier_id) if p != path]
+        os.replace(tmp_path, path)
+        self._remove(stale)
+        return path
+
+    def cached(self, request_id, supplier_id, key_inputs):
+        """(path, digest, exists) of the cache entry for key_inputs"""
+        digest = input_digest(key_inputs)
+        path = self.path_for(request_id, supplier_id, digest)
+        return path, digest, os.path.exists(path)
+
+    def get_or_render(self, request_id, supplier_id, key_inputs, build_args):
+        """
+        (PDF bytes, digest) for key_inputs. On a miss build_args() is called
+        for the create_invoice_pdf arguments (request, supplier, fulfillment,
+        invoice_number, shipping_info) and the PDF is rendered. Bytes rather
+        than a path: a commit or a newer render may delete the file before a
+        caller gets to send it.
+        """
+        path, digest, exists = self.cached(request_id, supplier_id, key_inputs)
+        if exists:
+            try:
+                with open(path, 'rb') as f:
+                    return f.read(), digest
+            except FileNotFoundError:
+                pass  # deleted since the check; render it like a miss
+
+        with self._lock:
+            future = self._rendering.get(digest)
+            owner = future is None
+            if owner:
+                future = self._rendering[digest] = Future()
+        if not owner:
+            return future.result(timeout=self.timeout), digest
+
+        try:
+            args = build_args()
+            pdf = self._collect(*self._submit(args), args)
+            self._store(request_id, supplier_id, digest, pdf)
+            future.set_result(pdf)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._rendering.pop(digest, None)
+        return pdf, digest
+
+    def iter_rendered(self, jobs, window=None):
+        """
+        Yield (job, PDF bytes or exception) for jobs (request_id, supplier_id,
+        digest, args), in order. A job whose args is None is read from the
+        cache; if its file is gone by then (a commit changed the request, or a
+        newer render replaced it) the job yields CachedPDFGone rather than a
+        PDF of outdated data. The others are rendered by the pool into the
+        cache, at most `window` at a time, so only a few PDFs are held in
+        memory however many jobs there are.
+        """
+        window = window or max(2, 2 * self.workers)
+        pending = deque()
+
+        def finish(job, submitted):
+            request_id, supplier_id, digest, args = job
+            if submitted is None:
+                try:
+                    with open(self.path_for(request_id, supplier_id, digest), 'rb') as f:
+                        return job, f.read()
+                except OSError as e:
+                    logging.warning(f"Cached invoice PDF for request {request_id}, supplier {supplier_id} is gone: {e}")
+                    return job, CachedPDFGone(str(e))
+            try:
+                pdf = self._collect(*submitted, args)
+                self._store(request_id, supplier_id, digest, pdf)
+                return job, pdf
+            except Exception as e:
+                logging.exception(f"Rendering invoice PDF for request {request_id}, supplier {supplier_id} failed")
+                return job, e
+
+        in_flight = 0
+        try:
+            for job in jobs:
+                submitted = None if job[3] is None else self._submit(job[3])
+                in_flight += submitted is not None
+                pending.append((job, submitted))
+                while pending and (pending[0][1] is None or in_flight >= window):
+                    job, submitted = pending.popleft()
+                    in_flight -= submitted is not None
+                    yield finish(job, submitted)
+            while pending:
+                yield finish(*pending.popleft())
+        finally:
+            # The client went away: don't keep rendering for it
+            for _, submitted in pending:
+                if submitted is not None:
+                    submitted[1].cancel()
+
+# Global instance
+invoice_pdfs = InvoicePDFService()
+
+def _changed_requests(session):
+    request_ids = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, SupplierRequestItem):
+            request_ids.add(obj.request_id)
+        elif isinstance(obj, SupplierRequest) and obj not in session.new:
+            request_ids.add(obj.id)
+    request_ids.discard(None)
+    return request_ids
+
+stale_on_commit('invoice_pdfs_stale', _changed_requests, invoice_pdfs.invalidate)
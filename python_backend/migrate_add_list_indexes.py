@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the indexes used by keyset pagination and list filters
+(transactions, orders, audit logs, supplier requests by date; products by category).
+Run this script to update your existing database schema.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from db_init import get_engine
+
+INDEXES = [
+    ('transactions', 'ix_transactions_date_id', 'date, id'),
+    ('orders', 'ix_orders_order_date_id', 'order_date, id'),
+    ('audit_logs', 'ix_audit_logs_timestamp_id', 'timestamp, id'),
+    ('supplier_requests', 'ix_supplier_requests_created_at_id', 'created_at, id'),
+    ('products', 'ix_products_category', 'category'),
+]
+
+def migrate_list_indexes():
+    """Create the pagination indexes that do not exist yet"""
+    engine = get_engine()
+
+    with engine.connect() as conn:
+        for table, index_name, columns in INDEXES:
+            existing = conn.execute(text("""
+                SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_NAME = :index_name
+            """), {'table': table, 'index_name': index_name}).scalar()
+            if existing:
+                print(f"✓ {index_name} already exists")
+                continue
+            conn.execute(text(f"CREATE INDEX {index_name} ON {table} ({columns})"))
+            print(f"✓ Created {index_name} on {table}({columns})")
+        conn.commit()
+        print("✓ Migration completed successfully")
+
+if __name__ == "__main__":
+    migrate_list_indexes()
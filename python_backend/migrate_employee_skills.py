@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the employee_skills index table and fill it from
+Employee.skills. Afterwards the API keeps it in sync on every employee write.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import get_engine, get_session
+from models import EmployeeSkill
+from skill_index import rebuild_employee_skills
+
+def migrate_employee_skills():
+    """Create employee_skills if missing and rebuild its contents"""
+    EmployeeSkill.__table__.create(get_engine(), checkfirst=True)
+    print("✓ employee_skills table present")
+    session = get_session()
+    try:
+        count = rebuild_employee_skills(session)
+        session.commit()
+        print(f"✓ Indexed {count} employee skills")
+    except Exception as e:
+        session.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    migrate_employee_skills()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the materials_cost, materials_count and skills_count
+rollup columns to finished_products and fill them, and to create the
+finished_product_materials indexes (including the material_id reverse BOM
+index used to reprice models). Afterwards the API keeps them current whenever
+materials, skills or material costs change.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from db_init import get_engine
+from models import FinishedProductMaterial
+from finished_product_rollups import refresh_rollups
+
+NEW_COLUMNS = {
+    'materials_cost': 'FLOAT DEFAULT 0',
+    'materials_count': 'INTEGER DEFAULT 0',
+    'skills_count': 'INTEGER DEFAULT 0',
+}
+
+def migrate_finished_product_rollups():
+    """Add the rollup columns if missing and recompute them for every finished product"""
+    engine = get_engine()
+    try:
+        existing_columns = {col['name'] for col in inspect(engine).get_columns('finished_products')}
+        with engine.begin() as conn:
+            for name, ddl in NEW_COLUMNS.items():
+                if name not in existing_columns:
+                    conn.execute(text(f"ALTER TABLE finished_products ADD COLUMN {name} {ddl}"))
+                    print(f"✓ Added {name} column")
+                else:
+                    print(f"✓ {name} column already exists")
+        for index in FinishedProductMaterial.__table__.indexes:
+            index.create(engine, checkfirst=True)
+            print(f"✓ {index.name} present")
+        with engine.begin() as conn:
+            count = refresh_rollups(conn)
+        print(f"✓ Computed rollups for {count} finished products")
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_finished_product_rollups()
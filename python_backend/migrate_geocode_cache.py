@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the geocode_cache table used by geocoding.py.
+Pass --purge to delete expired entries instead.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import get_engine
+from models import GeocodeCache
+from geocoding import purge_expired
+
+def migrate_geocode_cache():
+    """Create geocode_cache if missing"""
+    GeocodeCache.__table__.create(get_engine(), checkfirst=True)
+    print("✓ geocode_cache table present")
+
+if __name__ == "__main__":
+    if '--purge' in sys.argv:
+        print(f"✓ Purged {purge_expired()} expired geocode_cache rows")
+    else:
+        migrate_geocode_cache()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the inventory_summary table and fill it from the
+current products. Run this once before starting the API on an existing
+database; afterwards the API keeps the table up to date on every write.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import get_engine, get_session
+from models import InventorySummary
+from inventory_summary import rebuild_summary
+
+def migrate_inventory_summary():
+    """Create inventory_summary if missing and rebuild its contents"""
+    InventorySummary.__table__.create(get_engine(), checkfirst=True)
+    print("✓ inventory_summary table present")
+    session = get_session()
+    try:
+        count = rebuild_summary(session)
+        session.commit()
+        print(f"✓ Filled inventory_summary with {count} rows")
+    except Exception as e:
+        session.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    migrate_inventory_summary()
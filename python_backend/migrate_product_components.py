@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the product_components table (multi-level BOM
+lines between products) with its parent and where-used indexes.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import get_engine
+from models import ProductComponent
+
+def migrate_product_components():
+    """Create product_components if missing"""
+    try:
+        ProductComponent.__table__.create(get_engine(), checkfirst=True)
+        print("✓ product_components table present")
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_product_components()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Migration script to add transactions.unit_price, create the
+product_daily_stats table and fill both from the existing transactions. Run
+this once before starting the API on an existing database; afterwards the
+API keeps them up to date on every transaction write.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from db_init import get_engine, get_session
+from models import ProductDailyStats
+from product_daily_stats import rebuild_daily_stats
+
+def migrate_product_daily_stats():
+    """Add transactions.unit_price and create product_daily_stats if missing, then rebuild its contents"""
+    engine = get_engine()
+    if 'unit_price' not in {column['name'] for column in inspect(engine).get_columns('transactions')}:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE transactions ADD COLUMN unit_price FLOAT NULL"))
+        print("✓ Added transactions.unit_price")
+    ProductDailyStats.__table__.create(engine, checkfirst=True)
+    print("✓ product_daily_stats table present")
+    session = get_session()
+    try:
+        # Also stores the unit price of deliveries recorded without one
+        count = rebuild_daily_stats(session)
+        session.commit()
+        print(f"✓ Filled product_daily_stats with {count} rows")
+    except Exception as e:
+        session.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    migrate_product_daily_stats()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the supplier_delivery_metrics table and backfill it
+from existing stock_in transactions. New deliveries are recorded by the API as
+they are written.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import get_engine, get_session
+from models import SupplierDeliveryMetric
+from supplier_metrics import backfill_metrics
+
+def migrate_supplier_delivery_metrics():
+    """Create supplier_delivery_metrics if missing and backfill it"""
+    SupplierDeliveryMetric.__table__.create(get_engine(), checkfirst=True)
+    print("✓ supplier_delivery_metrics table present")
+    session = get_session()
+    try:
+        count = backfill_metrics(session)
+        session.commit()
+        print(f"✓ Backfilled {count} supplier delivery metrics")
+    except Exception as e:
+        session.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    migrate_supplier_delivery_metrics()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the supplier_warehouse_distances table and fill
+it from the geocoded suppliers and warehouses. Run this once before starting
+the API on an existing database; afterwards the API updates a supplier's or
+warehouse's rows whenever its coordinates change.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_init import get_engine, get_session
+from models import SupplierWarehouseDistance
+from supplier_geo import rebuild_distances
+
+def migrate_supplier_distances():
+    """Create supplier_warehouse_distances if missing and rebuild its contents"""
+    SupplierWarehouseDistance.__table__.create(get_engine(), checkfirst=True)
+    print("✓ supplier_warehouse_distances table present")
+    session = get_session()
+    try:
+        count = rebuild_distances(session)
+        session.commit()
+        print(f"✓ Filled supplier_warehouse_distances with {count} rows")
+    except Exception as e:
+        session.rollback()
+        print(f"Error during migration: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    migrate_supplier_distances()
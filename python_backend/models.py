@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Enum, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 import enum
 from datetime import datetime
@@ -123,7 +123,7 @@ class Product(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     sku = Column(String(30), unique=True, nullable=False)
-    category = Column(String(50))
+    category = Column(String(50), index=True)
     quantity = Column(Float)
     unit = Column(String(20))
     cost = Column(Float)  # procurement_cost
@@ -155,9 +155,27 @@ class Product(Base):
     transactions = relationship('Transaction', back_populates='product')
     finished_products = relationship('FinishedProduct', secondary='finished_product_materials', back_populates='materials')
     skills = relationship('Skill', secondary='material_skills', back_populates='materials')
+    sub_components = relationship('ProductComponent', foreign_keys='ProductComponent.parent_id',
+                                  back_populates='parent', order_by='ProductComponent.id')
     # features = relationship('Feature', secondary=product_features, backref='products')
     # compliance_tags = relationship('ComplianceTag', secondary=product_compliance_tags, backref='products')
 
+class ProductComponent(Base):
+    """One BOM line: `quantity` of `child` goes into one unit of `parent` (both products)"""
+    __tablename__ = 'product_components'
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    child_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    quantity = Column(Float, nullable=False, default=1)
+    parent = relationship('Product', foreign_keys=[parent_id], back_populates='sub_components')
+    child = relationship('Product', foreign_keys=[child_id])
+
+    __table_args__ = (
+        Index('ix_product_components_parent', 'parent_id', 'child_id'),
+        # Where-used lookups go child -> parent
+        Index('ix_product_components_child', 'child_id', 'parent_id'),
+    )
+
 class Order(Base):
     __tablename__ = 'orders'
     id = Column(Integer, primary_key=True)
@@ -177,6 +195,9 @@ class Order(Base):
     customer = relationship('Customer', back_populates='orders')
     user = relationship('User', back_populates='orders')
     order_items = relationship('OrderItem', back_populates='order')
+    __table_args__ = (
+        Index('ix_orders_order_date_id', 'order_date', 'id'),
+    )
 
 class OrderItem(Base):
     __tablename__ = 'order_items'
@@ -204,9 +225,44 @@ class Transaction(Base):
     location = Column(String(50))
     customer_id = Column(Integer, ForeignKey('customers.id'))
     supplier_id = Column(Integer, ForeignKey('suppliers.id'))
+    unit_price = Column(Float)  # price paid per unit of a stock_in, fixed when it is written (see product_daily_stats.py)
     product = relationship('Product', back_populates='transactions')
     user = relationship('User', back_populates='transactions')
     supplier = relationship('Supplier', back_populates='transactions')
+    __table_args__ = (
+        Index('ix_transactions_date_id', 'date', 'id'),
+    )
+
+class SupplierDeliveryMetric(Base):
+    """One row per supplier stock_in transaction, parsed once when it is recorded (see supplier_metrics.py)"""
+    __tablename__ = 'supplier_delivery_metrics'
+    id = Column(Integer, primary_key=True)
+    transaction_id = Column(Integer, ForeignKey('transactions.id', ondelete='CASCADE'), unique=True, nullable=False)
+    supplier_id = Column(Integer, ForeignKey('suppliers.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    quantity = Column(Float)
+    unit_price = Column(Float)
+    lead_time_days = Column(Float)  # NULL when the delivery did not record one
+    on_time = Column(Boolean)
+    rejected_quantity = Column(Float, default=0)
+    delivered_at = Column(DateTime)
+    __table_args__ = (
+        Index('ix_supplier_delivery_metrics_product_supplier', 'product_id', 'supplier_id'),
+    )
+
+class ProductDailyStats(Base):
+    """Per product and day transaction totals, maintained by product_daily_stats.py on every flush"""
+    __tablename__ = 'product_daily_stats'
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    day = Column(Date, nullable=False)
+    units_in = Column(Float, nullable=False, default=0)
+    units_out = Column(Float, nullable=False, default=0)
+    value_in = Column(Float, nullable=False, default=0)  # SUM(quantity * unit price paid) over stock_in
+    __table_args__ = (
+        UniqueConstraint('product_id', 'day', name='uq_product_daily_stats_product_day'),
+        Index('ix_product_daily_stats_day', 'day', 'product_id'),
+    )
 
 class Batch(Base):
     __tablename__ = 'batches'
@@ -219,6 +275,38 @@ class Batch(Base):
     product = relationship('Product')
     transactions = relationship('Transaction', back_populates='batch')
 
+class InventorySummary(Base):
+    """Running product totals per scope, maintained by inventory_summary.py on every flush"""
+    __tablename__ = 'inventory_summary'
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(20), nullable=False)  # 'total', 'category', 'supplier'
+    scope_key = Column(String(100), nullable=False, default='')  # category name / supplier id, '' for none
+    product_count = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(Float, nullable=False, default=0)
+    total_value = Column(Float, nullable=False, default=0)
+    in_stock_count = Column(Integer, nullable=False, default=0)
+    low_stock_count = Column(Integer, nullable=False, default=0)
+    out_of_stock_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+    __table_args__ = (
+        UniqueConstraint('scope', 'scope_key', name='uq_inventory_summary_scope'),
+    )
+
+class GeocodeCache(Base):
+    """Geocoding results per provider and normalized address (see geocoding.py)"""
+    __tablename__ = 'geocode_cache'
+    id = Column(Integer, primary_key=True)
+    provider = Column(String(20), nullable=False)
+    address_key = Column(String(40), nullable=False)  # sha1 of the normalized address
+    address = Column(Text)
+    lat = Column(Float)  # NULL lat/lng caches a "not found" answer
+    lng = Column(Float)
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False)
+    __table_args__ = (
+        UniqueConstraint('provider', 'address_key', name='uq_geocode_cache_provider_key'),
+    )
+
 # Add more models as needed for your app's features. 
 class Warehouse(Base):
     __tablename__ = "warehouses"
@@ -228,6 +316,18 @@ class Warehouse(Base):
     lat = Column(Float)
     lng = Column(Float)
 
+class SupplierWarehouseDistance(Base):
+    """Great-circle distance of each geocoded supplier to each geocoded warehouse, kept current by supplier_geo.py"""
+    __tablename__ = "supplier_warehouse_distances"
+    id = Column(Integer, primary_key=True)
+    supplier_id = Column(Integer, ForeignKey("suppliers.id", ondelete="CASCADE"), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id", ondelete="CASCADE"), nullable=False)
+    distance_km = Column(Float, nullable=False)
+    __table_args__ = (
+        UniqueConstraint('supplier_id', 'warehouse_id', name='uq_supplier_warehouse_distances_pair'),
+        Index('ix_supplier_warehouse_distances_warehouse', 'warehouse_id', 'distance_km'),
+    )
+
 
 class Employee(Base):
     __tablename__ = "employees"
@@ -250,6 +350,18 @@ class Employee(Base):
     assignments = relationship('EmployeeAssignment', back_populates='employee')
 
 
+class EmployeeSkill(Base):
+    """Normalized copy of Employee.skills, kept in sync by skill_index.py"""
+    __tablename__ = "employee_skills"
+    id = Column(Integer, primary_key=True)
+    employee_id = Column(Integer, ForeignKey("employees.id", ondelete="CASCADE"), nullable=False)
+    skill = Column(String(100), nullable=False)  # lower-case, trimmed skill name
+    __table_args__ = (
+        UniqueConstraint('employee_id', 'skill', name='uq_employee_skills_employee_skill'),
+        Index('ix_employee_skills_skill', 'skill', 'employee_id'),
+    )
+
+
 class Project(Base):
     __tablename__ = "projects"
     id = Column(Integer, primary_key=True)
@@ -400,6 +512,10 @@ class FinishedProduct(Base):
     min_load_kw = Column(Integer)
     max_load_kw = Column(Integer)
     estimated_hours = Column(Float)
+    # Rollups kept current by finished_product_rollups.py
+    materials_cost = Column(Float, default=0)  # SUM(material quantity * Product.cost)
+    materials_count = Column(Integer, default=0)
+    skills_count = Column(Integer, default=0)
     # Relationships
     skills = relationship('Skill', secondary='finished_product_skills', back_populates='finished_products')
     materials = relationship('Product', secondary='finished_product_materials', back_populates='finished_products')
@@ -420,6 +536,12 @@ class FinishedProductMaterial(Base):
     material_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Float, nullable=False)
 
+    __table_args__ = (
+        Index('ix_finished_product_materials_fp', 'finished_product_id'),
+        # Reverse BOM: which finished products use a material
+        Index('ix_finished_product_materials_material', 'material_id', 'finished_product_id'),
+    )
+
 class MaterialSkill(Base):
     __tablename__ = "material_skills"
     id = Column(Integer, primary_key=True)
@@ -475,6 +597,9 @@ class AuditLog(Base):
     old_value = Column(String(255))
     new_value = Column(String(255))
     timestamp = Column(DateTime)
+    __table_args__ = (
+        Index('ix_audit_logs_timestamp_id', 'timestamp', 'id'),
+    )
 
 
 class CustomerRequestStatus(enum.Enum):
@@ -520,6 +645,9 @@ class SupplierRequest(Base):
     updated_at = Column(DateTime)
     # New: many-to-many relationship
     suppliers = relationship('Supplier', secondary='supplier_request_suppliers', backref='requests')
+    __table_args__ = (
+        Index('ix_supplier_requests_created_at_id', 'created_at', 'id'),
+    )
 
 
 class SupplierRequestItem(Base):
@@ -0,0 +1,192 @@
+"""
+Opt-in keyset pagination and server-side filtering for list endpoints.
+
+A list endpoint keeps returning its full JSON array unless the client sends
+`limit` or `cursor`. Paged responses look like
+{"items": [...], "next_cursor": "...", "limit": 100}; pass next_cursor back
+as `cursor` to get the following page. Paging is keyset based on
+(sort column, id), so every page is one indexed range scan no matter how
+deep into the table the client is.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime, date
+from sqlalchemy import and_, or_, Boolean, DateTime, Date
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+class PaginationError(ValueError):
+    """Bad limit/cursor/sort/filter parameter; api.py turns it into a 400."""
+
+class PageSpec:
+    def __init__(self, paged, limit, sort_key, sort_column, descending, after, explicit_sort=False):
+        self.paged = paged
+        self.limit = limit
+        self.sort_key = sort_key
+        self.sort_column = sort_column
+        self.descending = descending
+        self.after = after  # (sort value, id) of the last row already returned
+        self.explicit_sort = explicit_sort
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'value'):  # enum
+        return value.value
+    return value
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return value
+
+def encode_cursor(sort_key, descending, sort_value, row_id):
+    payload = json.dumps([sort_key, descending, _encode_value(sort_value), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_key, descending, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error):
+        raise PaginationError('Invalid cursor')
+    return sort_key, bool(descending), sort_value, row_id
+
+def parse_page_args(args, sort_columns, default_sort='id'):
+    """
+    Read limit/cursor/sort from request args. `sort_columns` maps the names a
+    client may pass in `sort` (prefix with '-' for descending) to columns.
+    """
+    paged = 'limit' in args or 'cursor' in args
+    sort_arg = args.get('sort')
+    if sort_arg:
+        descending = sort_arg.startswith('-')
+        sort_key = sort_arg.lstrip('-')
+        if sort_key not in sort_columns:
+            raise PaginationError(f"Cannot sort by '{sort_key}'. Allowed: {', '.join(sorted(sort_columns))}")
+    else:
+        sort_key, descending = default_sort.lstrip('-'), default_sort.startswith('-')
+    sort_column = sort_columns[sort_key]
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be at least 1')
+    limit = min(limit, MAX_LIMIT)
+
+    after = None
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_key, cursor_desc, sort_value, row_id = decode_cursor(cursor)
+        if sort_arg and (cursor_key, cursor_desc) != (sort_key, descending):
+            raise PaginationError('cursor was issued for a different sort order')
+        if cursor_key not in sort_columns:
+            raise PaginationError('Invalid cursor')
+        sort_key, descending, sort_column = cursor_key, cursor_desc, sort_columns[cursor_key]
+        try:
+            after = (_decode_value(sort_column, sort_value), row_id)
+        except ValueError:
+            raise PaginationError('Invalid cursor')
+    return PageSpec(paged, limit, sort_key, sort_column, descending, after, explicit_sort=bool(sort_arg))
+
+def _keyset_condition(sort_column, id_column, descending, after):
+    value, row_id = after
+    if sort_column is id_column:
+        return id_column < row_id if descending else id_column > row_id
+    # NULLs sort first ascending and last descending (MySQL and SQLite agree)
+    if descending:
+        if value is None:
+            return and_(sort_column.is_(None), id_column < row_id)
+        return or_(sort_column < value,
+                   and_(sort_column == value, id_column < row_id),
+                   sort_column.is_(None))
+    if value is None:
+        return or_(and_(sort_column.is_(None), id_column > row_id), sort_column.isnot(None))
+    return or_(sort_column > value, and_(sort_column == value, id_column > row_id))
+
+def _ordering(spec, id_column):
+    order = [spec.sort_column.desc() if spec.descending else spec.sort_column.asc()]
+    if spec.sort_column is not id_column:
+        order.append(id_column.desc() if spec.descending else id_column.asc())
+    return order
+
+def fetch_page(query, spec, id_column):
+    """
+    Run `query` for one page. Returns (rows, next_cursor). When the client did
+    not ask for paging the whole result is returned, in the query's own order
+    unless `sort` was given, and next_cursor is None.
+    """
+    if not spec.paged:
+        if spec.explicit_sort:
+            query = query.order_by(None).order_by(*_ordering(spec, id_column))
+        return query.all(), None
+    if spec.after is not None:
+        query = query.filter(_keyset_condition(spec.sort_column, id_column, spec.descending, spec.after))
+    rows = query.order_by(None).order_by(*_ordering(spec, id_column)).limit(spec.limit + 1).all()
+    next_cursor = None
+    if len(rows) > spec.limit:
+        rows = rows[:spec.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(spec.sort_key, spec.descending,
+                                    getattr(last, spec.sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+def _coerce(column, raw):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return raw
+    if isinstance(column.type, Boolean):
+        return raw.lower() in ('1', 'true', 'yes')
+    try:
+        if isinstance(column.type, DateTime):
+            return datetime.fromisoformat(raw)
+        return python_type(raw)
+    except (TypeError, ValueError):
+        raise PaginationError(f"Invalid value '{raw}' for {column.key}")
+
+def apply_filters(query, args, filters):
+    """
+    Push equality filters into SQL. `filters` maps a query-string parameter to
+    either a column (comma-separated values become an IN) or a callable that
+    takes the raw value and returns a SQL condition.
+    """
+    for param, target in filters.items():
+        raw = args.get(param)
+        if raw in (None, ''):
+            continue
+        if callable(target) and not hasattr(target, 'type'):
+            query = query.filter(target(raw))
+            continue
+        values = [_coerce(target, v.strip()) for v in raw.split(',') if v.strip()]
+        if len(values) == 1:
+            query = query.filter(target == values[0])
+        elif values:
+            query = query.filter(target.in_(values))
+    return query
+
+def apply_date_range(query, args, column, start_param='start_date', end_param='end_date'):
+    """Filter `column` to [start_date, end_date] given as ISO dates/datetimes."""
+    try:
+        if args.get(start_param):
+            query = query.filter(column >= datetime.fromisoformat(args[start_param]))
+        if args.get(end_param):
+            query = query.filter(column <= datetime.fromisoformat(args[end_param]))
+    except ValueError:
+        raise PaginationError(f'{start_param}/{end_param} must be ISO dates')
+    return query
+
+def page_response(items, spec, next_cursor):
+    """Legacy bare list, or the paged envelope when the client asked for it."""
+    if not spec.paged:
+        return items
+    return {'items': items, 'next_cursor': next_cursor, 'limit': spec.limit}
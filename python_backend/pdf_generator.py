@@ -391,11 +391,14 @@ class InvoicePDFGenerator:
         section_header = Paragraph("🚚 SHIPPING INFORMATION", self.section_header_style)
         elements.append(section_header)
         
-        # Shipping details
+        # Shipping details; cost and distance are None when the supplier could not be located
+        distance_km = shipping_info.get('distance_km', 0)
+        shipping_cost = shipping_info.get('shipping_cost', 0)
         shipping_details = [
             ["📍 Supplier Location:", shipping_info.get('supplier_location', 'Unknown')],
-            ["📏 Distance:", f"{shipping_info.get('distance_km', 0)} km"],
-            ["💰 Shipping Cost:", f"₹{shipping_info.get('shipping_cost', 0):,.2f}"],
+            ["📏 Distance:", f"{distance_km} km" if distance_km is not None else "Unknown"],
+            ["💰 Shipping Cost:", f"₹{shipping_cost:,.2f}" if shipping_cost is not None
+                                  else f"Not available ({shipping_info.get('error', 'supplier not located')})"],
             ["🏢 Warehouse:", "Pune, Maharashtra, India"],
             ["📊 Cost Model:", "AI-Powered Distance-Based Pricing"]
         ]
@@ -481,6 +484,9 @@ class InvoicePDFGenerator:
         if shipping_info and shipping_info.get('shipping_cost'):
             shipping = shipping_info['shipping_cost']
             shipping_details = f"₹{shipping:,.2f} ({shipping_info.get('distance_km', 0)} km)"
+        elif shipping_info and shipping_info.get('error'):
+            shipping = 0
+            shipping_details = "Not available"
         else:
             shipping = 0
             shipping_details = "₹0.00 (Free shipping)"
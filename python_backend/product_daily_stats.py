@@ -0,0 +1,260 @@
+"""
+Daily per-product transaction rollup.
+
+product_daily_stats holds units in, units out and value paid for stock_in
+(quantity * unit price) per product and day. A Session after_flush hook
+applies every inserted, updated or deleted Transaction to its day row in the
+same DB transaction, so demand/price history and the stock forecaster read
+one row per day instead of scanning transactions. Weekly and monthly
+figures are rolled up from the daily rows. Day rows are added to with an
+upsert (db_upsert.py), so the first two movements of a product on a day can
+both create its row.
+
+The unit price of a delivery is the "at price X" in its note, else the
+product's cost when the transaction is written. A before_flush hook stores
+it in Transaction.unit_price, and removing or editing the delivery later
+subtracts that stored price, so cost changes neither rewrite price history
+nor leave a remainder behind. Bulk UPDATE/DELETE statements and raw SQL
+bypass the hooks; run
+    python product_daily_stats.py --rebuild
+to recompute the table from transactions.
+"""
+
+import argparse
+import sys
+import os
+from collections import defaultdict
+from datetime import date
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import bindparam, event, inspect, update, insert, delete, select
+from sqlalchemy.orm import Session
+from models import Product, Transaction, TransactionType, ProductDailyStats
+from supplier_metrics import parse_delivery_note
+from db_upsert import add_to_rows
+
+STAT_COLUMNS = ('units_in', 'units_out', 'value_in')
+PERIODS = ('day', 'week', 'month')
+
+stats_table = ProductDailyStats.__table__
+transactions_table = Transaction.__table__
+
+TRACKED_FIELDS = ('product_id', 'type', 'quantity', 'date', 'note', 'unit_price')
+# Edits that make a stock_in's stored unit price out of date
+PRICE_INPUTS = ('product_id', 'type', 'note')
+
+def _type_name(tx_type):
+    return tx_type.value if isinstance(tx_type, TransactionType) else tx_type
+
+def unit_price_for(note, cost):
+    """Price paid per unit of a delivery: the note's "at price X", else the product cost"""
+    price = parse_delivery_note(note)[2]
+    return price if price is not None else (cost or 0)
+
+def _add_contribution(deltas, values, costs, sign):
+    if not values['product_id'] or values['date'] is None:
+        return
+    quantity = values['quantity'] or 0
+    key = (values['product_id'], values['date'].date())
+    tx_type = _type_name(values['type'])
+    if tx_type == 'stock_in':
+        price = values['unit_price']
+        if price is None:
+            # Written around the ORM without a stored price
+            price = unit_price_for(values['note'], costs.get(values['product_id']))
+        deltas[key]['units_in'] += sign * quantity
+        deltas[key]['value_in'] += sign * quantity * price
+    elif tx_type == 'stock_out':
+        deltas[key]['units_out'] += sign * quantity
+
+# Load the old value when an expired attribute is assigned, so the reversal knows what to subtract
+for _field in TRACKED_FIELDS:
+    event.listen(getattr(Transaction, _field), 'set', lambda target, value, oldvalue, initiator: None,
+                 active_history=True)
+
+def _current_values(tx):
+    return {field: getattr(tx, field) for field in TRACKED_FIELDS}
+
+def _previous_values(tx):
+    state = inspect(tx)
+    values = {}
+    for field in TRACKED_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        elif history.unchanged:
+            values[field] = history.unchanged[0]
+        else:
+            values[field] = None
+    return values
+
+def _collect_deltas(session):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            changes.append((_current_values(obj), 1))
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            changes.append((_previous_values(obj), -1))
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj, include_collections=False):
+            before = _previous_values(obj)
+            after = _current_values(obj)
+            if before != after:
+                changes.append((before, -1))
+                changes.append((after, 1))
+    return _deltas_for(session.connection(), changes) if changes else {}
+
+def _product_costs(connection, product_ids):
+    product_ids = {product_id for product_id in product_ids if product_id}
+    return dict(connection.execute(
+        select(Product.id, Product.cost).where(Product.id.in_(product_ids))).all()) if product_ids else {}
+
+def _deltas_for(connection, changes):
+    costs = _product_costs(connection, (values['product_id'] for values, _ in changes
+                                        if values['unit_price'] is None))
+    deltas = defaultdict(lambda: defaultdict(float))
+    for values, sign in changes:
+        _add_contribution(deltas, values, costs, sign)
+    return deltas
+
+def apply_deltas(connection, deltas):
+    """Add per (product_id, day) deltas to product_daily_stats, creating missing rows"""
+    # Fixed row order, so concurrent writers lock day rows in the same order
+    rows = [dict(product_id=product_id, day=day, **{col: changes[col] for col in STAT_COLUMNS})
+            for (product_id, day), changes in sorted(deltas.items()) if any(changes.values())]
+    add_to_rows(connection, stats_table, ('product_id', 'day'), rows)
+
+def record_transactions(connection, transactions):
+    """Apply transactions inserted around the ORM (bulk INSERTs, see stock_ledger.py), given as column dicts"""
+    changes = [({field: tx.get(field) for field in TRACKED_FIELDS}, 1) for tx in transactions]
+    if changes:
+        apply_deltas(connection, _deltas_for(connection, changes))
+
+def _price_changes(session, tx):
+    """None if tx's stored unit price stands, else the PRICE_INPUTS that changed (empty for a new or unpriced delivery)"""
+    if _type_name(tx.type) != 'stock_in':
+        return None
+    if tx in session.new:
+        return () if tx.unit_price is None else None
+    state = inspect(tx)
+    if state.attrs.unit_price.history.has_changes():
+        return None  # set explicitly
+    changed = tuple(field for field in PRICE_INPUTS if state.attrs[field].history.has_changes())
+    return changed if changed or tx.unit_price is None else None
+
+@event.listens_for(Session, 'before_flush')
+def _store_unit_prices(session, flush_context, instances):
+    pending = []
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Transaction):
+            changed = _price_changes(session, obj)
+            if changed is not None:
+                pending.append((obj, changed))
+    if not pending:
+        return
+    costs = _product_costs(session.connection(), (tx.product_id for tx, _ in pending))
+    for tx, changed in pending:
+        price = parse_delivery_note(tx.note)[2]
+        if price is not None:
+            tx.unit_price = price
+        elif tx.unit_price is None or 'product_id' in changed or 'type' in changed:
+            tx.unit_price = costs.get(tx.product_id) or 0
+        # else a note edit without a price keeps the price recorded
+
+@event.listens_for(Session, 'after_flush')
+def _update_daily_stats(session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+def fill_unit_prices(session, batch_size=5000):
+    """
+    Store a unit price on stock_in transactions that have none (recorded
+    before the column existed, or around the ORM), from the note or the
+    current product cost. Caller commits.
+    """
+    rows = (session.query(Transaction.id, Transaction.note, Product.cost)
+            .outerjoin(Product, Product.id == Transaction.product_id)
+            .filter(Transaction.type == TransactionType.stock_in, Transaction.unit_price.is_(None))
+            .order_by(Transaction.id).all())
+    prices = [{'tx_id': tx_id, 'price': unit_price_for(note, cost)} for tx_id, note, cost in rows]
+    stmt = (update(transactions_table).where(transactions_table.c.id == bindparam('tx_id'))
+            .values(unit_price=bindparam('price')))
+    for start in range(0, len(prices), batch_size):
+        session.execute(stmt, prices[start:start + batch_size])
+    return len(prices)
+
+def rebuild_daily_stats(session, batch_size=5000):
+    """Recompute the whole table from transactions, with the unit prices they were recorded at. Caller commits."""
+    fill_unit_prices(session, batch_size)
+    session.execute(delete(stats_table))
+    costs = {}  # every delivery has a stored unit price now
+    deltas = defaultdict(lambda: defaultdict(float))
+    query = (session.query(*[getattr(Transaction, field) for field in TRACKED_FIELDS])
+             .filter(Transaction.date.isnot(None)).order_by(Transaction.id))
+    for row in query.yield_per(batch_size):
+        _add_contribution(deltas, dict(zip(TRACKED_FIELDS, row)), costs, 1)
+    rows = [dict(product_id=product_id, day=day, **{col: values[col] for col in STAT_COLUMNS})
+            for (product_id, day), values in deltas.items()]
+    for start in range(0, len(rows), batch_size):
+        session.execute(insert(stats_table), rows[start:start + batch_size])
+    return len(rows)
+
+def daily_rows(session, product_id=None, start=None, end=None, columns=STAT_COLUMNS):
+    """(product_id, day, *columns) rows in [start, end], ordered by product and day"""
+    query = select(stats_table.c.product_id, stats_table.c.day, *[stats_table.c[col] for col in columns])
+    if product_id is not None:
+        query = query.where(stats_table.c.product_id == product_id)
+    if start is not None:
+        query = query.where(stats_table.c.day >= start)
+    if end is not None:
+        query = query.where(stats_table.c.day <= end)
+    return session.execute(query.order_by(stats_table.c.product_id, stats_table.c.day)).all()
+
+def period_key(day, period):
+    if period == 'month':
+        return day.strftime('%Y-%m')
+    if period == 'week':
+        year, week, _ = day.isocalendar()
+        return f'{year}-W{week:02d}'
+    return day.isoformat()
+
+def product_history(session, product_id, period='month', start=None, end=None):
+    """
+    Totals per day, ISO week ('2025-W07') or month ('2025-07') for one product,
+    oldest first: [{'period', 'units_in', 'units_out', 'value_in', 'avg_unit_price'}].
+    avg_unit_price is value_in / units_in, None for periods without deliveries.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    totals = {}
+    for _, day, units_in, units_out, value_in in daily_rows(session, product_id, start, end):
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        bucket = totals.setdefault(period_key(day, period), {col: 0.0 for col in STAT_COLUMNS})
+        bucket['units_in'] += units_in
+        bucket['units_out'] += units_out
+        bucket['value_in'] += value_in
+    history = []
+    for key, bucket in totals.items():
+        bucket['period'] = key
+        bucket['avg_unit_price'] = bucket['value_in'] / bucket['units_in'] if bucket['units_in'] else None
+        history.append(bucket)
+    return history
+
+if __name__ == '__main__':
+    from db_init import get_session
+
+    parser = argparse.ArgumentParser(description='Rebuild the product_daily_stats table from transactions')
+    parser.add_argument('--rebuild', action='store_true', help='recompute the table from transactions')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        sys.exit(0)
+
+    session = get_session()
+    count = rebuild_daily_stats(session)
+    session.commit()
+    session.close()
+    print(f"✓ Rebuilt product_daily_stats ({count} rows)")
@@ -0,0 +1,178 @@
+"""
+In-memory index behind /match-products.
+
+Finished products are loaded once into columnar form: application,
+compliance and feature tags become integer ids (one vocabulary per kind)
+stored as CSR arrays, and the supported load range as two float arrays.
+A request is scored for every product with a few NumPy operations, and the
+JSON tags and why_suitable explanations are only built for the top-k.
+
+The index is dropped when a FinishedProduct is inserted, updated or deleted
+in this process, and rebuilt after MATCH_INDEX_TTL seconds to pick up
+changes made by other processes.
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from models import FinishedProduct
+from cached_snapshot import CachedSnapshot, stale_on_commit
+
+MATCH_INDEX_TTL = float(os.getenv('MATCH_INDEX_TTL', '300'))
+DEFAULT_TOP_K = 50
+
+WEIGHTS = {
+    'load': 0.4,
+    'application': 0.2,
+    'compliance': 0.2,
+    'features': 0.2
+}
+
+TAG_KINDS = ('application_tags', 'compliance_tags', 'features')
+
+def _parse_tags(raw):
+    return json.loads(raw) if raw else []
+
+class _TagColumn:
+    """One tag kind for all products: vocabulary ids in CSR layout"""
+
+    def __init__(self, tag_lists):
+        self.vocab = {}
+        rows, ids = [], []
+        sizes = np.zeros(len(tag_lists), dtype=np.int64)
+        for row, tags in enumerate(tag_lists):
+            unique = {self.vocab.setdefault(t.lower(), len(self.vocab)) for t in tags}
+            sizes[row] = len(unique)
+            rows.extend([row] * len(unique))
+            ids.extend(unique)
+        self.sizes = sizes  # distinct lower-cased tags per product
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=np.int64)
+
+    def jaccard(self, query_terms):
+        """Jaccard similarity of every product's tag set with `query_terms` (lower-cased)"""
+        query = set(query_terms)
+        n = len(self.sizes)
+        if not query:
+            return np.zeros(n)
+        wanted = np.zeros(len(self.vocab), dtype=bool)
+        for term in query:
+            tag_id = self.vocab.get(term)
+            if tag_id is not None:
+                wanted[tag_id] = True
+        common = np.bincount(self.rows[wanted[self.ids]], minlength=n) if len(self.ids) else np.zeros(n, dtype=np.int64)
+        union = self.sizes + len(query) - common
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.sizes > 0, common / union, 0.0)
+
+class ProductMatchIndex:
+    def __init__(self, products):
+        n = len(products)
+        self.products = products  # rows with the FinishedProduct columns used in the response
+        self.tags = [{kind: _parse_tags(getattr(p, kind)) for kind in TAG_KINDS} for p in products]
+        self.columns = {kind: _TagColumn([t[kind] for t in self.tags]) for kind in TAG_KINDS}
+        self.min_load = np.full(n, np.nan)
+        self.max_load = np.full(n, np.nan)
+        for i, p in enumerate(products):
+            if p.min_load_kw is not None and p.max_load_kw is not None:
+                self.min_load[i] = p.min_load_kw
+                self.max_load[i] = p.max_load_kw
+
+    @classmethod
+    def load(cls, session):
+        products = (session.query(FinishedProduct.id, FinishedProduct.model_name, FinishedProduct.total_cost,
+                                  FinishedProduct.base_price, FinishedProduct.profit_margin_percent,
+                                  FinishedProduct.photo_url, FinishedProduct.min_load_kw, FinishedProduct.max_load_kw,
+                                  *[getattr(FinishedProduct, kind) for kind in TAG_KINDS])
+                    .order_by(FinishedProduct.id).all())
+        return cls(products)
+
+    def match(self, input_data, top_k=DEFAULT_TOP_K):
+        """Best `top_k` products for the requirements, same scores and explanations as before"""
+        n = len(self.products)
+        if not n:
+            return []
+        # Load compatibility
+        power_load = None
+        if input_data.get('power_load_kw'):
+            # Convert power_load_kw to float to handle both string and numeric inputs
+            try:
+                power_load = float(input_data['power_load_kw'])
+            except (ValueError, TypeError):
+                pass
+        load_score = np.zeros(n)
+        in_range = close = np.zeros(n, dtype=bool)
+        if power_load is not None:
+            in_range = (self.min_load <= power_load) & (power_load <= self.max_load)
+            close = ~in_range & (self.min_load <= power_load + 10) & (power_load + 10 <= self.max_load)
+            load_score[in_range] = 1.0
+            load_score[close] = 0.7
+        # Tag matches
+        input_app = [input_data.get('application', '').lower()]
+        input_comp = _lower_terms(input_data.get('compliance', []))
+        input_features = _lower_terms(input_data.get('preferred_features', []))
+        app_score = self.columns['application_tags'].jaccard(input_app)
+        comp_score = self.columns['compliance_tags'].jaccard(input_comp)
+        feat_score = self.columns['features'].jaccard(input_features)
+        # Weighted score
+        match_score = (
+            WEIGHTS['load'] * load_score +
+            WEIGHTS['application'] * app_score +
+            WEIGHTS['compliance'] * comp_score +
+            WEIGHTS['features'] * feat_score
+        )
+        # Round the few distinct scores with Python's round() so percentages match exactly
+        distinct, inverse = np.unique(match_score, return_inverse=True)
+        percent = np.array([round(s * 100, 1) for s in distinct.tolist()])[inverse]
+        order = np.argsort(-percent, kind='stable')
+        if top_k is not None:
+            order = order[:top_k]
+
+        results = []
+        for i in order.tolist():
+            p = self.products[i]
+            tags = self.tags[i]
+            why = []
+            if in_range[i]:
+                why.append(f"Supports {power_load}kW load")
+            elif close[i]:
+                why.append("Close to required load range")
+            if app_score[i] > 0:
+                why.append(f"Application: {input_data['application']}")
+            if comp_score[i] > 0:
+                why.append(f"Compliant with {', '.join(input_comp)}")
+            if feat_score[i] > 0:
+                why.append(f"Includes features: {', '.join(input_features)}")
+            results.append({
+                'product_id': p.id,
+                'model_name': p.model_name,
+                'total_cost': p.total_cost or 0,  # Keep for internal reference
+                'base_price': p.base_price or p.total_cost or 0,  # Use base_price for customer display
+                'profit_margin_percent': p.profit_margin_percent or 20.0,
+                'match_score': float(percent[i]),  # Convert to percentage
+                'application_tags': tags['application_tags'],
+                'compliance_tags': tags['compliance_tags'],
+                'features': tags['features'],
+                'photo_url': p.photo_url,
+                'why_suitable': why,
+                # Stock/lead time (for finished products, use materials availability or set as 'Available')
+                'stock_status': 'Available',
+                'lead_time_days': 0
+            })
+        return results
+
+def _lower_terms(raw):
+    # Handle both single string and array inputs
+    if isinstance(raw, str):
+        return [raw.lower()]
+    return [term.lower() for term in raw]
+
+def _finished_products_changed(session):
+    return any(isinstance(obj, FinishedProduct) for obj in session.new | session.dirty | session.deleted)
+
+# Global instance
+product_match_index = CachedSnapshot(ProductMatchIndex.load, MATCH_INDEX_TTL)
+stale_on_commit('match_index_stale', _finished_products_changed, product_match_index.invalidate)
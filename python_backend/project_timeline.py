@@ -1,44 +1,180 @@
-from datetime import datetime, timedelta
+"""
+Project schedule and end date prediction.
+
+Tasks form a DAG through their `dependencies`. schedule_project() orders
+them topologically (a cycle is an error) and runs a critical path pass:
+earliest start/finish forward, latest start/finish backward, slack, and the
+critical path of zero-slack tasks. Durations are in working days; materials
+that are not in stock hold back the task they are for (or the whole project
+when they are not tied to a task) by their lead time.
+
+Working days skip weekends and the given holidays via numpy.busday_offset,
+so turning day offsets into dates costs the same however long the project.
+"""
+
+import math
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+WEEKMASK = 'Mon Tue Wed Thu Fri'
+
+class ScheduleError(ValueError):
+    """Task list that cannot be scheduled: unknown dependency or a cycle"""
+
+def _parse_date(value):
+    return datetime.fromisoformat(str(value).split('T')[0])
+
+class BusinessCalendar:
+    def __init__(self, holidays=()):
+        days = sorted({_parse_date(h).date() for h in holidays})
+        self.calendar = np.busdaycalendar(weekmask=WEEKMASK, holidays=np.array(days, dtype='datetime64[D]'))
+
+    def add_working_days(self, start, days):
+        """
+        Date `days` working days after `start` for a scalar or array of day
+        counts; fractions count as a whole day and 0 is `start` itself.
+        """
+        start = np.datetime64(start.date() if isinstance(start, datetime) else start, 'D')
+        whole = np.ceil(np.asarray(days, dtype=float)).astype(np.int64)
+        # Rolling a non-working start back first makes day 1 the first working day after it
+        moved = np.busday_offset(start, whole, roll='backward', busdaycal=self.calendar)
+        return np.where(whole > 0, moved, start)
+
+def _task_key(task, index):
+    return task.get('id', index)
+
+def schedule_tasks(tasks, material_requirements=()):
+    """
+    Critical path schedule in working-day offsets from the project start.
+    Returns (per-task rows in input order, project duration in days).
+    """
+    n = len(tasks)
+    keys = [_task_key(t, i) for i, t in enumerate(tasks)]
+    by_key = {}
+    for i, key in enumerate(keys):
+        by_key.setdefault(str(key), i)
+    for i, t in enumerate(tasks):
+        if t.get('name'):
+            by_key.setdefault(str(t['name']), i)
+
+    durations = [max(0.0, float(t.get('duration_days') or 0)) for t in tasks]
+    ready = [0.0] * n  # earliest start allowed by materials
+    project_ready = 0.0
+    for m in material_requirements:
+        if m.get('in_stock', True):
+            continue
+        lead_time = float(m.get('lead_time') or 0)
+        i = by_key.get(str(m.get('task_id'))) if m.get('task_id') is not None else None
+        if i is None:
+            project_ready = max(project_ready, lead_time)
+        else:
+            ready[i] = max(ready[i], lead_time)
+
+    successors = [[] for _ in range(n)]
+    predecessors = [[] for _ in range(n)]
+    for i, t in enumerate(tasks):
+        for dep in t.get('dependencies') or []:
+            j = by_key.get(str(dep))
+            if j is None:
+                raise ScheduleError(f"Task '{t.get('name', keys[i])}' depends on unknown task '{dep}'")
+            if j not in predecessors[i]:
+                predecessors[i].append(j)
+                successors[j].append(i)
+
+    # Kahn's algorithm; whatever is left over sits on a cycle
+    indegree = [len(p) for p in predecessors]
+    queue = deque(i for i in range(n) if indegree[i] == 0)
+    order = []
+    while queue:
+        i = queue.popleft()
+        order.append(i)
+        for k in successors[i]:
+            indegree[k] -= 1
+            if indegree[k] == 0:
+                queue.append(k)
+    if len(order) < n:
+        stuck = [tasks[i].get('name', keys[i]) for i in range(n) if indegree[i] > 0]
+        raise ScheduleError(f"Task dependencies contain a cycle involving: {', '.join(map(str, stuck))}")
+
+    es = [0.0] * n
+    ef = [0.0] * n
+    for i in order:
+        es[i] = max([project_ready, ready[i]] + [ef[j] for j in predecessors[i]])
+        ef[i] = es[i] + durations[i]
+    duration = max(ef, default=project_ready)
+
+    lf = [duration] * n
+    ls = [0.0] * n
+    for i in reversed(order):
+        if successors[i]:
+            lf[i] = min(ls[k] for k in successors[i])
+        ls[i] = lf[i] - durations[i]
+
+    rows = []
+    for i in range(n):
+        slack = ls[i] - es[i]
+        rows.append({
+            'id': keys[i],
+            'name': tasks[i].get('name'),
+            'duration_days': durations[i],
+            'earliest_start': es[i],
+            'earliest_finish': ef[i],
+            'latest_start': ls[i],
+            'latest_finish': lf[i],
+            'slack_days': slack,
+            'critical': abs(slack) < 1e-9,
+        })
+    return rows, duration
+
+def schedule_project(project_data, calendar=None):
+    """
+    Full prediction for one project payload: end date, duration, the
+    schedule of every task (with calendar dates) and the critical path.
+    """
+    start_date = _parse_date(project_data['start_date'])
+    if calendar is None:
+        calendar = BusinessCalendar(project_data.get('holidays', []))
+    rows, task_duration = schedule_tasks(project_data.get('tasks', []), project_data.get('material_requirements', []))
+    total_duration = task_duration + float(project_data.get('approval_buffer_days', 0) or 0)
+
+    if rows:
+        # Day k is the k-th working day after the start, so work begun at offset es happens on day floor(es) + 1
+        starts = calendar.add_working_days(
+            start_date, [math.floor(r['earliest_start']) + (1 if r['duration_days'] > 0 else 0) for r in rows])
+        finishes = calendar.add_working_days(start_date, [r['earliest_finish'] for r in rows])
+        for row, task_start, task_end in zip(rows, starts.tolist(), finishes.tolist()):
+            row['start_date'] = task_start.isoformat()
+            row['end_date'] = task_end.isoformat()
+    end_date = calendar.add_working_days(start_date, total_duration).item()
+    critical_path = [r['id'] for r in sorted(rows, key=lambda r: r['earliest_start']) if r['critical']]
+    return {
+        'predicted_end_date': datetime.combine(end_date, datetime.min.time()),
+        'duration_days': total_duration,
+        'critical_path': critical_path,
+        'tasks': rows,
+    }
 
 def calculate_project_end_date(project_data):
     """
     Calculates the estimated end date of a project based on its tasks,
-    dependencies, and other factors.
-    """
-    start_date = datetime.fromisoformat(project_data['start_date'].split('T')[0])
-    tasks = project_data.get('tasks', [])
-    working_hours_per_day = project_data.get('working_hours_per_day', 8)
-    holidays_str = project_data.get('holidays', [])
-    holidays = [datetime.fromisoformat(h.split('T')[0]) for h in holidays_str]
-    material_requirements = project_data.get('material_requirements', [])
-    approval_buffer_days = project_data.get('approval_buffer_days', 0)
-    
-    # --- Advanced Calculation Logic ---
-    
-    # 1. Calculate total duration from tasks
-    total_task_duration_days = sum(float(task.get('duration_days', 0)) for task in tasks)
-    
-    # 2. Factor in material lead times
-    max_lead_time = 0
-    for material in material_requirements:
-        if not material.get('in_stock', True):
-            max_lead_time = max(max_lead_time, int(material.get('lead_time', 0)))
-            
-    # 3. Combine durations
-    total_duration = total_task_duration_days + max_lead_time + approval_buffer_days
-    
-    # 4. Calculate end date considering work days, weekends, and holidays
-    current_date = start_date
-    days_to_add = total_duration
-    
-    while days_to_add > 0:
-        current_date += timedelta(days=1)
-        # Weekends (Saturday=5, Sunday=6)
-        if current_date.weekday() >= 5:
-            continue
-        # Holidays
-        if current_date in holidays:
-            continue
-        days_to_add -= 1
-        
-    return current_date 
\ No newline at end of file
+    dependencies, material lead times, approval buffer and holidays.
+    """
+    return schedule_project(project_data)['predicted_end_date']
+
+def predict_scenarios(project_data, scenarios):
+    """
+    What-if batch: each scenario is a dict of fields that replace the base
+    project's (tasks, start_date, holidays, approval_buffer_days, ...).
+    Scenarios sharing a holiday list share one business-day calendar.
+    """
+    calendars = {}
+    results = []
+    for overrides in scenarios:
+        data = dict(project_data, **overrides)
+        holidays = tuple(sorted(str(h) for h in data.get('holidays', [])))
+        if holidays not in calendars:
+            calendars[holidays] = BusinessCalendar(holidays)
+        results.append(schedule_project(data, calendars[holidays]))
+    return results
@@ -0,0 +1,134 @@
+"""
+Employee skill index and skill rate table.
+
+Employee.skills is a JSON text column, so "who has skill X" used to be a
+LIKE '%X%' scan per skill (which also matched "rewiring" for "wiring"). The
+employee_skills table holds one normalized (employee, skill) row per skill
+and is kept in sync by a Session after_flush hook. SkillRateTable keeps
+skill -> (average hourly rate, headcount) of available employees in memory;
+it is rebuilt with one GROUP BY after employees change in this process, or
+after RATE_TABLE_TTL seconds for changes made elsewhere.
+
+Rebuild the index from Employee.skills with
+    python skill_index.py --rebuild
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func, inspect, select, insert, delete
+from sqlalchemy.orm import Session
+from models import Employee, EmployeeSkill
+from cached_snapshot import CachedSnapshot, mark_stale, stale_on_commit
+
+DEFAULT_HOURLY_RATE = 20.0  # used for skills no available employee has
+RATE_TABLE_TTL = float(os.getenv('SKILL_RATE_TTL', '300'))
+
+skills_table = EmployeeSkill.__table__
+
+def normalize_skill(name):
+    return ' '.join(str(name).split()).lower() if name is not None else ''
+
+def parse_employee_skills(raw):
+    """Normalized skill names from an Employee.skills value (JSON list, list or comma-separated text)"""
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        try:
+            parsed = json.loads(raw)
+        except ValueError:
+            parsed = raw.split(',')
+        raw = parsed if isinstance(parsed, list) else [parsed]
+    names = (normalize_skill(name) for name in raw)
+    return list(dict.fromkeys(name for name in names if name))
+
+RATE_FIELDS = ('hourly_rate', 'is_available')
+
+def _index_rows(employee_id, raw_skills):
+    return [{'employee_id': employee_id, 'skill': skill} for skill in parse_employee_skills(raw_skills)]
+
+@event.listens_for(Session, 'after_flush')
+def _sync_employee_skills(session, flush_context):
+    reindex = {}
+    removed = []
+    rates_changed = False
+    for obj in session.new:
+        if isinstance(obj, Employee):
+            reindex[obj.id] = obj.skills
+            rates_changed = True
+    for obj in session.dirty:
+        if isinstance(obj, Employee):
+            state = inspect(obj)
+            if state.attrs.skills.history.has_changes():
+                reindex[obj.id] = obj.skills
+            if any(state.attrs[field].history.has_changes() for field in RATE_FIELDS + ('skills',)):
+                rates_changed = True
+    for obj in session.deleted:
+        if isinstance(obj, Employee):
+            removed.append(obj.id)
+            rates_changed = True
+    if not (reindex or removed or rates_changed):
+        return
+    connection = session.connection()
+    stale = list(reindex) + removed
+    if stale:
+        connection.execute(delete(skills_table).where(skills_table.c.employee_id.in_(stale)))
+    rows = [row for employee_id, raw in reindex.items() for row in _index_rows(employee_id, raw)]
+    if rows:
+        connection.execute(insert(skills_table), rows)
+    if rates_changed:
+        mark_stale(session, 'skill_rates_changed')
+
+def rebuild_employee_skills(session):
+    """Recreate employee_skills from Employee.skills. Caller commits."""
+    session.execute(delete(skills_table))
+    rows = [row for employee_id, raw in session.query(Employee.id, Employee.skills) for row in _index_rows(employee_id, raw)]
+    if rows:
+        session.execute(insert(skills_table), rows)
+    skill_rate_table.invalidate()
+    return len(rows)
+
+class SkillRateTable:
+    """In-process skill -> (avg hourly rate, headcount) for available employees"""
+
+    def __init__(self, ttl=RATE_TABLE_TTL):
+        self._snapshot = CachedSnapshot(self._load, ttl)
+
+    def invalidate(self):
+        self._snapshot.invalidate()
+
+    @staticmethod
+    def _load(session):
+        query = (
+            select(skills_table.c.skill, func.avg(func.coalesce(Employee.hourly_rate, 0)), func.count())
+            .select_from(skills_table.join(Employee.__table__, Employee.id == skills_table.c.employee_id))
+            .where(Employee.is_available == True)
+            .group_by(skills_table.c.skill)
+        )
+        return {skill: (float(avg_rate), count) for skill, avg_rate, count in session.execute(query)}
+
+    def rates(self):
+        return self._snapshot.get()
+
+    def rates_for(self, skill_names):
+        """{skill name as given: (avg hourly rate, employee count)}; unknown skills get the default rate"""
+        rates = self.rates()
+        return {name: rates.get(normalize_skill(name), (DEFAULT_HOURLY_RATE, 0)) for name in skill_names}
+
+# Global instance
+skill_rate_table = SkillRateTable()
+stale_on_commit('skill_rates_changed', target=skill_rate_table.invalidate)
+
+if __name__ == '__main__':
+    from db_init import get_session
+
+    if '--rebuild' not in sys.argv:
+        print("Usage: python skill_index.py --rebuild")
+        sys.exit(1)
+    session = get_session()
+    count = rebuild_employee_skills(session)
+    session.commit()
+    session.close()
+    print(f"✓ Rebuilt employee_skills ({count} rows)")
@@ -0,0 +1,101 @@
+"""
+Stock forecasts for every product at once.
+
+Daily stock_out totals for the last `days` full days are read from the
+product_daily_stats rollup into a products x days matrix, and
+forecasting.bulk_stock_forecast_analysis() runs EWMA, depletion days and the
+spike detection over the whole matrix. The result is cached per window
+until the next stock movement (a Transaction or Product change committed in
+this process) or FORECAST_CACHE_TTL seconds, so the reorder dashboard and
+/products/<id>/forecast read from memory.
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from models import Product, ProductDailyStats, Transaction
+from forecasting import bulk_stock_forecast_analysis
+from cached_snapshot import CachedSnapshot, mark_stale, stale_on_commit
+
+FORECAST_CACHE_TTL = float(os.getenv('FORECAST_CACHE_TTL', '300'))
+DEFAULT_FORECAST_DAYS = 14
+
+class StockForecastTable:
+    """Forecasts for all products over one window, indexed by product id"""
+
+    def __init__(self, days, window_start, products, outflow):
+        self.days = days
+        self.dates = [str(window_start + timedelta(days=i)) for i in range(days)]
+        self.products = products  # (id, sku, name, category, quantity) rows, ordered by id
+        stock = np.array([p.quantity or 0 for p in products], dtype=float)
+        self.results = bulk_stock_forecast_analysis(stock, outflow)
+        self.row_of = {p.id: row for row, p in enumerate(products)}
+
+    @classmethod
+    def load(cls, session, days, today=None):
+        """Two queries: the products, and their daily outflow rows from product_daily_stats"""
+        today = today or date.today()
+        window_start = today - timedelta(days=days)
+        products = (session.query(Product.id, Product.sku, Product.name, Product.category, Product.quantity)
+                    .order_by(Product.id).all())
+        row_of = {p.id: row for row, p in enumerate(products)}
+        outflow = np.zeros((len(products), days))
+        daily = (session.query(ProductDailyStats.product_id, ProductDailyStats.day, ProductDailyStats.units_out)
+                 .filter(ProductDailyStats.day >= window_start, ProductDailyStats.day < today,
+                         ProductDailyStats.units_out != 0))
+        for product_id, day, units_out in daily:
+            row = row_of.get(product_id)
+            if row is not None:
+                outflow[row, (day - window_start).days] = units_out
+        return cls(days, window_start, products, outflow)
+
+    def forecast(self, product_id):
+        """The /products/<id>/forecast payload for one product, or None if unknown"""
+        row = self.row_of.get(product_id)
+        if row is None:
+            return None
+        result = dict(self.results[row])
+        result['anomaly_dates'] = [self.dates[i] for i in result['anomaly_indexes']]
+        return result
+
+    def rows(self, product_ids=None, categories=None):
+        """Forecast entries for all products, or those with the given ids/categories"""
+        selected = []
+        for product in self.products:
+            if product_ids is not None and product.id not in product_ids:
+                continue
+            if categories is not None and product.category not in categories:
+                continue
+            entry = {
+                'product_id': product.id,
+                'sku': product.sku,
+                'name': product.name,
+                'current_stock': product.quantity or 0,
+            }
+            entry.update(self.forecast(product.id))
+            selected.append(entry)
+        return selected
+
+class _ForecastCache(CachedSnapshot):
+    """One StockForecastTable per (days, today); tables of previous days expire with the TTL"""
+
+    def __init__(self, ttl=FORECAST_CACHE_TTL):
+        super().__init__(lambda session, days, today: StockForecastTable.load(session, days, today=today), ttl)
+
+    def get(self, days=DEFAULT_FORECAST_DAYS):
+        return super().get(days, date.today())
+
+def _stock_moved(session):
+    # Transactions move stock; product edits change quantities or the listed names
+    return any(isinstance(obj, (Transaction, Product)) for obj in session.new | session.dirty | session.deleted)
+
+# Global instance
+stock_forecasts = _ForecastCache()
+stale_on_commit('stock_forecasts_stale', _stock_moved, stock_forecasts.invalidate)
+
+def note_stock_movement(session):
+    """Drop the cached forecasts when `session` commits; for moves made with plain UPDATE/INSERT statements"""
+    mark_stale(session, 'stock_forecasts_stale')
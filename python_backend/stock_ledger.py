@@ -0,0 +1,144 @@
+"""
+Stock movements that cannot oversell under concurrency.
+
+move_stock() applies a single stock_in/stock_out as one UPDATE; a stock_out
+carries `quantity >= :q` in its WHERE clause, so two requests racing for the
+last units cannot both succeed. withdraw_lines() takes stock for a whole
+order: it locks every product of the order in one SELECT ... FOR UPDATE in
+id order (so two orders sharing products always lock them in the same order
+and cannot deadlock each other), checks all lines, decrements with one
+executemany UPDATE and bulk-inserts the stock_out transactions.
+
+These statements go around the ORM, so the derived tables the flush hooks
+keep (inventory_summary, product_daily_stats) and the forecast cache are
+updated here explicitly, in the same DB transaction. The caller commits.
+"""
+
+import sys
+import os
+from collections import defaultdict
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import bindparam, case, func, insert, select, update
+from models import Product, Transaction, TransactionType
+import inventory_summary
+import product_daily_stats
+import stock_forecasts
+
+DEFAULT_LOCATION = 'Main Warehouse'
+
+products = Product.__table__
+
+# Everything inventory_summary needs to move a product between its buckets
+PRODUCT_COLUMNS = ('id', 'name', 'cost') + inventory_summary.TRACKED_FIELDS
+
+class StockError(ValueError):
+    """Stock move that cannot be applied"""
+
+class ProductNotFound(StockError):
+    def __init__(self, product_id):
+        super().__init__(f"Product with ID {product_id} not found")
+        self.product_id = product_id
+
+class InsufficientStock(StockError):
+    def __init__(self, product_id, name, available, requested):
+        super().__init__(f"Insufficient stock for {name}. Available: {available}, Requested: {requested}")
+        self.product_id = product_id
+        self.available = available
+        self.requested = requested
+
+def _product_select(product_ids):
+    return (select(*[products.c[col] for col in PRODUCT_COLUMNS])
+            .where(products.c.id.in_(product_ids)).order_by(products.c.id))
+
+def _check_quantity(quantity):
+    if not isinstance(quantity, (int, float)) or isinstance(quantity, bool) or quantity <= 0:
+        raise StockError('quantity must be a positive number')
+
+def _record_changes(session, changes):
+    """Bring inventory_summary and loaded Product objects up to date with (row after, quantity change) pairs"""
+    inventory_summary.record_quantity_changes(session.connection(), [
+        ({field: after[field] for field in inventory_summary.TRACKED_FIELDS}, change) for after, change in changes])
+    changed_ids = {after['id'] for after, _ in changes}
+    for obj in session.identity_map.values():
+        if isinstance(obj, Product) and obj.id in changed_ids:
+            session.expire(obj, ['quantity', 'email_sent_count'])
+
+def move_stock(session, product_id, tx_type, quantity, **transaction_fields):
+    """
+    Apply one stock_in or stock_out and add its Transaction (extra keyword
+    arguments are Transaction columns). Raises ProductNotFound or, for a
+    stock_out of more than is on hand, InsufficientStock.
+    """
+    tx_type = TransactionType(tx_type)
+    _check_quantity(quantity)
+    c = products.c
+    if tx_type == TransactionType.stock_out:
+        stmt = (update(products).where(c.id == product_id, c.quantity >= quantity)
+                .values(quantity=c.quantity - quantity))
+    else:
+        new_quantity = func.coalesce(c.quantity, 0) + quantity
+        # MySQL evaluates SET left to right with the new values, so reset the reminder count first
+        stmt = update(products).where(c.id == product_id).ordered_values(
+            (c.email_sent_count, case((new_quantity > func.coalesce(c.reorder_level, 0), 0), else_=c.email_sent_count)),
+            (c.quantity, new_quantity),
+        )
+    applied = session.execute(stmt).rowcount
+    # The UPDATE holds the row lock, so this reads the value it wrote
+    row = session.execute(_product_select([product_id])).first()
+    if row is None:
+        raise ProductNotFound(product_id)
+    if not applied:
+        raise InsufficientStock(product_id, row.name, row.quantity or 0, quantity)
+    _record_changes(session, [(row._asdict(), quantity if tx_type == TransactionType.stock_in else -quantity)])
+
+    transaction = Transaction(type=tx_type, product_id=product_id, quantity=quantity, **transaction_fields)
+    session.add(transaction)
+    return transaction
+
+def lock_products(session, product_ids):
+    """{id: row} for the given products, row-locked in id order with one SELECT ... FOR UPDATE"""
+    return {row.id: row for row in session.execute(_product_select(sorted(set(product_ids))).with_for_update())}
+
+def withdraw_lines(session, lines, location=DEFAULT_LOCATION, **transaction_fields):
+    """
+    Take stock for every line of an order, all or nothing. `lines` are dicts
+    with product_id, quantity and an optional note for its stock_out
+    transaction; the same product may appear on several lines. Returns the
+    locked product rows ({id: row}, quantities as before the withdrawal) so
+    the caller can price the lines.
+    """
+    totals = defaultdict(float)
+    for line in lines:
+        _check_quantity(line['quantity'])
+        totals[line['product_id']] += line['quantity']
+    if not totals:
+        return {}
+    locked = lock_products(session, totals)
+    for line in lines:
+        if line['product_id'] not in locked:
+            raise ProductNotFound(line['product_id'])
+    for product_id, quantity in totals.items():
+        row = locked[product_id]
+        if (row.quantity or 0) < quantity:
+            raise InsufficientStock(product_id, row.name, row.quantity or 0, quantity)
+
+    session.execute(
+        update(products).where(products.c.id == bindparam('product_id'))
+        .values(quantity=func.coalesce(products.c.quantity, 0) - bindparam('amount')),
+        [{'product_id': product_id, 'amount': quantity} for product_id, quantity in sorted(totals.items())],
+    )
+    _record_changes(session, [
+        (dict(locked[product_id]._asdict(), quantity=(locked[product_id].quantity or 0) - quantity), -quantity)
+        for product_id, quantity in totals.items()
+    ])
+
+    date = transaction_fields.pop('date', None) or datetime.now()
+    transactions = [dict(transaction_fields, type=TransactionType.stock_out, product_id=line['product_id'],
+                         quantity=line['quantity'], note=line.get('note'), location=location, date=date)
+                    for line in lines]
+    session.execute(insert(Transaction), transactions)
+    product_daily_stats.record_transactions(session.connection(), transactions)
+    stock_forecasts.note_stock_movement(session)
+    return locked
@@ -0,0 +1,226 @@
+"""
+Supplier locations: nearest suppliers to a point and supplier x warehouse
+distances.
+
+SupplierSpatialIndex keeps geocoded suppliers in memory, sorted by
+latitude. A radius query bisects to the latitude band the radius can reach,
+drops candidates outside the longitude window of the circle and runs the
+haversine over what is left as one NumPy expression, instead of a Python
+haversine per supplier. It is rebuilt after supplier coordinates change in
+this process, or after SUPPLIER_INDEX_TTL seconds for changes made
+elsewhere.
+
+The supplier_warehouse_distances table holds the distance of every geocoded
+supplier to every geocoded warehouse. A Session after_flush hook recomputes
+the rows of a supplier or warehouse whose coordinates change, so shipping
+costs and warehouse request sourcing read a distance instead of computing
+one. Bulk UPDATEs and raw SQL bypass the hook; rebuild the table with
+    python supplier_geo.py --rebuild
+"""
+
+import argparse
+import math
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from sqlalchemy import event, inspect, select, insert, delete, or_
+from sqlalchemy.orm import Session
+from models import Supplier, Warehouse, SupplierWarehouseDistance
+from cached_snapshot import CachedSnapshot, mark_stale, stale_on_commit
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_RADIUS_KM = 50.0
+DEFAULT_NEARBY_K = 3
+SUPPLIER_INDEX_TTL = float(os.getenv('SUPPLIER_INDEX_TTL', '300'))
+
+MAIN_WAREHOUSE_NAME = 'Main Warehouse'
+MAIN_WAREHOUSE_COORDS = (18.5204, 73.8567)  # Pune; used while the main warehouse has no coordinates
+
+distances_table = SupplierWarehouseDistance.__table__
+suppliers_table = Supplier.__table__
+warehouses_table = Warehouse.__table__
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; arguments may be scalars or broadcastable NumPy arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+class SupplierSpatialIndex:
+    """Geocoded suppliers sorted by latitude"""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))  # (id, lat, lng)
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.lat = np.array([row[1] for row in rows], dtype=float)
+        self.lng = np.array([row[2] for row in rows], dtype=float)
+
+    @classmethod
+    def load(cls, session):
+        return cls(session.query(Supplier.id, Supplier.lat, Supplier.lng)
+                   .filter(Supplier.lat.isnot(None), Supplier.lng.isnot(None)).all())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearby(self, lat, lng, radius_km=DEFAULT_RADIUS_KM, k=DEFAULT_NEARBY_K):
+        """[(supplier_id, distance_km)] of the k closest suppliers within radius_km, closest first"""
+        reach = radius_km / KM_PER_DEGREE  # degrees of latitude (and of arc)
+        lo = np.searchsorted(self.lat, lat - reach, side='left')
+        hi = np.searchsorted(self.lat, lat + reach, side='right')
+        ids, lats, lngs = self.ids[lo:hi], self.lat[lo:hi], self.lng[lo:hi]
+
+        # Widest longitude offset on the circle; a circle around a pole spans every longitude
+        ratio = math.sin(math.radians(min(reach, 90.0))) / max(math.cos(math.radians(lat)), 1e-12)
+        if ratio < 1:
+            window = math.degrees(math.asin(ratio)) + 1e-9
+            keep = np.abs((lngs - lng + 180.0) % 360.0 - 180.0) <= window
+            ids, lats, lngs = ids[keep], lats[keep], lngs[keep]
+
+        distances = haversine_km(lat, lng, lats, lngs)
+        inside = distances <= radius_km
+        ids, distances = ids[inside], distances[inside]
+        order = np.lexsort((ids, distances))[:k]
+        return list(zip(ids[order].tolist(), distances[order].tolist()))
+
+# Global instance
+supplier_index = CachedSnapshot(SupplierSpatialIndex.load, SUPPLIER_INDEX_TTL)
+stale_on_commit('supplier_index_stale', target=supplier_index.invalidate)
+
+def _located(connection, table, ids=None):
+    """(id, lat, lng) of the rows of suppliers/warehouses that have coordinates"""
+    query = select(table.c.id, table.c.lat, table.c.lng).where(table.c.lat.isnot(None), table.c.lng.isnot(None))
+    if ids is not None:
+        query = query.where(table.c.id.in_(ids))
+    return connection.execute(query).all()
+
+def _distance_rows(suppliers, warehouses):
+    """One row per (supplier, warehouse) pair of two (id, lat, lng) lists"""
+    if not suppliers or not warehouses:
+        return []
+    s = np.array([row[1:] for row in suppliers], dtype=float)
+    w = np.array([row[1:] for row in warehouses], dtype=float)
+    km = haversine_km(s[:, :1], s[:, 1:], w[:, 0], w[:, 1])
+    return [
+        {'supplier_id': supplier[0], 'warehouse_id': warehouse[0], 'distance_km': float(km[i, j])}
+        for i, supplier in enumerate(suppliers)
+        for j, warehouse in enumerate(warehouses)
+    ]
+
+def refresh_distances(connection, supplier_ids=(), warehouse_ids=()):
+    """Recompute the distance rows of the given suppliers and warehouses (removed ones just lose theirs)"""
+    supplier_ids, warehouse_ids = list(supplier_ids), list(warehouse_ids)
+    if not supplier_ids and not warehouse_ids:
+        return 0
+    connection.execute(delete(distances_table).where(or_(
+        distances_table.c.supplier_id.in_(supplier_ids), distances_table.c.warehouse_id.in_(warehouse_ids))))
+    rows = []
+    if supplier_ids:
+        rows += _distance_rows(_located(connection, suppliers_table, supplier_ids), _located(connection, warehouses_table))
+    if warehouse_ids:
+        # Suppliers refreshed above already have a row for every warehouse
+        refreshed = set(supplier_ids)
+        others = [row for row in _located(connection, suppliers_table) if row[0] not in refreshed]
+        rows += _distance_rows(others, _located(connection, warehouses_table, warehouse_ids))
+    for start in range(0, len(rows), 5000):
+        connection.execute(insert(distances_table), rows[start:start + 5000])
+    return len(rows)
+
+def rebuild_distances(session):
+    """Recompute the whole table. Caller commits."""
+    connection = session.connection()
+    connection.execute(delete(distances_table))
+    rows = _distance_rows(_located(connection, suppliers_table), _located(connection, warehouses_table))
+    for start in range(0, len(rows), 5000):
+        connection.execute(insert(distances_table), rows[start:start + 5000])
+    return len(rows)
+
+def _moved(session, cls):
+    """Ids of cls objects in this flush whose coordinates appeared, changed or went away"""
+    ids = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, cls):
+            ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, cls):
+            state = inspect(obj)
+            if state.attrs.lat.history.has_changes() or state.attrs.lng.history.has_changes():
+                ids.add(obj.id)
+    ids.discard(None)
+    return ids
+
+@event.listens_for(Session, 'after_flush')
+def _update_distances(session, flush_context):
+    supplier_ids = _moved(session, Supplier)
+    warehouse_ids = _moved(session, Warehouse)
+    if supplier_ids or warehouse_ids:
+        refresh_distances(session.connection(), supplier_ids, warehouse_ids)
+    if supplier_ids:
+        mark_stale(session, 'supplier_index_stale')
+
+def distances_to_warehouse(session, warehouse_id, supplier_ids=None, radius_km=None):
+    """{supplier_id: distance_km} from the table for one warehouse, optionally limited to a radius"""
+    query = select(distances_table.c.supplier_id, distances_table.c.distance_km).where(
+        distances_table.c.warehouse_id == warehouse_id)
+    if supplier_ids is not None:
+        query = query.where(distances_table.c.supplier_id.in_(supplier_ids))
+    if radius_km is not None:
+        query = query.where(distances_table.c.distance_km <= radius_km)
+    return dict(session.execute(query).all())
+
+def main_warehouse_distance(session, supplier_id, supplier_lat, supplier_lng):
+    """
+    Distance from a supplier to the main warehouse: the table row when the
+    main warehouse is geocoded, else the haversine to MAIN_WAREHOUSE_COORDS.
+    """
+    distance = session.execute(
+        select(distances_table.c.distance_km)
+        .join(warehouses_table, warehouses_table.c.id == distances_table.c.warehouse_id)
+        .where(warehouses_table.c.name == MAIN_WAREHOUSE_NAME, distances_table.c.supplier_id == supplier_id)
+    ).scalar()
+    if distance is None:
+        distance = float(haversine_km(*MAIN_WAREHOUSE_COORDS, supplier_lat, supplier_lng))
+    return distance
+
+def main_warehouse_location(session):
+    """(lat, lng) that main warehouse distances are measured from"""
+    row = session.execute(
+        select(warehouses_table.c.lat, warehouses_table.c.lng)
+        .where(warehouses_table.c.name == MAIN_WAREHOUSE_NAME,
+               warehouses_table.c.lat.isnot(None), warehouses_table.c.lng.isnot(None))
+    ).first()
+    return (row.lat, row.lng) if row else MAIN_WAREHOUSE_COORDS
+
+def main_warehouse_distances(session, suppliers):
+    """main_warehouse_distance for [(supplier_id, lat, lng)] in one query: {supplier_id: km}"""
+    suppliers = list(suppliers)
+    stored = dict(session.execute(
+        select(distances_table.c.supplier_id, distances_table.c.distance_km)
+        .join(warehouses_table, warehouses_table.c.id == distances_table.c.warehouse_id)
+        .where(warehouses_table.c.name == MAIN_WAREHOUSE_NAME,
+               distances_table.c.supplier_id.in_([row[0] for row in suppliers]))
+    ).all()) if suppliers else {}
+    missing = [row for row in suppliers if row[0] not in stored]
+    if missing:
+        km = haversine_km(*MAIN_WAREHOUSE_COORDS, [row[1] for row in missing], [row[2] for row in missing])
+        stored.update(zip([row[0] for row in missing], np.atleast_1d(km).tolist()))
+    return stored
+
+if __name__ == '__main__':
+    from db_init import get_session
+
+    parser = argparse.ArgumentParser(description='Rebuild the supplier_warehouse_distances table')
+    parser.add_argument('--rebuild', action='store_true', help='recompute every supplier x warehouse distance')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        sys.exit(0)
+
+    session = get_session()
+    count = rebuild_distances(session)
+    session.commit()
+    session.close()
+    print(f"✓ Rebuilt supplier_warehouse_distances ({count} rows)")
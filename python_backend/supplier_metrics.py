@@ -0,0 +1,168 @@
+"""
+Structured supplier delivery metrics.
+
+Every stock_in Transaction with a supplier gets a supplier_delivery_metrics
+row in the same flush: quantity, unit price paid, lead time, on-time flag and
+rejected quantity, parsed out of the free-text note once. The
+/suppliers/performance endpoint then aggregates this indexed table with one
+GROUP BY instead of walking every product's transactions.
+
+avg_price is the average unit price paid: the 'at price X' the supplier
+accept paths write into the note, or the product cost at the time of the
+delivery when the note has none. The old loop averaged the product's current
+cost over every delivery, so the two differ for deliveries with a price in
+the note and after a product's cost changes.
+"""
+
+import re
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func, case, insert, select
+from sqlalchemy.orm import Session
+from models import Product, Supplier, Transaction, TransactionType, SupplierDeliveryMetric
+
+ON_TIME_LEAD_DAYS = 5
+
+metrics_table = SupplierDeliveryMetric.__table__
+
+# Digits with an optional decimal part; commas group thousands (1,200 or 1,00,000)
+_NUMBER = r'(\d+(?:,\d+)*(?:\.\d+)?)'
+_LEAD_TIME_RE = re.compile(r'lead_time=' + _NUMBER)
+_REJECTED_RE = re.compile(r'rejected=' + _NUMBER)
+_PRICE_RE = re.compile(r'at price ' + _NUMBER)
+
+def _number(match):
+    """The float a note regex matched, or None when it matched nothing usable"""
+    if not match:
+        return None
+    try:
+        return float(match.group(1).replace(',', ''))
+    except ValueError:
+        return None
+
+def parse_delivery_note(note):
+    """Return (lead_time_days, rejected_quantity, unit_price) found in a transaction note"""
+    if not note:
+        return None, 0, None
+    lead_time = _number(_LEAD_TIME_RE.search(note))
+    rejected = _number(_REJECTED_RE.search(note))
+    price = _number(_PRICE_RE.search(note))
+    return lead_time, rejected if rejected is not None else 0, price
+
+def _is_stock_in(tx_type):
+    return tx_type in (TransactionType.stock_in, 'stock_in')
+
+def metric_row(transaction_id, supplier_id, product_id, quantity, note, date, product_cost):
+    lead_time, rejected, price = parse_delivery_note(note)
+    return {
+        'transaction_id': transaction_id,
+        'supplier_id': supplier_id,
+        'product_id': product_id,
+        'quantity': quantity or 0,
+        'unit_price': price if price is not None else (product_cost or 0),
+        'lead_time_days': lead_time,
+        'on_time': (lead_time <= ON_TIME_LEAD_DAYS) if lead_time is not None else None,
+        'rejected_quantity': rejected,
+        'delivered_at': date,
+    }
+
+@event.listens_for(Session, 'after_flush')
+def _record_delivery_metrics(session, flush_context):
+    new_deliveries = [
+        obj for obj in session.new
+        if isinstance(obj, Transaction) and obj.supplier_id and obj.product_id and _is_stock_in(obj.type)
+    ]
+    if not new_deliveries:
+        return
+    connection = session.connection()
+    product_ids = {t.product_id for t in new_deliveries}
+    costs = dict(connection.execute(select(Product.id, Product.cost).where(Product.id.in_(product_ids))).all())
+    connection.execute(insert(metrics_table), [
+        metric_row(t.id, t.supplier_id, t.product_id, t.quantity, t.note, t.date, costs.get(t.product_id))
+        for t in new_deliveries
+    ])
+
+def backfill_metrics(session, batch_size=5000):
+    """Create metric rows for supplier stock_in transactions that do not have one yet. Caller commits."""
+    recorded = select(metrics_table.c.transaction_id)
+    query = (
+        session.query(Transaction.id, Transaction.supplier_id, Transaction.product_id,
+                      Transaction.quantity, Transaction.note, Transaction.date, Product.cost)
+        .join(Product, Product.id == Transaction.product_id)
+        .filter(Transaction.type == TransactionType.stock_in,
+                Transaction.supplier_id.isnot(None),
+                Transaction.id.notin_(recorded))
+        .order_by(Transaction.id)
+    )
+    batch = []
+    created = 0
+    for row in query.yield_per(batch_size):
+        batch.append(metric_row(*row))
+        if len(batch) >= batch_size:
+            session.execute(insert(metrics_table), batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        session.execute(insert(metrics_table), batch)
+        created += len(batch)
+    return created
+
+def supplier_performance_rows(session):
+    """
+    Per product, the suppliers that delivered it with avg price, on-time rate,
+    rejection rate, avg lead time and score. Two queries in total.
+    """
+    m = SupplierDeliveryMetric
+    grouped = (
+        session.query(
+            m.product_id,
+            Supplier.id, Supplier.name, Supplier.email, Supplier.phone, Supplier.address, Supplier.company,
+            func.avg(m.unit_price), func.max(m.unit_price),
+            func.count(m.lead_time_days),
+            func.sum(case((m.on_time, 1), else_=0)),
+            func.avg(m.lead_time_days), func.max(m.lead_time_days),
+            func.sum(m.rejected_quantity), func.sum(m.quantity),
+        )
+        .join(Supplier, Supplier.id == m.supplier_id)
+        .group_by(m.product_id, Supplier.id)
+    )
+    by_product = {}
+    for (product_id, supplier_id, name, email, phone, address, company,
+         avg_price, max_price, lead_count, on_time, avg_lead, max_lead, rejected, ordered) in grouped:
+        avg_price = round(avg_price or 0, 2)
+        on_time_rate = round(100 * (on_time or 0) / lead_count, 1) if lead_count else 0.0
+        rejection_rate = round(100 * (rejected or 0) / ordered, 2) if ordered else 0.0
+        avg_lead_time = round(avg_lead, 2) if lead_count else 0.0
+        score = (
+            0.4 * (on_time_rate / 100) +
+            0.2 * (1 - (avg_price / max_price if max_price else 0)) +
+            0.2 * (1 - rejection_rate / 100) +
+            0.2 * (1 - avg_lead_time / (max_lead if lead_count and max_lead else 1))
+        ) * 10
+        by_product.setdefault(product_id, []).append({
+            'id': supplier_id,
+            'name': name,
+            'avg_price': avg_price,
+            'on_time_rate': on_time_rate,
+            'rejection_rate': rejection_rate,
+            'avg_lead_time': avg_lead_time,
+            'score': round(score, 2),
+            'email': email,
+            'phone': phone,
+            'address': address,
+            'company': company,
+        })
+    result = []
+    for product_id, product_name, product_sku in session.query(Product.id, Product.name, Product.sku).order_by(Product.id):
+        suppliers_perf = by_product.get(product_id, [])
+        suppliers_perf.sort(key=lambda x: (-x['score'], x['avg_price'], x['avg_lead_time']))
+        result.append({
+            'product_id': product_id,
+            'product_name': product_name,
+            'product_sku': product_sku,
+            'suppliers': suppliers_perf,
+            'no_data': len(suppliers_perf) == 0
+        })
+    return result
@@ -1,14 +1,50 @@
 import statistics
 from datetime import datetime, timedelta
+from itertools import chain
 from typing import List, Dict
 
+import numpy as np
+
+# Metrics are computed column-wise: every delivery is reduced to a few numbers
+# when it is added, and SupplierPerformanceManager.evaluate() aggregates all
+# suppliers at once with np.bincount over the supplier index. The per-supplier
+# methods below are thin wrappers over the same code path.
+
+class _DeliveryColumns:
+    """Per-supplier column buffers, one entry per transaction"""
+    __slots__ = ('unit_price', 'lead_days', 'on_time', 'quantity_ordered', 'rejected')
+
+    def __init__(self):
+        self.unit_price = []
+        self.lead_days = []   # NaN when order/delivery date is missing
+        self.on_time = []     # NaN when the promised lead time is missing too
+        self.quantity_ordered = []
+        self.rejected = []
+
+    def append(self, t: Dict):
+        self.unit_price.append(t['unit_price'])
+        if 'order_date' in t and 'delivery_date' in t:
+            lead_days = (t['delivery_date'] - t['order_date']).days
+            self.lead_days.append(lead_days)
+            self.on_time.append(float(lead_days <= t['lead_time']) if 'lead_time' in t else np.nan)
+        else:
+            self.lead_days.append(np.nan)
+            self.on_time.append(np.nan)
+        self.quantity_ordered.append(t['quantity_ordered'])
+        self.rejected.append(t.get('rejected_quantity', 0))
+
+    def __len__(self):
+        return len(self.unit_price)
+
 class Supplier:
     def __init__(self, name: str):
         self._name = name
         self._transactions = []  # List of dicts
+        self._columns = _DeliveryColumns()
 
     def add_transaction(self, transaction: Dict):
         self._transactions.append(transaction)
+        self._columns.append(transaction)
 
     def get_name(self):
         return self._name
@@ -16,76 +52,120 @@ class Supplier:
     def get_transactions(self):
         return self._transactions
 
+    def _delivery_columns(self):
+        # Rebuild if the list returned by get_transactions() was changed directly
+        if len(self._columns) != len(self._transactions):
+            self._columns = _DeliveryColumns()
+            for t in self._transactions:
+                self._columns.append(t)
+        return self._columns
+
+    def _metrics(self):
+        return evaluate_suppliers([self])[0]
+
     def average_unit_price(self):
-        prices = [t['unit_price'] for t in self._transactions]
-        return round(statistics.mean(prices), 2) if prices else 0.0
+        return self._metrics()['avg_price']
 
     def on_time_rate(self):
-        on_time = 0
-        total = 0
-        for t in self._transactions:
-            if 'order_date' in t and 'delivery_date' in t and 'lead_time' in t:
-                lead_time = (t['delivery_date'] - t['order_date']).days
-                if lead_time <= t['lead_time']:
-                    on_time += 1
-                total += 1
-        return round(100 * on_time / total, 1) if total else 0.0
+        return self._metrics()['on_time_rate']
 
     def rejection_rate(self):
-        total_ordered = sum(t['quantity_ordered'] for t in self._transactions)
-        total_rejected = sum(t.get('rejected_quantity', 0) for t in self._transactions)
-        return round(100 * total_rejected / total_ordered, 2) if total_ordered else 0.0
+        return self._metrics()['rejection_rate']
 
     def average_lead_time(self):
-        lead_times = [(t['delivery_date'] - t['order_date']).days for t in self._transactions if 'order_date' in t and 'delivery_date' in t]
-        return round(statistics.mean(lead_times), 2) if lead_times else 0.0
+        return self._metrics()['avg_lead_time']
+
+    def score_adjustment(self, avg_lead_time: float) -> float:
+        """Bonus or penalty added to the base score; subclasses override"""
+        return 0
 
     def reliability_score(self):
-        # Weighted: on-time (40%), rejection (30%), lead time (20%), price (10%)
-        on_time = self.on_time_rate()
-        rejection = self.rejection_rate()
-        lead_time = self.average_lead_time()
-        price = self.average_unit_price()
-        # Normalize: higher on-time, lower rejection, lower lead time, lower price
-        score = (
-            (on_time / 100) * 4 +
-            (1 - rejection / 100) * 3 +
-            (1 - min(lead_time / 10, 1)) * 2 +
-            (1 - min(price / 100, 1)) * 1
-        ) * 2  # Scale to 10
-        return round(score, 2)
+        return self._metrics()['score']
 
 class LocalSupplier(Supplier):
-    def reliability_score(self):
+    def score_adjustment(self, avg_lead_time):
         # Local suppliers get a small bonus for lead time
-        base = super().reliability_score()
-        lead_time = self.average_lead_time()
-        bonus = 0.5 if lead_time < 5 else 0
-        return round(base + bonus, 2)
+        return 0.5 if avg_lead_time < 5 else 0
 
 class InternationalSupplier(Supplier):
-    def reliability_score(self):
+    def score_adjustment(self, avg_lead_time):
         # International suppliers penalized for lead time > 7 days
-        base = super().reliability_score()
-        lead_time = self.average_lead_time()
-        penalty = -0.5 if lead_time > 7 else 0
-        return round(base + penalty, 2)
+        return -0.5 if avg_lead_time > 7 else 0
+
+def _group_mean(index, values, n):
+    """Mean of non-NaN `values` per group, and the count it was taken over"""
+    valid = ~np.isnan(values)
+    counts = np.bincount(index[valid], minlength=n)
+    sums = np.bincount(index[valid], weights=values[valid], minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts, counts
+
+def evaluate_suppliers(suppliers: List[Supplier]) -> List[Dict]:
+    """
+    Metrics for every supplier in one vectorized pass over all deliveries.
+    Returns report rows in the order of `suppliers`.
+    """
+    n = len(suppliers)
+    if not n:
+        return []
+    columns = [s._delivery_columns() for s in suppliers]
+    lengths = np.fromiter((len(c) for c in columns), dtype=np.int64, count=n)
+    index = np.repeat(np.arange(n), lengths)
+
+    def column(name):
+        return np.fromiter(chain.from_iterable(getattr(c, name) for c in columns), dtype=float, count=len(index))
+
+    avg_price, _ = _group_mean(index, column('unit_price'), n)
+    on_time_share, on_time_counts = _group_mean(index, column('on_time'), n)
+    avg_lead, lead_counts = _group_mean(index, column('lead_days'), n)
+    ordered = np.bincount(index, weights=column('quantity_ordered'), minlength=n)
+    rejected = np.bincount(index, weights=column('rejected'), minlength=n)
+
+    # A float sum can land either side of a half cent where statistics.mean()
+    # (exact) would not; redo those few averages exactly
+    cents = avg_price * 100
+    near_tie = np.flatnonzero(np.abs(cents - np.floor(cents) - 0.5) < 1e-6)
+    for i in near_tie:
+        avg_price[i] = statistics.mean(columns[i].unit_price)
+
+    report = []
+    # Rounding stays in Python so results match round() exactly
+    for i, s in enumerate(suppliers):
+        price = round(float(avg_price[i]), 2) if lengths[i] else 0.0
+        on_time = round(100 * float(on_time_share[i]), 1) if on_time_counts[i] else 0.0
+        rejection = round(100 * float(rejected[i] / ordered[i]), 2) if ordered[i] else 0.0
+        lead_time = round(float(avg_lead[i]), 2) if lead_counts[i] else 0.0
+        # Weighted: on-time (40%), rejection (30%), lead time (20%), price (10%)
+        # Normalize: higher on-time, lower rejection, lower lead time, lower price
+        score = round((
+            (on_time / 100) * 4 +
+            (1 - rejection / 100) * 3 +
+            (1 - min(lead_time / 10, 1)) * 2 +
+            (1 - min(price / 100, 1)) * 1
+        ) * 2, 2)  # Scale to 10
+        adjustment = s.score_adjustment(lead_time)
+        if adjustment:
+            score = round(score + adjustment, 2)
+        report.append({
+            'name': s.get_name(),
+            'avg_price': price,
+            'on_time_rate': on_time,
+            'rejection_rate': rejection,
+            'avg_lead_time': lead_time,
+            'score': score,
+        })
+    return report
 
 class SupplierPerformanceManager:
     def __init__(self, suppliers: List[Supplier]):
         self._suppliers = suppliers
 
     def evaluate(self):
-        report = []
-        for s in self._suppliers:
-            report.append({
-                'name': s.get_name(),
-                'avg_price': s.average_unit_price(),
-                'on_time_rate': s.on_time_rate(),
-                'rejection_rate': s.rejection_rate(),
-                'avg_lead_time': s.average_lead_time(),
-                'score': s.reliability_score(),
-            })
+        report = evaluate_suppliers(self._suppliers)
+        for row, s in zip(report, self._suppliers):
+            # Subclasses that still override reliability_score() keep their own scoring
+            if type(s).reliability_score is not Supplier.reliability_score:
+                row['score'] = s.reliability_score()
         # Sort by score desc, then price asc, then lead time asc
         report.sort(key=lambda x: (-x['score'], x['avg_price'], x['avg_lead_time']))
         return report
@@ -1,7 +1,13 @@
 import json
+import os
+import sys
 import requests
+import numpy as np
 from typing import Dict, List, Optional
 from dataclasses import dataclass
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from gazetteer import gazetteer
 
 @dataclass
 class TaxBreakdown:
@@ -81,23 +87,10 @@ class TaxCalculator:
         self.state_names = {v: k for k, v in self.state_codes.items()}
     
     def detect_state_from_address(self, address: str) -> Optional[str]:
-        """Detect state from address string"""
+        """Detect state from address string (state name, PIN code, city or upper-case state code)"""
         if not address:
             return None
-        
-        address_lower = address.lower()
-        
-        # Check for state names in address
-        for state_name, state_code in self.state_codes.items():
-            if state_name.lower() in address_lower:
-                return state_name
-        
-        # Check for state codes in address
-        for state_code, state_name in self.state_names.items():
-            if state_code.lower() in address_lower:
-                return state_name
-        
-        return None
+        return gazetteer.resolve(address).state
     
     def get_gst_rate(self, product_category: str = None) -> float:
         """Get applicable GST rate for product category"""
@@ -230,5 +223,199 @@ class TaxCalculator:
             "breakdown_display": self.get_tax_breakdown_display(tax_breakdown)
         }
 
+    def _state_of(self, state=None, address=None) -> Optional[str]:
+        """State name from a state name or code, else from an address"""
+        if state:
+            state = str(state)
+            if state in self.state_codes:
+                return state
+            return self.state_names.get(str(state).upper()) or self.detect_state_from_address(state)
+        return self.detect_state_from_address(address) if address else None
+    
+    @staticmethod
+    def _text_of(item, field, where):
+        """item[field], which must be a string when given"""
+        value = item.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f'{where}: {field} must be a string')
+        return value
+    
+    def calculate_batch(self, invoices: List[Dict]) -> Dict:
+        """
+        GST for many invoices in one pass
+        
+        Args:
+            invoices: [{'id', 'supplier_address' or 'supplier_state', 'shipping_cost',
+                        'lines': [{'amount' (or 'quantity' and 'unit_price'), 'category',
+                                   optional 'supplier_state' / 'supplier_address'}]}]
+        
+        Amounts are worked in paise. Each line's tax is rounded half away from
+        zero to the paisa, CGST and SGST separately at half the rate, and the
+        invoice totals are the sums of the rounded lines, so lines always add
+        up to their invoice. Shipping is taxed as one more line of the invoice
+        at the 'shipping_category' rate (default rate if not given).
+        Raises ValueError on a malformed invoice or line.
+        """
+        # Invoice states once per invoice (addresses matched together); lines may override
+        invoice_states = [None] * len(invoices)
+        to_resolve = []
+        for i, invoice in enumerate(invoices):
+            if not isinstance(invoice, dict) or not isinstance(invoice.get('lines') or [], list):
+                raise ValueError(f'invoice {i}: expected an object with a list of lines')
+            state = self._text_of(invoice, 'supplier_state', f'invoice {i}')
+            address = self._text_of(invoice, 'supplier_address', f'invoice {i}')
+            if state:
+                invoice_states[i] = self._state_of(state)
+            elif address:
+                to_resolve.append(i)
+        matches = gazetteer.resolve_many([invoices[i]['supplier_address'] for i in to_resolve])
+        for i, match in zip(to_resolve, matches):
+            invoice_states[i] = match.state
+        
+        amounts, categories, counts, overrides = [], [], [], {}
+        for i, invoice in enumerate(invoices):
+            lines = invoice.get('lines') or []
+            for j, line in enumerate(lines):
+                amount = line.get('amount') if isinstance(line, dict) else None
+                if amount is None:
+                    try:
+                        amount = line['quantity'] * line['unit_price']
+                    except (KeyError, TypeError):
+                        raise ValueError(f'invoice {i}, line {j}: needs an amount or quantity and unit_price')
+                amounts.append(amount)
+                where = f'invoice {i}, line {j}'
+                categories.append(self._text_of(line, 'category', where))
+                state = self._text_of(line, 'supplier_state', where)
+                address = self._text_of(line, 'supplier_address', where)
+                if state or address:
+                    overrides[len(amounts) - 1] = self._state_of(state, address)
+            # Shipping is one more line of the invoice
+            amounts.append(invoice.get('shipping_cost') or 0)
+            categories.append(self._text_of(invoice, 'shipping_category', f'invoice {i}'))
+            counts.append(len(lines) + 1)
+        try:
+            amount = np.asarray(amounts, dtype=float)
+        except (TypeError, ValueError):
+            raise ValueError('line amounts, quantities and unit prices must be numbers')
+        if not np.isfinite(amount).all():
+            raise ValueError('line amounts, quantities and unit prices must be finite numbers')
+        amount = np.round(amount * 100).astype(np.int64)
+        
+        rate_of = {category: self.get_gst_rate(category) for category in set(categories)}
+        rate_bp = np.round(np.array([rate_of[category] for category in categories], dtype=float) * 10000).astype(np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        invoice_interstate = np.array([state != self.warehouse_state for state in invoice_states], dtype=bool)
+        interstate = np.repeat(invoice_interstate, counts)
+        states = np.repeat(np.array(invoice_states, dtype=object), counts)
+        for position, state in overrides.items():
+            states[position] = state
+            interstate[position] = state != self.warehouse_state
+        
+        sign, magnitude = np.sign(amount), np.abs(amount)
+        full = sign * ((magnitude * rate_bp + 5000) // 10000)
+        half = sign * ((magnitude * rate_bp + 10000) // 20000)
+        igst = np.where(interstate, full, 0)
+        cgst = np.where(interstate, 0, half)
+        total_tax = igst + 2 * cgst
+        
+        # The shipping line is the last of each invoice
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        shipping = np.zeros(len(amount), dtype=bool)
+        shipping[ends - 1] = True
+        def per_invoice(values):
+            return np.add.reduceat(values, starts) if len(values) else np.zeros(0, dtype=np.int64)
+        sums = {
+            'subtotal': per_invoice(np.where(shipping, 0, amount)), 'shipping_cost': amount[shipping],
+            'cgst': per_invoice(cgst), 'sgst': per_invoice(cgst), 'igst': per_invoice(igst),
+            'total_tax': per_invoice(total_tax), 'shipping_tax': total_tax[shipping],
+        }
+        sums['grand_total'] = sums['subtotal'] + sums['shipping_cost'] + sums['total_tax']
+        
+        goods = ~shipping
+        columns = zip((amount[goods] / 100).tolist(), (rate_bp[goods] / 10000).tolist(), states[goods].tolist(),
+                      interstate[goods].tolist(), (cgst[goods] / 100).tolist(), (igst[goods] / 100).tolist(),
+                      (total_tax[goods] / 100).tolist(), ((amount + total_tax)[goods] / 100).tolist())
+        line_results = [{
+            'amount': line_amount,
+            'tax_rate': rate,
+            'supplier_state': state or "Unknown",
+            'is_interstate': inter,
+            'tax_type': "IGST" if inter else "CGST + SGST",
+            'cgst': line_cgst,
+            'sgst': line_cgst,
+            'igst': line_igst,
+            'total_tax': line_tax,
+            'total': line_total
+        } for line_amount, rate, state, inter, line_cgst, line_igst, line_tax, line_total in columns]
+        
+        totals = {key: (values / 100).tolist() for key, values in sums.items()}
+        line_ends = (ends - np.arange(1, len(counts) + 1)).tolist()
+        results = []
+        for i, invoice in enumerate(invoices):
+            result = {
+                'id': invoice.get('id'),
+                'supplier_state': invoice_states[i] or "Unknown",
+                'is_interstate': bool(invoice_interstate[i]),
+                'lines': line_results[line_ends[i] - (counts[i] - 1):line_ends[i]]
+            }
+            result.update({key: values[i] for key, values in totals.items()})
+            results.append(result)
+        
+        return {
+            'invoices': results,
+            'totals': {key: float(values.sum()) / 100 for key, values in sums.items()},
+            'invoice_count': len(invoices),
+            'line_count': len(line_results)
+        }
+    
+    def calculate_lines_with_taxes(self, lines: List[Dict], shipping_cost: float, supplier_address: str) -> Dict:
+        """
+        calculate_total_with_taxes for a subtotal split into lines of different
+        categories ([{'amount', 'category'}]). Shipping is taxed at the default
+        rate, and tax_rate is the effective rate over goods and shipping.
+        """
+        return self.calculate_lines_with_taxes_many([(lines, shipping_cost, supplier_address)])[0]
+    
+    def calculate_lines_with_taxes_many(self, entries: List[tuple]) -> List[Dict]:
+        """calculate_lines_with_taxes for [(lines, shipping_cost, supplier_address)] in one batch"""
+        batch = self.calculate_batch([{
+            'lines': lines,
+            'shipping_cost': shipping_cost,
+            'supplier_address': supplier_address
+        } for lines, shipping_cost, supplier_address in entries])['invoices']
+        return [self._lines_total(invoice) for invoice in batch]
+    
+    def _lines_total(self, batch):
+        base = batch['subtotal'] + batch['shipping_cost']
+        tax_rate = round(batch['total_tax'] / base, 4) if base else self.get_gst_rate()
+        is_interstate = batch['is_interstate']
+        tax_breakdown = TaxBreakdown(
+            cgst=batch['cgst'],
+            sgst=batch['sgst'],
+            igst=batch['igst'],
+            total_tax=batch['total_tax'],
+            tax_rate=tax_rate,
+            tax_type="IGST" if is_interstate else "CGST + SGST",
+            state_name=batch['supplier_state']
+        )
+        return {
+            "subtotal": batch['subtotal'],
+            "shipping_cost": batch['shipping_cost'],
+            "tax_breakdown": {
+                "cgst": batch['cgst'],
+                "sgst": batch['sgst'],
+                "igst": batch['igst'],
+                "total_tax": batch['total_tax'],
+                "tax_rate": tax_rate,
+                "tax_type": tax_breakdown.tax_type,
+                "supplier_state": batch['supplier_state'],
+                "is_interstate": is_interstate,
+                "lines": batch['lines']
+            },
+            "grand_total": batch['grand_total'],
+            "breakdown_display": self.get_tax_breakdown_display(tax_breakdown)
+        }
+
 # Global tax calculator instance
 tax_calculator = TaxCalculator() 
\ No newline at end of file
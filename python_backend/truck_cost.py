@@ -0,0 +1,109 @@
+"""
+Truck cost predictor shared by api.py and aggregator.py.
+
+Loads chosen_truck_cost_model.json (written by train_truck_cost_model.py)
+once and reloads it when the file's mtime changes, so retraining takes effect
+without a restart. predict() prices one distance, predict_many() a whole
+array of distances in one NumPy expression.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = os.getenv('TRUCK_COST_MODEL_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'chosen_truck_cost_model.json')
+
+MODEL_NAMES = ('linear', 'exp_decay', 'piecewise')
+
+class TruckCostModel:
+    def __init__(self, path=DEFAULT_MODEL_PATH, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval  # seconds between mtime checks
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = float('-inf')
+        self._model = (None, None)  # (model name, params), swapped as one tuple on reload
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                self._mtime, self._model = None, (None, None)
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    cfg = json.load(f)
+                name, params = cfg['model_name'], cfg['params']
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Probably caught mid-write; keep the previous model and retry next check
+                print(f"Could not load truck cost model {self.path}: {e}")
+                return
+            self._mtime = mtime
+            self._model = (name if name in MODEL_NAMES else None, dict(params))
+
+    @property
+    def model_name(self):
+        self._refresh()
+        return self._model[0]
+
+    @property
+    def signature(self):
+        """[file mtime, model name, params] of the loaded model, for cache keys of prices derived from it"""
+        self._refresh()
+        return [self._mtime, *self._model]
+
+    @property
+    def available(self):
+        """True when a model with a known formula is loaded"""
+        return self.model_name is not None
+
+    def predict(self, distance_km):
+        """Cost in INR for one distance, or None when no usable model is loaded"""
+        self._refresh()
+        name, params = self._model
+        d = float(distance_km)
+        if name == 'linear':
+            return params['F'] + params['v'] * d
+        if name == 'exp_decay':
+            return d * (params['c_min'] + (params['c0'] - params['c_min']) * math.exp(-params['k'] * d))
+        if name == 'piecewise':
+            b1 = params['b1']; b2 = params['b2']
+            seg1 = min(d, b1)
+            seg2 = 0.0 if d <= b1 else min(d - b1, b2 - b1)
+            seg3 = 0.0 if d <= b2 else d - b2
+            return params['F'] + params['m1'] * seg1 + params['m2'] * seg2 + params['m3'] * seg3
+        return None
+
+    def predict_many(self, distances_km):
+        """Costs for an array of distances, or None when no usable model is loaded"""
+        self._refresh()
+        name, params = self._model
+        d = np.asarray(distances_km, dtype=float)
+        if name == 'linear':
+            return params['F'] + params['v'] * d
+        if name == 'exp_decay':
+            return d * (params['c_min'] + (params['c0'] - params['c_min']) * np.exp(-params['k'] * d))
+        if name == 'piecewise':
+            b1 = params['b1']; b2 = params['b2']
+            seg1 = np.minimum(d, b1)
+            seg2 = np.clip(d - b1, 0.0, b2 - b1)
+            seg3 = np.maximum(d - b2, 0.0)
+            return params['F'] + params['m1'] * seg1 + params['m2'] * seg2 + params['m3'] * seg3
+        return None
+
+# Global instance
+truck_cost_model = TruckCostModel()